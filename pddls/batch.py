@@ -0,0 +1,209 @@
+import io
+import os
+import sys
+import json
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+
+from .pddl2json import parseAsJson
+from .json2pddl import printPDDL
+from .rulecatalog import RuleCatalog
+from .pddlsc import translate, loadProblem, loadOntology, ontologyFingerprint, queryCacheFor, \
+    loadQueryEngine, metricsFor, writeMetrics, extractPredicateURIs, reportCatalog
+from .metrics import Metrics, stage
+from .prune import pruneProblem
+
+
+PROBLEM_EXTENSIONS = ('.pddl', '.pddls', '.json', '.jsonld', '.pddlb')
+
+# Domains and ontology shared by every problem compiled in this process
+_shared = {}
+
+
+def collectProblemFiles(paths):
+    """Expand directories into the problem files they contain"""
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in PROBLEM_EXTENSIONS:
+                    result.append(os.path.join(path, name))
+        else:
+            result.append(path)
+    return result
+
+
+def outputFileFor(problem_file, output_dir):
+    # the extension is kept, so that p.pddl and p.pddls do not collide
+    return os.path.join(output_dir, os.path.basename(problem_file) + '.pddl')
+
+
+def fileKey(path):
+    """(device, inode) of an existing file, None otherwise"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def checkOutputFiles(problem_files, output_files):
+    """Refuse outputs that collide or would overwrite an input problem"""
+    if len(set(os.path.abspath(f) for f in output_files)) != len(output_files):
+        raise ValueError('Problem files in a batch must have distinct base names')
+    inputs = set(os.path.abspath(f) for f in problem_files)
+    input_keys = set(fileKey(f) for f in problem_files) - {None}
+    for output_file in output_files:
+        if os.path.abspath(output_file) in inputs or fileKey(output_file) in input_keys:
+            raise ValueError('Output {} would overwrite an input problem'.format(output_file))
+
+
+def initWorker(domains, ontology, options):
+    _shared['domains'] = domains
+    _shared['ontology'] = ontology
+    _shared['options'] = options
+
+
+def compileProblem(problem_file, output_file):
+    """Translate one problem against the shared domains and ontology"""
+    options = _shared['options']
+    start = time.perf_counter()
+    entry = { 'problem': problem_file, 'output': output_file }
+    metrics = Metrics() if options.get('metrics') else None
+    try:
+        with stage(metrics, 'parse_problem'):
+            problem = loadProblem(problem_file, options.get('cache'),
+                                  options.get('backend', 'antlr'), options.get('stream', False),
+                                  options.get('structured', False))
+        query_cache = options.get('query_cache')
+        before = query_cache.stats() if query_cache is not None else None
+        with stage(metrics, 'translate'):
+            resultProblem, _resultDomains = translate(problem, _shared['ontology'], _shared['domains'],
+                                                      query_cache=query_cache,
+                                                      ontology_fingerprint=options.get('fingerprint'),
+                                                      workers=options.get('predicate_workers'),
+                                                      pool=options.get('predicate_pool', 'thread'),
+                                                      catalog=options.get('catalog'),
+                                                      engine=options.get('engine'),
+                                                      metrics=metrics)
+        if query_cache is not None:
+            after = query_cache.stats()
+            entry['sparql_hits'] = after['hits'] - before['hits']
+            entry['sparql_misses'] = after['misses'] - before['misses']
+        if options.get('prune'):
+            report = io.StringIO()
+            with stage(metrics, 'prune'):
+                _resultDomain, resultProblem = pruneProblem(resultProblem, _shared['domains'], report)
+            entry['prune'] = report.getvalue().splitlines()
+        with stage(metrics, 'serialize'):
+            with open(output_file, 'w') as out:
+                printPDDL(resultProblem, out, options.get('compact', False))
+        entry['error'] = None
+    except Exception as e:
+        entry['output'] = None
+        entry['error'] = ''.join(traceback.format_exception_only(type(e), e)).strip()
+    entry['seconds'] = time.perf_counter() - start
+    if metrics is not None:
+        entry['metrics'] = metrics.toDict()
+    return entry
+
+
+def compileBatch(problem_files, domains, ontology, output_dir, workers=None, options=None):
+    """Translate many problems against the same domains and ontology.
+
+    Domains and ontology are loaded once by the caller and shared by the
+    worker processes; with workers=1 everything runs in this process.
+    Return the per-problem summary entries in the order of problem_files.
+    """
+    options = options or {}
+    output_files = [outputFileFor(f, output_dir) for f in problem_files]
+    checkOutputFiles(problem_files, output_files + [os.path.join(output_dir, 'summary.json')])
+    os.makedirs(output_dir, exist_ok=True)
+
+    if workers == 1 or len(problem_files) <= 1:
+        initWorker(domains, ontology, options)
+        return [compileProblem(f, o) for f, o in zip(problem_files, output_files)]
+
+    # fork lets workers inherit the ontology instead of unpickling a copy each
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=initWorker,
+                             initargs=(domains, ontology, options)) as pool:
+        return list(pool.map(compileProblem, problem_files, output_files))
+
+
+def summarize(entries):
+    failures = [e for e in entries if e['error']]
+    return {
+        'problems': len(entries),
+        'failures': len(failures),
+        'seconds': sum(e['seconds'] for e in entries),
+        'results': entries,
+    }
+
+
+def main(args, input_files, cache=None):
+    problem_files = collectProblemFiles(input_files)
+    output_dir = args.output_dir or '.'
+    try:
+        checkOutputFiles(problem_files, [outputFileFor(f, output_dir) for f in problem_files] +
+                         [os.path.join(output_dir, 'summary.json')])
+    except ValueError as e:
+        print("Batch not compiled: {}".format(e), file=sys.stderr)
+        sys.exit(2)
+    options = {
+        'cache': cache,
+        'backend': getattr(args, 'backend', 'antlr'),
+        'stream': getattr(args, 'stream', False),
+        'structured': getattr(args, 'structured', False),
+        'compact': getattr(args, 'compact', False),
+        'prune': getattr(args, 'prune', False),
+        'predicate_workers': getattr(args, 'predicate_workers', None),
+        'predicate_pool': getattr(args, 'predicate_pool', 'thread'),
+    }
+    # the metrics of each problem go to its entry, their sum to --metrics_json
+    metrics = metricsFor(args)
+    options['metrics'] = metrics is not None
+
+    start = time.perf_counter()
+    with stage(metrics, 'parse_domains'):
+        domains = [parseAsJson(domain_file, cache=cache, backend=options['backend'])
+                   for domain_file in args.domain_file]
+    store_path = getattr(args, 'ontology_store', None)
+    with stage(metrics, 'ontology'):
+        ontology = loadOntology(args.ontology_file, store_path, getattr(args, 'rebuild_store', False))
+    # formulas are compiled once for every problem of the batch
+    options['catalog'] = RuleCatalog(ontology)
+    reportCatalog(options['catalog'], extractPredicateURIs(domains))
+    options['engine'] = loadQueryEngine(getattr(args, 'query_engine', 'rdflib'), ontology, store_path)
+    # every worker process keeps its own (forked) copy of the query cache
+    options['query_cache'] = queryCacheFor(args)
+    if options['query_cache'] is not None:
+        options['fingerprint'] = ontologyFingerprint(args.ontology_file, store_path)
+    load_seconds = time.perf_counter() - start
+
+    entries = compileBatch(problem_files, domains, ontology, output_dir,
+                           getattr(args, 'workers', None), options)
+    summary = summarize(entries)
+    if metrics is not None:
+        for entry in entries:
+            metrics.merge(entry.get('metrics', {}))
+    summary['load_seconds'] = load_seconds
+    summary['wall_seconds'] = time.perf_counter() - start
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as fd:
+        json.dump(summary, fd, indent=True)
+
+    print("Batch summary:", file=sys.stderr)
+    print(yaml.dump({ k: v for k, v in summary.items() if k != 'results' },
+                    default_flow_style=False, indent=4), file=sys.stderr)
+    for entry in entries:
+        if entry['error']:
+            print("Failed {}: {}".format(entry['problem'], entry['error']), file=sys.stderr)
+    writeMetrics(metrics, args)
+    if summary['failures']:
+        sys.exit(1)
+    return summary
@@ -0,0 +1,303 @@
+import os
+import sys
+import random
+import argparse
+
+
+#
+# Synthetic workloads at parameterized sizes.
+#
+# pillars: the demo2 pillar/hole domain with `predicates` ontology-backed
+#   insertable predicates (each an establishedWith SPARQL formula with its
+#   own size margin, and an action using it), `objects` pillars and holes,
+#   `facts` extra init facts and `triples` extra triples in the ontology.
+# sokoban: a width x height grid whose move-dir facts are not in the
+#   problem but established from adjacency triples of the ontology.
+#
+# Every workload is a domain, a problem and the two Turtle ontologies
+# (common and objects) expected by pddlsc.
+
+SHAPES = ['Circle', 'Square', 'EquilateralTriangle', 'Hexagon', 'Star', 'Ellipse']
+
+PILLARS_PREFIXES = '''@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix shapes: <uri:bench/shapes#> .
+@prefix action: <uri:bench/action/> .
+@prefix pddls: <uri:pddls#> .
+'''
+
+INSERTABLE_FORMULA = '''PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX shapes: <uri:bench/shapes#>
+SELECT DISTINCT ?pillar ?hole
+WHERE {{
+  ?pillar a ?pillar_type .
+  ?pillar_type rdfs:subClassOf shapes:Pillar .
+  ?pillar shapes:size ?pillar_size .
+  ?pillar_type shapes:sectionShape ?section_shape .
+  ?hole a ?hole_type .
+  ?hole_type rdfs:subClassOf shapes:Hole .
+  ?hole shapes:size ?hole_size .
+  ?hole_type shapes:sectionShape ?section_shape .
+  FILTER (?hole_size >= ?pillar_size + {margin})
+}}'''
+
+
+def pillarsDomain(predicates=1):
+    lines = ['(define (domain bench-pillars)',
+             '    (:requirements :strips :adl :typing)',
+             '    (:context',
+             '        clear - uri:bench/action/clear',
+             '        available - uri:bench/action/available',
+             '        noted - uri:bench/action/noted']
+    lines += ['        insertable{0} - uri:bench/action/insertable{0}'.format(k) for k in range(predicates)]
+    lines += ['    )',
+              '    (:types pillar hole)',
+              '    (:predicates',
+              '        (clear ?h - hole)',
+              '        (available ?p - pillar)',
+              '        (noted ?p - pillar ?h - hole)']
+    lines += ['        (insertable{} ?p - pillar ?h - hole)'.format(k) for k in range(predicates)]
+    lines += ['    )',
+              '    (:functions',
+              '        (number-of-pillars-inserted)',
+              '        (number-of-pillars-to-insert)',
+              '    )']
+    for k in range(predicates):
+        lines += ['    (:action pick-n-insert{}'.format(k),
+                  '        :parameters (?p - pillar ?h - hole)',
+                  '        :precondition (and (available ?p) (clear ?h) (insertable{} ?p ?h))'.format(k),
+                  '        :effect (and (not (available ?p)) (not (clear ?h))',
+                  '                     (increase (number-of-pillars-inserted) 1))',
+                  '    )']
+    lines.append(')')
+    return '\n'.join(lines) + '\n'
+
+
+def pillarsNames(objects):
+    pillars = ['Pillar_{}'.format(i) for i in range((objects + 1) // 2)]
+    holes = ['Hole_{}'.format(i) for i in range(objects // 2)]
+    return pillars, holes
+
+
+def pillarsProblem(objects, facts=0, seed=0):
+    rng = random.Random(seed)
+    pillars, holes = pillarsNames(objects)
+    lines = ['(define (problem bench-pillars-{})'.format(objects),
+             '    (:domain bench-pillars)',
+             '    (:context']
+    lines += ['        {0} - uri:bench/objects/{0}'.format(name) for name in pillars + holes]
+    lines += ['    )', '    (:objects']
+    lines += ['        {} - pillar'.format(name) for name in pillars]
+    lines += ['        {} - hole'.format(name) for name in holes]
+    lines += ['    )', '    (:init']
+    lines += ['        (available {})'.format(name) for name in pillars]
+    lines += ['        (clear {})'.format(name) for name in holes]
+    if holes:
+        noted = set()
+        while len(noted) < min(facts, len(pillars) * len(holes)):
+            noted.add((rng.choice(pillars), rng.choice(holes)))
+        lines += ['        (noted {} {})'.format(p, h) for p, h in sorted(noted)]
+    lines += ['        (= (number-of-pillars-inserted) 0)',
+              '        (= (number-of-pillars-to-insert) {})'.format(min(len(pillars), len(holes))),
+              '    )',
+              '    (:goal (and (= (number-of-pillars-inserted) (number-of-pillars-to-insert))))',
+              ')']
+    return '\n'.join(lines) + '\n'
+
+
+def pillarsOntology(predicates=1, shapes=len(SHAPES)):
+    lines = [PILLARS_PREFIXES,
+             'shapes:Pillar rdfs:subClassOf shapes:Thing .',
+             'shapes:Hole rdfs:subClassOf shapes:Thing .']
+    for shape in SHAPES[:shapes]:
+        lines.append('shapes:{0}Pillar shapes:sectionShape shapes:{0} ; rdfs:subClassOf shapes:Pillar .'.format(shape))
+        lines.append('shapes:{0}Hole shapes:sectionShape shapes:{0} ; rdfs:subClassOf shapes:Hole .'.format(shape))
+    for k in range(predicates):
+        lines.append('action:insertable{} pddls:establishedWith """{}"""@sparql .'.format(
+            k, INSERTABLE_FORMULA.format(margin=k * 0.5)))
+    return '\n'.join(lines) + '\n'
+
+
+def pillarsObjects(objects, triples=0, shapes=len(SHAPES), seed=0):
+    rng = random.Random(seed)
+    pillars, holes = pillarsNames(objects)
+    lines = [PILLARS_PREFIXES, '@prefix objects: <uri:bench/objects/> .']
+    for names, kind in ((pillars, 'Pillar'), (holes, 'Hole')):
+        for name in names:
+            lines.append('objects:{} a shapes:{}{} ; shapes:size {:.1f} .'.format(
+                name, rng.choice(SHAPES[:shapes]), kind, rng.randint(1, 10)))
+    # unrelated data, to grow the graph the formulas are evaluated on
+    for i in range(triples):
+        lines.append('objects:Extra_{} shapes:note {} .'.format(i // 4, i))
+    return '\n'.join(lines) + '\n'
+
+
+SOKOBAN_DOMAIN = '''(define (domain bench-sokoban)
+    (:requirements :typing)
+    (:context
+        move-dir - uri:bench/sokoban/move-dir
+        clear - uri:bench/sokoban/clear
+        at - uri:bench/sokoban/at
+        at-goal - uri:bench/sokoban/at-goal
+        is-goal - uri:bench/sokoban/is-goal
+    )
+    (:types thing location direction - object
+        player stone - thing)
+    (:predicates
+        (move-dir ?v0 - location ?v1 - location ?v2 - direction)
+        (clear ?v0 - location)
+        (at ?v0 - thing ?v1 - location)
+        (at-goal ?v0 - stone)
+        (is-goal ?v0 - location)
+    )
+    (:action move
+        :parameters (?p - player ?from - location ?to - location ?dir - direction)
+        :precondition (and (at ?p ?from) (clear ?to) (move-dir ?from ?to ?dir))
+        :effect (and (not (at ?p ?from)) (not (clear ?to)) (at ?p ?to) (clear ?from))
+    )
+    (:action push-to-goal
+        :parameters (?p - player ?s - stone ?ppos - location ?from - location ?to - location ?dir - direction)
+        :precondition (and (at ?p ?ppos) (at ?s ?from) (clear ?to)
+                           (move-dir ?ppos ?from ?dir) (move-dir ?from ?to ?dir) (is-goal ?to))
+        :effect (and (not (at ?p ?ppos)) (not (at ?s ?from)) (not (clear ?to))
+                     (at ?p ?from) (at ?s ?to) (clear ?ppos) (at-goal ?s))
+    )
+    (:action push-to-nongoal
+        :parameters (?p - player ?s - stone ?ppos - location ?from - location ?to - location ?dir - direction)
+        :precondition (and (at ?p ?ppos) (at ?s ?from) (clear ?to)
+                           (move-dir ?ppos ?from ?dir) (move-dir ?from ?to ?dir) (not (is-goal ?to)))
+        :effect (and (not (at ?p ?ppos)) (not (at ?s ?from)) (not (clear ?to))
+                     (at ?p ?from) (at ?s ?to) (clear ?ppos) (not (at-goal ?s)))
+    )
+)
+'''
+
+SOKOBAN_PREFIXES = '''@prefix sokoban: <uri:bench/sokoban/> .
+@prefix grid: <uri:bench/grid/> .
+@prefix pddls: <uri:pddls#> .
+'''
+
+MOVE_DIR_FORMULA = '''PREFIX sokoban: <uri:bench/sokoban/>
+SELECT ?from ?to ?dir
+WHERE {
+  ?from ?step ?to .
+  ?step sokoban:direction ?dir .
+}'''
+
+DIRECTIONS = [('dir-right', 1, 0), ('dir-left', -1, 0), ('dir-down', 0, 1), ('dir-up', 0, -1)]
+
+
+def sokobanDomain():
+    return SOKOBAN_DOMAIN
+
+
+def sokobanLayout(width, height, stones, seed=0):
+    """Return the player, stone and goal cells of a grid"""
+    rng = random.Random(seed)
+    inner = [(x, y) for x in range(2, width) for y in range(2, height)] or \
+        [(x, y) for x in range(1, width + 1) for y in range(1, height + 1)]
+    cells = rng.sample(inner, min(len(inner), 2 * stones + 1))
+    return cells[0], cells[1:stones + 1], cells[stones + 1:]
+
+
+def sokobanProblem(width, height, stones=1, seed=0):
+    player, stone_cells, goal_cells = sokobanLayout(width, height, stones, seed)
+    locations = ['pos-{}-{}'.format(x, y) for x in range(1, width + 1) for y in range(1, height + 1)]
+    occupied = set('pos-{}-{}'.format(x, y) for x, y in [player] + stone_cells)
+    lines = ['(define (problem bench-sokoban-{}x{})'.format(width, height),
+             '    (:domain bench-sokoban)',
+             '    (:context']
+    lines += ['        {0} - uri:bench/grid/{0}'.format(name) for name, _dx, _dy in DIRECTIONS]
+    lines += ['        {0} - uri:bench/grid/{0}'.format(name) for name in locations]
+    lines += ['    )', '    (:objects']
+    lines += ['        {} - direction'.format(name) for name, _dx, _dy in DIRECTIONS]
+    lines.append('        player-01 - player')
+    lines += ['        stone-{:02d} - stone'.format(i + 1) for i in range(len(stone_cells))]
+    lines += ['        {} - location'.format(name) for name in locations]
+    lines += ['    )', '    (:init']
+    lines.append('        (at player-01 pos-{}-{})'.format(*player))
+    lines += ['        (at stone-{:02d} pos-{}-{})'.format(i + 1, x, y) for i, (x, y) in enumerate(stone_cells)]
+    lines += ['        (is-goal pos-{}-{})'.format(x, y) for x, y in goal_cells]
+    lines += ['        (clear {})'.format(name) for name in locations if name not in occupied]
+    lines += ['    )', '    (:goal (and']
+    lines += ['        (at-goal stone-{:02d})'.format(i + 1) for i in range(len(stone_cells))]
+    lines += ['    ))', ')']
+    return '\n'.join(lines) + '\n'
+
+
+def sokobanOntology():
+    lines = [SOKOBAN_PREFIXES]
+    for name, _dx, _dy in DIRECTIONS:
+        lines.append('sokoban:step-{0} sokoban:direction grid:{0} .'.format(name))
+    lines.append('sokoban:move-dir pddls:establishedWith """{}"""@sparql .'.format(MOVE_DIR_FORMULA))
+    return '\n'.join(lines) + '\n'
+
+
+def sokobanObjects(width, height):
+    lines = [SOKOBAN_PREFIXES]
+    for x in range(1, width + 1):
+        for y in range(1, height + 1):
+            for name, dx, dy in DIRECTIONS:
+                if 1 <= x + dx <= width and 1 <= y + dy <= height:
+                    lines.append('grid:pos-{}-{} sokoban:step-{} grid:pos-{}-{} .'.format(x, y, name, x + dx, y + dy))
+    return '\n'.join(lines) + '\n'
+
+
+def writeWorkload(directory, files):
+    """Write {name: text} into directory and return {name: path}"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, text in files.items():
+        paths[name] = os.path.join(directory, name)
+        with open(paths[name], 'w') as fd:
+            fd.write(text)
+    return paths
+
+
+def generatePillars(directory, objects=10, predicates=1, facts=0, triples=0, seed=0):
+    return writeWorkload(directory, {
+        'domain.pddls': pillarsDomain(predicates),
+        'problem.pddls': pillarsProblem(objects, facts, seed),
+        'common.ttl': pillarsOntology(predicates),
+        'objects.ttl': pillarsObjects(objects, triples, seed=seed),
+    })
+
+
+def generateSokoban(directory, width=7, height=7, stones=2, seed=0):
+    return writeWorkload(directory, {
+        'domain.pddls': sokobanDomain(),
+        'problem.pddls': sokobanProblem(width, height, stones, seed),
+        'common.ttl': sokobanOntology(),
+        'objects.ttl': sokobanObjects(width, height),
+    })
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Generate a synthetic PDDLS workload.')
+    ap.add_argument('kind', choices=('pillars', 'sokoban'))
+    ap.add_argument('-o', '--output_dir', required=True,
+                    help='directory of the domain, problem and ontology files')
+    ap.add_argument('--objects', type=int, default=10,
+                    help='pillars: number of pillars and holes')
+    ap.add_argument('--predicates', type=int, default=1,
+                    help='pillars: number of establishedWith predicates')
+    ap.add_argument('--facts', type=int, default=0,
+                    help='pillars: number of extra init facts')
+    ap.add_argument('--triples', type=int, default=0,
+                    help='pillars: number of extra triples in the objects ontology')
+    ap.add_argument('--size', type=int, nargs=2, default=[7, 7], metavar=('WIDTH', 'HEIGHT'),
+                    help='sokoban: grid size')
+    ap.add_argument('--stones', type=int, default=2,
+                    help='sokoban: number of stones')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args(argv)
+    if args.kind == 'pillars':
+        paths = generatePillars(args.output_dir, args.objects, args.predicates, args.facts, args.triples, args.seed)
+    else:
+        paths = generateSokoban(args.output_dir, args.size[0], args.size[1], args.stones, args.seed)
+    for name, path in sorted(paths.items()):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
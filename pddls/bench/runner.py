@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ..metrics import peakRSS
+from .generate import generatePillars, generateSokoban
+
+
+#
+# Benchmark runner.
+#
+# Every workload is generated into a temporary directory and run in a fresh
+# (forked) process, so that its peak RSS is its own. The stages are timed
+# with the package's own entry points:
+#
+#   parse      parseAsJson of the domain and the problem
+#   ontology   loadOntology of the two Turtle files
+#   translate  translate
+#   serialize  serializePDDL of the domain and the result problem
+#   solve      metricff.solve, with the stub solver (pddls.stubff)
+#
+# Results are JSON, one entry per workload with the best and every time of
+# each stage and the peak RSS (kB) reached after it, and can be compared
+# between runs with the compare command.
+
+RESULTS_VERSION = 1
+
+SUITES = {
+    'small': [
+        ('pillars', {'objects': 10, 'predicates': 1}),
+        ('pillars', {'objects': 100, 'predicates': 2, 'facts': 100, 'triples': 1000}),
+        ('sokoban', {'width': 7, 'height': 7, 'stones': 2}),
+    ],
+    'medium': [
+        ('pillars', {'objects': 200, 'predicates': 2, 'facts': 1000, 'triples': 10000}),
+        ('pillars', {'objects': 500, 'predicates': 4, 'facts': 5000, 'triples': 50000}),
+        ('sokoban', {'width': 15, 'height': 15, 'stones': 4}),
+        ('sokoban', {'width': 30, 'height': 30, 'stones': 8}),
+    ],
+    'large': [
+        ('pillars', {'objects': 1000, 'predicates': 8, 'facts': 20000, 'triples': 200000}),
+        ('sokoban', {'width': 60, 'height': 60, 'stones': 16}),
+    ],
+}
+
+STAGES = ('parse', 'ontology', 'translate', 'serialize', 'solve')
+
+
+def workloadName(kind, params):
+    return '{}-{}'.format(kind, '-'.join('{}{}'.format(k, v) for k, v in sorted(params.items())))
+
+
+def generateWorkload(directory, kind, params):
+    if kind == 'pillars':
+        return generatePillars(directory, **params)
+    return generateSokoban(directory, **params)
+
+
+def stubEnvironment():
+    """The environment of the stub solver, run as "python -m pddls.stubff"
+    wherever the package is"""
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [package_root] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep) if p])
+    return env
+
+
+def runWorkload(kind, params, repeat=1, backend='antlr'):
+    """Generate and run one workload; meant to run in a process of its own"""
+    from ..pddl2json import parseAsJson
+    from ..json2pddl import serializePDDL
+    from ..pddlsc import translate, loadOntology
+    from ..solverpool import SolverPool
+    from .. import metricff
+
+    stages = dict((stage, {'seconds': []}) for stage in STAGES)
+    sizes = {}
+    with tempfile.TemporaryDirectory(prefix='pddls-bench-') as directory:
+        paths = generateWorkload(directory, kind, params)
+        stub = [sys.executable, '-m', 'pddls.stubff', '-o', '{domain}', '-f', '{problem}']
+        with SolverPool(stub, max_workers=1, env=stubEnvironment()) as pool:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                domain = parseAsJson(paths['domain.pddls'], backend=backend)
+                problem = parseAsJson(paths['problem.pddls'], backend=backend)
+                stages['parse']['seconds'].append(time.perf_counter() - start)
+                stages['parse']['peak_rss_kb'] = peakRSS()
+
+                start = time.perf_counter()
+                ontology = loadOntology([paths['objects.ttl'], paths['common.ttl']])
+                stages['ontology']['seconds'].append(time.perf_counter() - start)
+                stages['ontology']['peak_rss_kb'] = peakRSS()
+
+                start = time.perf_counter()
+                resultProblem, _resultDomains = translate(problem, ontology, [domain])
+                stages['translate']['seconds'].append(time.perf_counter() - start)
+                stages['translate']['peak_rss_kb'] = peakRSS()
+
+                start = time.perf_counter()
+                pddl_domain = serializePDDL(domain)
+                pddl_problem = serializePDDL(resultProblem)
+                stages['serialize']['seconds'].append(time.perf_counter() - start)
+                stages['serialize']['peak_rss_kb'] = peakRSS()
+
+                start = time.perf_counter()
+                plan = metricff.solve(pddl_domain, pddl_problem, {}, pool=pool)
+                stages['solve']['seconds'].append(time.perf_counter() - start)
+                stages['solve']['peak_rss_kb'] = peakRSS()
+
+        sizes = {
+            'objects': len(problem.get('pddl:objects', {})),
+            'init_facts': len(resultProblem['pddl:init']),
+            'triples': len(ontology),
+            'plan_length': len(plan['actions']),
+            'problem_bytes': len(pddl_problem),
+        }
+    for entry in stages.values():
+        entry['best'] = min(entry['seconds'])
+    return {
+        'workload': workloadName(kind, params),
+        'kind': kind,
+        'params': params,
+        'sizes': sizes,
+        'stages': stages,
+        'peak_rss_kb': peakRSS(),
+    }
+
+
+def gitRevision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runSuite(workloads, repeat=1, backend='antlr', out=sys.stderr):
+    results = []
+    for kind, params in workloads:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            result = executor.submit(runWorkload, kind, params, repeat, backend).result()
+        results.append(result)
+        print('{}: {}, peak RSS {} kB'.format(
+            result['workload'],
+            ', '.join('{} {:.3f}s'.format(stage, result['stages'][stage]['best']) for stage in STAGES),
+            result['peak_rss_kb']), file=out)
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'revision': gitRevision(),
+            'backend': backend,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, out=sys.stdout):
+    """Print the ratio current / baseline of the best time of each stage"""
+    before = dict((result['workload'], result) for result in baseline['results'])
+    out.write('{:64s} {:>10s} {:>10s} {:>10s} {:>8s}\n'.format('workload / stage', 'baseline', 'current', 'ratio', ''))
+    for result in current['results']:
+        old = before.get(result['workload'])
+        if old is None:
+            continue
+        for stage in STAGES:
+            a = old['stages'][stage]['best']
+            b = result['stages'][stage]['best']
+            ratio = b / a if a else float('inf')
+            mark = 'slower' if ratio > 1.1 else 'faster' if ratio < 0.9 else ''
+            out.write('{:64s} {:10.4f} {:10.4f} {:10.2f} {:>8s}\n'.format(
+                '{} / {}'.format(result['workload'], stage), a, b, ratio, mark))
+        out.write('{:64s} {:10d} {:10d} {:10.2f}\n'.format(
+            '{} / peak RSS kB'.format(result['workload']), old['peak_rss_kb'], result['peak_rss_kb'],
+            result['peak_rss_kb'] / old['peak_rss_kb'] if old['peak_rss_kb'] else float('inf')))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark parsing, translation, serialization and solving.')
+    sub = ap.add_subparsers(dest='command')
+    run = sub.add_parser('run', help='run a suite of synthetic workloads')
+    run.add_argument('--suite', choices=sorted(SUITES), default='small')
+    run.add_argument('--repeat', type=int, default=3,
+                     help='runs of each workload, the best time is reported')
+    run.add_argument('--backend', choices=('antlr', 'fast'), default='antlr',
+                     help='PDDL parser implementation')
+    run.add_argument('-o', '--output_file', type=str, default=None,
+                     help='JSON results file (default: stdout)')
+    cmp = sub.add_parser('compare', help='compare two results files')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    args = ap.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+        with open(args.current) as fd:
+            current = json.load(fd)
+        return compare(baseline, current)
+    if args.command != 'run':
+        ap.print_help()
+        return
+    results = runSuite(SUITES[args.suite], args.repeat, args.backend)
+    if args.output_file:
+        with open(args.output_file, 'w') as fd:
+            json.dump(results, fd, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import time
+import stat
+import socket
+import signal
+import logging
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .pddl2json import parseAsJson, parseTextAsJson, BACKENDS
+from .json2pddl import serializePDDL
+from .fastpddl import PddlSyntaxError
+from .rulecatalog import RuleCatalog
+from .sparqlcache import DEFAULT_MAXSIZE
+from .metrics import Metrics, stage, peakRSS
+from .pddlsc import (translate, loadOntology, loadQueryEngine, ontologyFingerprint, queryCacheFor,
+                     configureLogging, extractPredicateURIs, reportCatalog)
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# Compile daemon: "pddlsc serve" keeps the parsed domains, the ontology, its
+# RuleCatalog (compiled formulas), the query engine and the SPARQL cache
+# resident, and compiles problems sent over HTTP, on a TCP port or a Unix
+# socket (see daemonclient for the client side):
+#
+#   POST /compile  {"problem": PDDLS text} or {"problem_json": jsonized problem},
+#                  optionally "plan": true, "compact": true, "profile": true
+#               -> {"problem": PDDL text, "seconds": ..., "plan": {...}, "metrics": {...}}
+#   GET  /stats -> requests served, caches, and the metrics summed over requests
+#
+# At most max_concurrent requests compile at a time, the others wait up to
+# queue_timeout seconds and are then refused with 503.
+
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class Busy(RuntimeError):
+    pass
+
+
+class CompileService:
+    """The warm state of the daemon and the compilation of one request"""
+
+    def __init__(self, domain_files, ontology_files, store_path=None, backend='antlr',
+                 query_engine='rdflib', sparql_cache_size=None, sparql_cache_dir=None,
+                 solver=None, solver_workers=1, solver_timeout=None, memory_mb=None,
+                 plan_cache_dir=None, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, rebuild_store=False):
+        self.backend = backend
+        self.metrics = Metrics()
+        with stage(self.metrics, 'parse_domains'):
+            self.domains = [parseAsJson(domain_file, backend=backend) for domain_file in domain_files]
+        with stage(self.metrics, 'ontology'):
+            self.ontology = loadOntology(ontology_files, store_path, rebuild_store)
+            self.catalog = RuleCatalog(self.ontology)
+            reportCatalog(self.catalog, extractPredicateURIs(self.domains))
+            self.engine = loadQueryEngine(query_engine, self.ontology, store_path)
+            self.query_cache = queryCacheFor(argparse.Namespace(sparql_cache_size=sparql_cache_size,
+                                                                sparql_cache_dir=sparql_cache_dir))
+            self.fingerprint = None
+            if self.query_cache is not None:
+                self.fingerprint = ontologyFingerprint(ontology_files, store_path)
+
+        self.solver = solver
+        self.solver_workers = solver_workers
+        self.solver_timeout = solver_timeout
+        self.memory_mb = memory_mb
+        self.plan_cache_dir = plan_cache_dir
+        self.pool = None
+        self.plan_cache = None
+        self.pddl_domain = None
+
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.queue_timeout = queue_timeout
+        # the ANTLR runtime shares its DFA cache between parsers, unguarded
+        self.parse_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.served = 0
+        self.failed = 0
+        self.refused = 0
+
+    def solverPool(self):
+        with self.lock:
+            if self.pool is None:
+                from .solverpool import SolverPool
+                from .plancache import PlanCache
+                from .metricff import solverCommand
+                self.pool = SolverPool(solverCommand(self.solver), self.solver_workers,
+                                       self.solver_timeout, self.memory_mb)
+                if self.plan_cache_dir:
+                    self.plan_cache = PlanCache(cache_dir=self.plan_cache_dir)
+                self.pddl_domain = serializePDDL(dict((k, v) for k, v in self.domains[0].items()
+                                                      if k != '@context'))
+            return self.pool
+
+    def parseProblem(self, request):
+        if 'problem_json' in request:
+            problem = request['problem_json']
+            if not isinstance(problem, dict) or 'pddl:objects' not in problem:
+                raise BadRequest('problem_json is not a jsonized PDDL problem')
+            return problem
+        text = request.get('problem')
+        if not isinstance(text, str):
+            raise BadRequest('Expected "problem" (PDDLS text) or "problem_json"')
+        try:
+            if self.backend == 'antlr':
+                with self.parse_lock:
+                    problem = parseTextAsJson(text, self.backend)
+            else:
+                problem = parseTextAsJson(text, self.backend)
+        except PddlSyntaxError as e:
+            raise BadRequest('Syntax error: {}'.format(e))
+        if 'pddl:objects' not in problem:
+            raise BadRequest('Not a PDDLS problem')
+        return problem
+
+    def compile(self, request):
+        """Compile one request, see the protocol above"""
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            with self.lock:
+                self.refused += 1
+            raise Busy('No free compilation slot after {} s'.format(self.queue_timeout))
+        try:
+            response = self.compileRequest(request)
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            self.slots.release()
+        with self.lock:
+            self.served += 1
+        return response
+
+    def compileRequest(self, request):
+        start = time.perf_counter()
+        metrics = Metrics()
+        with metrics.timer('parse_problem'):
+            problem = self.parseProblem(request)
+        with metrics.timer('translate'):
+            resultProblem, _resultDomains = translate(problem, self.ontology, self.domains,
+                                                      query_cache=self.query_cache,
+                                                      ontology_fingerprint=self.fingerprint,
+                                                      catalog=self.catalog, engine=self.engine,
+                                                      metrics=metrics)
+        with metrics.timer('serialize'):
+            pddl_problem = serializePDDL(resultProblem, request.get('compact', False))
+        response = { 'problem': pddl_problem }
+        if request.get('plan'):
+            from .metricff import solve, UnsolvableProblem
+            pool = self.solverPool()
+            with metrics.timer('solve'):
+                try:
+                    response['plan'] = solve(self.pddl_domain, pddl_problem,
+                                             request.get('bindings') or {}, pool=pool,
+                                             plan_cache=self.plan_cache)
+                except UnsolvableProblem as e:
+                    response['plan'] = None
+                    response['plan_error'] = str(e)
+        response['seconds'] = time.perf_counter() - start
+        self.metrics.merge(metrics)
+        if request.get('profile'):
+            response['metrics'] = metrics.toDict()
+        return response
+
+    def stats(self):
+        with self.lock:
+            result = {
+                'uptime_seconds': time.time() - self.started,
+                'served': self.served,
+                'failed': self.failed,
+                'refused': self.refused,
+                'peak_rss_kb': peakRSS(),
+            }
+        if self.query_cache is not None:
+            result['sparql_cache'] = self.query_cache.stats()
+        if self.plan_cache is not None:
+            result['plan_cache'] = self.plan_cache.stats()
+        if self.engine is not None:
+            result['query_engine'] = self.engine.stats()
+        result['metrics'] = self.metrics.toDict()
+        return result
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class CompileHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self.reply(200, self.server.service.stats())
+        self.reply(404, { 'error': 'Unknown path {}'.format(self.path) })
+
+    def do_POST(self):
+        if self.path != '/compile':
+            return self.reply(404, { 'error': 'Unknown path {}'.format(self.path) })
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(request, dict):
+                raise BadRequest('Expected a JSON object')
+            response = self.server.service.compile(request)
+        except (ValueError, BadRequest) as e:
+            return self.reply(400, { 'error': str(e) })
+        except Busy as e:
+            return self.reply(503, { 'error': str(e) })
+        except Exception as e:
+            logger.exception("Compilation failed")
+            return self.reply(500, { 'error': '{}: {}'.format(type(e).__name__, e) })
+        self.reply(200, response)
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # client_address is empty on a Unix socket
+        logger.info(format, *args)
+
+
+def removeStaleSocket(path):
+    """Remove the socket left at path by a killed daemon. Raise
+    FileExistsError if path is not a socket or a daemon still answers on it."""
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError('{} exists and is not a socket'.format(path))
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise FileExistsError('A daemon is already serving on {}'.format(path))
+
+
+def fileKey(path):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, handler):
+        removeStaleSocket(path)
+        super().__init__(path, handler)
+        self.path = path
+        self.key = fileKey(path)
+
+    def server_close(self):
+        super().server_close()
+        # only our own socket, not one bound at the same path since
+        if self.key is not None and fileKey(self.path) == self.key:
+            os.unlink(self.path)
+
+
+def makeServer(service, socket_path=None, host='127.0.0.1', port=0):
+    """An HTTP server of the service on a Unix socket, or else on a TCP port"""
+    if socket_path:
+        server = UnixHTTPServer(socket_path, CompileHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), CompileHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(service, socket_path=None, host='127.0.0.1', port=0):
+    server = makeServer(service, socket_path, host, port)
+    address = socket_path or '{}:{}'.format(*server.server_address[:2])
+    # SIGTERM stops the daemon as Ctrl-C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print("Serving on {}".format(address), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def argParser():
+    ap = argparse.ArgumentParser(prog='pddlsc serve',
+                                 description='Compile PDDLS problems sent over HTTP against resident'
+                                             ' domains and ontology.')
+    ap.add_argument('-d', '--domain_file', nargs='+', type=str, required=True,
+                    help='PDDLS file(s) for domain')
+    ap.add_argument('-r', '--ontology_file', nargs='+', type=str, default=[],
+                    help='RDF file(s) for ontology')
+    ap.add_argument('-s', '--ontology_store', type=str, default=None,
+                    help='precompiled ontology store (see "pddlsc ontology compile")')
+    ap.add_argument('--rebuild_store', action='store_true', default=False,
+                    help='recompile the ontology store from the ontology files')
+    ap.add_argument('--socket', type=str, default=None,
+                    help='listen on this Unix socket instead of a TCP port')
+    ap.add_argument('--host', type=str, default='127.0.0.1',
+                    help='address to listen on')
+    ap.add_argument('--port', type=int, default=8390,
+                    help='TCP port to listen on')
+    ap.add_argument('--max_concurrent', type=int, default=DEFAULT_MAX_CONCURRENT,
+                    help='requests compiled at the same time')
+    ap.add_argument('--queue_timeout', type=float, default=DEFAULT_QUEUE_TIMEOUT,
+                    help='seconds a request waits for a free slot before being refused')
+    ap.add_argument('--backend', choices=BACKENDS, default='antlr',
+                    help='PDDL parser implementation')
+    ap.add_argument('--query_engine', choices=('rdflib', 'numpy'), default='rdflib',
+                    help='evaluate the formulas with rdflib, or with a NumPy triple store')
+    ap.add_argument('--sparql_cache_size', type=int, default=None,
+                    help='SPARQL results kept in memory (default: no cache, or {} with'
+                         ' --sparql_cache_dir)'.format(DEFAULT_MAXSIZE))
+    ap.add_argument('--sparql_cache_dir', type=str, default=None,
+                    help='directory persisting SPARQL results across runs')
+    ap.add_argument('--solver', type=str, default=None,
+                    help='Metric-FF command for the requests asking for a plan'
+                         ' (default: $PDDLS_METRICFF or the bundled binary)')
+    ap.add_argument('--solver_workers', type=int, default=1,
+                    help='solver processes running at the same time')
+    ap.add_argument('--solver_timeout', type=float, default=None,
+                    help='wall-clock limit of the solver in seconds')
+    ap.add_argument('--memory_mb', type=int, default=None,
+                    help='address space limit of the solver in megabytes')
+    ap.add_argument('--plan_cache_dir', type=str, default=None,
+                    help='directory of the persistent plan cache (disabled by default)')
+    ap.add_argument('-v', '--verbose', action='count', default=0,
+                    help='log diagnostics to stderr (-v for requests, -vv for details)')
+    return ap
+
+
+def main(argv=None):
+    args = argParser().parse_args(argv)
+    configureLogging(args.verbose)
+    if args.socket:
+        # before loading anything
+        try:
+            removeStaleSocket(args.socket)
+        except FileExistsError as e:
+            print("Not serving: {}".format(e), file=sys.stderr)
+            sys.exit(1)
+    start = time.perf_counter()
+    service = CompileService(args.domain_file, args.ontology_file, args.ontology_store, args.backend,
+                             args.query_engine, args.sparql_cache_size, args.sparql_cache_dir,
+                             args.solver, args.solver_workers, args.solver_timeout, args.memory_mb,
+                             args.plan_cache_dir, args.max_concurrent, args.queue_timeout,
+                             rebuild_store=args.rebuild_store)
+    print("Loaded {} domain(s) and {} triple(s) in {:.3f} s".format(
+        len(service.domains), len(service.ontology), time.perf_counter() - start), file=sys.stderr)
+    serve(service, args.socket, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import sys
+import json
+import socket
+import argparse
+import http.client
+
+
+#
+# Thin client of the compile daemon (see daemon). It only imports the
+# standard library, so that a compilation costs an interpreter start and a
+# round trip, not the import of ANTLR and rdflib.
+
+DEFAULT_PORT = 8390
+
+
+class DaemonError(RuntimeError):
+    def __init__(self, status, message):
+        super().__init__('{} {}'.format(status, message))
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def connection(socket_path=None, host='127.0.0.1', port=DEFAULT_PORT, timeout=None):
+    if socket_path:
+        return UnixHTTPConnection(socket_path, timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def call(method, path, body=None, socket_path=None, host='127.0.0.1', port=DEFAULT_PORT, timeout=None):
+    """Send one request to the daemon and return its decoded JSON response"""
+    conn = connection(socket_path, host, port, timeout)
+    try:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = { 'Content-Type': 'application/json' } if data is not None else {}
+        conn.request(method, path, data, headers)
+        response = conn.getresponse()
+        result = json.loads(response.read().decode('utf-8'))
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise DaemonError(response.status, result.get('error', response.reason))
+    return result
+
+
+def compileProblem(problem, plan=False, compact=False, profile=False, **address):
+    """Compile a problem, PDDLS text or a jsonized problem, with the daemon"""
+    request = { 'plan': plan, 'compact': compact, 'profile': profile }
+    request['problem_json' if isinstance(problem, dict) else 'problem'] = problem
+    return call('POST', '/compile', request, **address)
+
+
+def stats(**address):
+    return call('GET', '/stats', **address)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Translate PDDLS to PDDL with a running "pddlsc serve" daemon.')
+    ap.add_argument('input_pddls_file', type=str, nargs='?',
+                    help='source problem PDDLS, or a jsonized problem (.json, .jsonld)')
+    ap.add_argument('-o', '--output_file', type=argparse.FileType('w'), default=sys.stdout,
+                    help='Output problem PDDL file')
+    ap.add_argument('--socket', type=str, default=None,
+                    help='Unix socket of the daemon')
+    ap.add_argument('--host', type=str, default='127.0.0.1',
+                    help='address of the daemon')
+    ap.add_argument('--port', type=int, default=DEFAULT_PORT,
+                    help='TCP port of the daemon')
+    ap.add_argument('--timeout', type=float, default=None,
+                    help='seconds to wait for the daemon')
+    ap.add_argument('--compact', action='store_true', default=False,
+                    help='write the PDDL without indentation nor line breaks')
+    ap.add_argument('--plan', action='store_true', default=False,
+                    help='also solve the problem and print the plan (JSON) to stderr')
+    ap.add_argument('--plan_file', type=argparse.FileType('w'), default=None,
+                    help='with --plan, write the plan (JSON) into this file instead')
+    ap.add_argument('--profile', action='store_true', default=False,
+                    help='print the metrics of the compilation to stderr')
+    ap.add_argument('--stats', action='store_true', default=False,
+                    help='print the statistics of the daemon instead of compiling')
+    args = ap.parse_args(argv)
+    address = { 'socket_path': args.socket, 'host': args.host, 'port': args.port, 'timeout': args.timeout }
+
+    if args.stats:
+        print(json.dumps(stats(**address), indent=1))
+        return
+    if not args.input_pddls_file:
+        ap.error('the input problem is required')
+    with open(args.input_pddls_file, 'r', encoding='utf-8') as fd:
+        if args.input_pddls_file[-5:] == '.json' or args.input_pddls_file[-7:] == '.jsonld':
+            problem = json.load(fd)
+        else:
+            problem = fd.read()
+    try:
+        response = compileProblem(problem, args.plan, args.compact, args.profile, **address)
+    except (DaemonError, OSError) as e:
+        print("Compilation failed: {}".format(e), file=sys.stderr)
+        sys.exit(1)
+    args.output_file.write(response['problem'])
+    if args.profile:
+        print(json.dumps(response.get('metrics'), indent=1), file=sys.stderr)
+    if args.plan:
+        if response.get('plan') is None:
+            print("No plan: {}".format(response.get('plan_error')), file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(response['plan'], indent=1), file=args.plan_file or sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+from array import array
+from collections import OrderedDict
+
+from .fastpddl import tokenize
+
+
+#
+# Structured :init and :goal.
+#
+# Parsed problems keep every init element and the goal as toText strings
+# such as '( at robot room1 )'. In structured mode the symbols are interned
+# once in a SymbolTable, the atoms of each predicate are flat arrays of
+# symbol ids, numeric fluents '( = ( f a ) 3 )' are kept apart with their
+# values, and anything else (negations, timed literals, ...) as well as the
+# goal becomes a Formula, a tree of symbol ids.
+#
+# A FactTable iterates over the same strings as the original list (grouped
+# by predicate), so json2pddl prints it unchanged.
+
+class SymbolTable:
+
+    def __init__(self):
+        self.symbols = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def intern(self, symbol):
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def symbol(self, symbol_id):
+        return self.symbols[symbol_id]
+
+
+def parseTree(tokens, symbols):
+    """Return the tree (nested tuples of symbol ids) of a tokenized expression"""
+    stack = [[]]
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            node = tuple(stack.pop())
+            stack[-1].append(node)
+        else:
+            stack[-1].append(symbols.intern(token))
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError('Unbalanced expression: {}'.format(' '.join(tokens)))
+    return stack[0][0]
+
+
+def treeText(tree, symbols):
+    if type(tree) is tuple:
+        return ' '.join(['('] + [treeText(node, symbols) for node in tree] + [')'])
+    return symbols.symbol(tree)
+
+
+def parseNumber(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+class Formula:
+    """An interned PDDL expression whose str() is its toText form"""
+
+    __slots__ = ('tree', 'symbols')
+
+    def __init__(self, tree, symbols):
+        self.tree = tree
+        self.symbols = symbols
+
+    @classmethod
+    def fromText(cls, text, symbols):
+        return cls(parseTree(tokenize(text), symbols), symbols)
+
+    def __str__(self):
+        return treeText(self.tree, self.symbols)
+
+    def __repr__(self):
+        return 'Formula({!r})'.format(str(self))
+
+    def __eq__(self, other):
+        return isinstance(other, Formula) and self.symbols is other.symbols and self.tree == other.tree
+
+    def __hash__(self):
+        return hash(self.tree)
+
+
+class FactTable:
+    """The :init of a problem as interned, per-predicate arrays"""
+
+    def __init__(self, symbols=None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.atoms = OrderedDict()    # (predicate id, arity) -> array of argument ids
+        self.fluents = OrderedDict()  # (function id, argument ids) -> number
+        self.formulas = []            # any other init element
+
+    @classmethod
+    def fromStrings(cls, init, symbols=None):
+        table = cls(symbols)
+        for text in init:
+            table.addText(text)
+        return table
+
+    def copy(self):
+        table = FactTable(self.symbols)
+        for key, args in self.atoms.items():
+            table.atoms[key] = array('I', args)
+        table.fluents = OrderedDict(self.fluents)
+        table.formulas = list(self.formulas)
+        return table
+
+    def add(self, predicate, args):
+        intern = self.symbols.intern
+        key = (intern(predicate), len(args))
+        column = self.atoms.get(key)
+        if column is None:
+            column = self.atoms[key] = array('I')
+        if args:
+            column.extend(intern(arg) for arg in args)
+        else:
+            column.append(0) # one placeholder per nullary atom
+
+    def addFluent(self, function, args, value):
+        intern = self.symbols.intern
+        self.fluents[(intern(function), tuple(intern(arg) for arg in args))] = value
+
+    def addText(self, text):
+        tokens = tokenize(str(text))
+        inner = tokens[1:-1]
+        if tokens[:1] == ['('] and tokens[-1:] == [')'] and inner and '(' not in inner and ')' not in inner \
+           and inner[0] not in ('=', 'not'):
+            self.add(inner[0], inner[1:])
+            return
+        if tokens[:3] == ['(', '=', '('] and tokens[-1] == ')' and ')' in tokens[3:]:
+            close = tokens.index(')', 3)
+            rest = tokens[close + 1:-1]
+            if '(' not in tokens[3:close] and len(rest) == 1:
+                try:
+                    value = parseNumber(rest[0])
+                except ValueError:
+                    value = None
+                if value is not None:
+                    self.addFluent(tokens[3], tokens[4:close], value)
+                    return
+        self.formulas.append(Formula(parseTree(tokens, self.symbols), self.symbols))
+
+    def iterAtoms(self, predicate=None):
+        """Yield (predicate, args) of the atoms (of one predicate)"""
+        symbol = self.symbols.symbol
+        for (predicate_id, arity), column in self.atoms.items():
+            name = symbol(predicate_id)
+            if predicate is not None and name != predicate:
+                continue
+            for i in range(0, len(column), arity or 1):
+                yield name, tuple(symbol(a) for a in column[i:i + arity])
+
+    def __len__(self):
+        return sum(len(column) // (arity or 1) for (_id, arity), column in self.atoms.items()) \
+            + len(self.fluents) + len(self.formulas)
+
+    def __iter__(self):
+        for predicate, args in self.iterAtoms():
+            yield ' '.join(['(', predicate] + list(args) + [')'])
+        symbol = self.symbols.symbol
+        for (function_id, arg_ids), value in self.fluents.items():
+            yield ' '.join(['(', '=', '(', symbol(function_id)] + [symbol(a) for a in arg_ids]
+                           + [')', str(value), ')'])
+        for formula in self.formulas:
+            yield str(formula)
+
+    def __add__(self, other):
+        table = self.copy()
+        if isinstance(other, FactTable):
+            for predicate, args in other.iterAtoms():
+                table.add(predicate, args)
+            symbol = other.symbols.symbol
+            for (function_id, arg_ids), value in other.fluents.items():
+                table.addFluent(symbol(function_id), [symbol(a) for a in arg_ids], value)
+            for formula in other.formulas:
+                table.addText(str(formula))
+        else:
+            for text in other:
+                table.addText(text)
+        return table
+
+    def toStrings(self):
+        return list(self)
+
+
+def structureProblem(problem, symbols=None):
+    """Replace the :init and :goal strings of a problem with a FactTable and
+    a Formula sharing one SymbolTable"""
+    symbols = symbols if symbols is not None else SymbolTable()
+    problem['pddl:init'] = FactTable.fromStrings(problem.get('pddl:init', []), symbols)
+    if isinstance(problem.get('pddl:goal'), str):
+        problem['pddl:goal'] = Formula.fromText(problem['pddl:goal'], symbols)
+    return problem
+
+
+def destructureProblem(problem):
+    """Back to the string form of the parsers"""
+    if isinstance(problem.get('pddl:init'), FactTable):
+        problem['pddl:init'] = problem['pddl:init'].toStrings()
+    if isinstance(problem.get('pddl:goal'), Formula):
+        problem['pddl:goal'] = str(problem['pddl:goal'])
+    return problem
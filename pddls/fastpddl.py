@@ -0,0 +1,460 @@
+import os
+import re
+import sys
+import mmap
+import time
+import argparse
+from collections import OrderedDict
+
+
+#
+# A hand-written tokenizer and recursive-descent parser producing the same
+# jsonized PDDL as Pddl2JsonVisitor, without the ANTLR runtime.
+#
+# Element texts (init elements, goals, preconditions, ...) are rendered the
+# way toText() renders ANTLR parse trees: every token separated by a space.
+
+_TOKEN = re.compile(r';[^\n]*|[()]|[^\s();]+')
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text) if t[0] != ';']
+
+
+def readText(input_file):
+    with open(input_file, 'r', encoding='utf-8-sig') as fd:
+        return fd.read()
+
+
+class PddlSyntaxError(RuntimeError):
+    pass
+
+
+class FastPddlParser:
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def error(self, message):
+        context = ' '.join(self.tokens[max(0, self.pos - 5):self.pos + 5])
+        return PddlSyntaxError('{} at token {} near "{}"'.format(message, self.pos, context))
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise self.error('Unexpected end of input')
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def peek(self):
+        if self.pos >= len(self.tokens):
+            raise self.error('Unexpected end of input')
+        return self.tokens[self.pos]
+
+    def expect(self, expected):
+        token = self.next()
+        if token != expected:
+            self.pos -= 1
+            raise self.error("Expected '{}' but found '{}'".format(expected, token))
+        return token
+
+    def skip(self):
+        """Skip one token or parenthesized group and return its end position"""
+        tokens = self.tokens
+        if tokens[self.pos] != '(':
+            self.pos += 1
+            return self.pos
+        depth = 0
+        pos = self.pos
+        n = len(tokens)
+        while pos < n:
+            token = tokens[pos]
+            pos += 1
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth == 0:
+                    self.pos = pos
+                    return pos
+        raise self.error('Unbalanced parentheses')
+
+    def text(self):
+        """Consume one element and render it as toText() does"""
+        start = self.pos
+        end = self.skip()
+        return ' '.join(self.tokens[start:end])
+
+    def typeText(self):
+        # r_type.getText() concatenates without separators, e.g. (eitherab)
+        start = self.pos
+        end = self.skip()
+        return ''.join(self.tokens[start:end])
+
+    # pddlDoc : domain | problem
+    def pddlDoc(self):
+        result = OrderedDict()
+        self.expect('(')
+        self.expect('define')
+        self.expect('(')
+        kind = self.next()
+        if kind == 'domain':
+            result['domain'] = self.next()
+            self.expect(')')
+            self.domainBody(result)
+        elif kind == 'problem':
+            result['problem'] = self.next()
+            self.expect(')')
+            self.problemBody(result)
+        else:
+            self.pos -= 1
+            raise self.error("Expected 'domain' or 'problem' but found '{}'".format(kind))
+        self.expect(')')
+        return result
+
+    def domainBody(self, result):
+        while self.peek() == '(':
+            self.next()
+            keyword = self.next()
+            if keyword == ':requirements':
+                result['pddl:requirements'] = self.requireKeys()
+            elif keyword == ':context':
+                result['@context'] = self.contextBindings()
+            elif keyword == ':types':
+                result['pddl:types'] = self.typedNameList()
+            elif keyword == ':constants':
+                result['pddl:constants'] = self.typedNameList()
+            elif keyword == ':predicates':
+                result['pddl:predicates'] = self.predicates()
+            elif keyword == ':functions':
+                result['pddl:functions'] = self.functions()
+            elif keyword == ':action':
+                structure = result.setdefault('structure', [])
+                structure.append(self.actionDef())
+            elif keyword == ':durative-action':
+                structure = result.setdefault('structure', [])
+                structure.append(self.durativeActionDef())
+            elif keyword == ':derived':
+                result.setdefault('structure', [])
+                self.skipRest()
+            else:
+                # :constraints
+                self.skipRest()
+
+    def problemBody(self, result):
+        while self.peek() == '(':
+            self.next()
+            keyword = self.next()
+            if keyword == ':domain':
+                result['pddl:problem_domain'] = self.next()
+                self.expect(')')
+            elif keyword == ':requirements':
+                result['pddl:requirements'] = self.requireKeys()
+            elif keyword == ':context':
+                result['@context'] = self.contextBindings()
+            elif keyword == ':objects':
+                result['pddl:objects'] = self.typedNameList()
+            elif keyword == ':init':
+                result['pddl:init'] = self.initEls()
+            elif keyword == ':goal':
+                result['pddl:goal'] = self.text()
+                self.expect(')')
+            else:
+                # :constraints, :metric
+                self.skipRest()
+
+    def skipRest(self):
+        while self.peek() != ')':
+            self.skip()
+        self.next()
+
+    # ( :requirements <REQUIRE_KEY>+ )
+    def requireKeys(self):
+        keys = []
+        while self.peek() != ')':
+            keys.append(self.next())
+        self.next()
+        return keys
+
+    # ( :context <name> - <namespace> ... )
+    def contextBindings(self):
+        bindings = OrderedDict()
+        while self.peek() != ')':
+            name = self.next()
+            self.expect('-')
+            bindings[name] = self.next()
+        self.next()
+        return bindings
+
+    # <name>+ (- <type>)? ... )
+    def typedNameList(self):
+        result = OrderedDict()
+        pending = []
+        while self.peek() != ')':
+            token = self.next()
+            if token == '-':
+                typing = self.typeText()
+                for name in pending:
+                    result[name] = typing
+                pending = []
+            else:
+                pending.append(token)
+        self.next()
+        for name in pending:
+            result[name] = None
+        return result
+
+    # <VARIABLE>* (- <type>)? ... )
+    def typedVariableList(self):
+        variables = []
+        pending = []
+        while self.peek() != ')':
+            token = self.next()
+            if token == '-':
+                typing = self.typeText()
+                variables.extend({ v: typing } for v in pending)
+                pending = []
+            else:
+                pending.append(token)
+        self.next()
+        variables.extend(pending)
+        return variables
+
+    # ( :predicates ( <predicate> <typedVariableList> )+ )
+    def predicates(self):
+        predicates = []
+        while self.peek() != ')':
+            self.expect('(')
+            predicate = self.next()
+            predicates.append({ predicate: self.typedVariableList() })
+        self.next()
+        return predicates
+
+    # ( :functions [ ( <functionSymbol> <typedVariableList> ) (- <functionType>)? ]* )
+    def functions(self):
+        functions = []
+        while self.peek() != ')':
+            if self.peek() == '-':
+                self.next()
+                self.skip() # functionType
+                continue
+            self.expect('(')
+            functionSymbol = self.next()
+            functions.append({ functionSymbol: self.typedVariableList() })
+        self.next()
+        return functions
+
+    # ( :action <actionSymbol> :parameters ( <typedVariableList> ) <actionDefBody> )
+    def actionDef(self):
+        action = OrderedDict()
+        action['pddl:action'] = self.next()
+        self.expect(':parameters')
+        self.expect('(')
+        action['pddl:parameters'] = self.typedVariableList()
+        self.body(action, (':precondition', ':effect'))
+        return action
+
+    # ( :durative-action <actionSymbol> :parameters ( <typedVariableList> ) <daDefBody> )
+    def durativeActionDef(self):
+        action = OrderedDict()
+        action['pddl:durative-action'] = self.next()
+        self.expect(':parameters')
+        self.expect('(')
+        action['pddl:parameters'] = self.typedVariableList()
+        self.body(action, (':duration', ':condition', ':effect'))
+        return action
+
+    def body(self, action, keywords):
+        while self.peek() != ')':
+            keyword = self.next()
+            if keyword not in keywords:
+                self.pos -= 1
+                raise self.error("Unexpected '{}' in {}".format(keyword, action))
+            action['pddl:' + keyword[1:]] = self.text()
+        self.next()
+
+    # ( :init <initEl>* )
+    def initEls(self):
+        init = []
+        tokens = self.tokens
+        while self.peek() != ')':
+            start = self.pos
+            end = self.skip()
+            init.append(' '.join(tokens[start:end]))
+        self.next()
+        return init
+
+
+def parseText(text):
+    """Return a jsonized PDDL for a given PDDL text"""
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    return FastPddlParser(tokenize(text)).pddlDoc()
+
+
+#
+# The Parser API
+def parseAsJson(input_file):
+    """Return a jsonized PDDL for a given file, parsed without ANTLR"""
+    return parseText(readText(input_file))
+
+
+#
+# Streaming :init
+_BYTES_TOKEN = re.compile(rb';[^\n]*|[()]|[^\s();]+')
+_BYTES_PAREN = re.compile(rb';[^\n]*|[()]')
+_BOM = b'\xef\xbb\xbf'
+
+
+def _fileState(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _mapFile(path):
+    with open(path, 'rb') as fd:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class InitStream:
+    """The :init elements of a problem file, read lazily.
+
+    Iterating yields the same strings parseAsJson puts into 'pddl:init',
+    one at a time, and may be repeated; the file is only memory-mapped for
+    the time of an iteration. Adding a list (e.g. derived axioms) returns a
+    new stream that yields them after the file's elements.
+    """
+
+    def __init__(self, path, start, end, tail=(), state=None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.tail = list(tail)
+        self.state = state or _fileState(path)
+
+    def __iter__(self):
+        if _fileState(self.path) != self.state:
+            raise PddlSyntaxError('{} changed since it was parsed'.format(self.path))
+        mapped = _mapFile(self.path)
+        try:
+            depth = 0
+            element = []
+            for match in _BYTES_TOKEN.finditer(mapped, self.start, self.end):
+                token = match.group()
+                if token[0] == 0x3b: # ';' comment
+                    continue
+                element.append(token)
+                if token == b'(':
+                    depth += 1
+                elif token == b')':
+                    depth -= 1
+                    if depth == 0:
+                        yield b' '.join(element).decode('utf-8')
+                        element = []
+        finally:
+            mapped.close()
+        for axiom in self.tail:
+            yield axiom
+
+    def __add__(self, other):
+        return InitStream(self.path, self.start, self.end, self.tail + list(other), self.state)
+
+
+def _skipGroup(mapped, pos, end):
+    """Return the offset of the ')' closing the group opened before pos"""
+    depth = 1
+    for match in _BYTES_PAREN.finditer(mapped, pos, end):
+        token = match.group()
+        if token == b'(':
+            depth += 1
+        elif token == b')':
+            depth -= 1
+            if depth == 0:
+                return match.start()
+    raise PddlSyntaxError('Unbalanced parentheses in :init')
+
+
+def iterProblem(input_file):
+    """Return a jsonized PDDL problem whose 'pddl:init' is an InitStream.
+
+    The header sections (objects, goal, ...) are parsed eagerly, while the
+    :init elements stay in the file (mapped while iterated over), so
+    that very large problems are never materialized as a whole.
+    """
+    state = _fileState(input_file)
+    if not state[1]:
+        raise PddlSyntaxError('Unexpected end of input: {} is empty'.format(input_file))
+    mapped = _mapFile(input_file)
+    try:
+        doc, init_span = _scanProblem(mapped)
+    finally:
+        mapped.close()
+    if init_span is not None:
+        doc['pddl:init'] = InitStream(input_file, *init_span, state=state)
+    return doc
+
+
+def _scanProblem(mapped):
+    """Parse the header sections of a mapped problem and locate its :init"""
+    end = len(mapped)
+    pos = len(_BOM) if mapped[:len(_BOM)] == _BOM else 0
+
+    header = []
+    init_span = None
+    depth = 0
+    while True:
+        match = _BYTES_TOKEN.search(mapped, pos, end)
+        if match is None:
+            break
+        pos = match.end()
+        token = match.group()
+        if token[0] == 0x3b: # ';' comment
+            continue
+        token = token.decode('utf-8')
+        if token == ':init' and depth == 2 and header[-1] == '(' and init_span is None:
+            init_end = _skipGroup(mapped, pos, end)
+            init_span = (pos, init_end)
+            pos = init_end
+        elif token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        header.append(token)
+
+    return FastPddlParser(header).pddlDoc(), init_span
+
+
+def benchmark(input_file, repeat=3, backends=('antlr', 'fast'), out=sys.stdout):
+    """Report the parse throughput of each backend on a file"""
+    from .pddl2json import parseAsJson as parseAsJsonWith
+    size = len(readText(input_file))
+    results = {}
+    for backend in backends:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            doc = parseAsJsonWith(input_file, backend=backend)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        facts = len(doc.get('pddl:init', []))
+        results[backend] = best
+        out.write('{:6s} {:10.4f} s {:10.2f} MB/s {:12.0f} init facts/s\n'.format(
+            backend, best, size / best / 1e6, facts / best))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Measure the parse throughput of the PDDL parsers.')
+    ap.add_argument('input_pddl_file', nargs='+',
+                    help='input PDDL(S) files')
+    ap.add_argument('--repeat', type=int, default=3,
+                    help='repetitions per backend')
+    args = ap.parse_args()
+    for input_file in args.input_pddl_file:
+        print(input_file)
+        benchmark(input_file, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
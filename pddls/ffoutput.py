@@ -0,0 +1,166 @@
+import re
+import queue
+import threading
+
+
+#
+# Incremental parsing of the output of Metric-FF.
+#
+# OutputParser is fed stdout line by line and returns the plan steps as
+# soon as their lines arrive, keeping search statistics on the way:
+#
+#   ff: found legal plan as follows
+#
+#   step    0: INSERT CYLINDRICALPILLAR_1 CYLINDRICALHOLE_4
+#           1: INSERT TRIANGULARPILLAR_2 TRIANGULARHOLE_5
+#
+#   time spent:    0.00 seconds instantiating 4 easy, 0 hard action templates
+#                  ...
+#                  0.00 seconds searching, evaluating 5 states, to a max depth of 1
+#                  0.00 seconds total time
+
+_STEP = re.compile(r'^\s*(?:step\s+)?(\d+):\s*(.*?)\s*$', re.IGNORECASE)
+_GOAL_DISTANCE = re.compile(r'goal distance:\s*(\d+)')
+_SEARCHING = re.compile(r'([\d.]+) seconds searching, evaluating (\d+) states(?:, to a max depth of (\d+))?')
+_TOTAL_TIME = re.compile(r'([\d.]+) seconds total time')
+_REACHABILITY = re.compile(r'reachability analysis, yielding (\d+) facts and (\d+) actions')
+_PLAN_COST = re.compile(r'plan cost:\s*([\d.]+)')
+
+UNSOLVABLE_MARKS = ('problem proven unsolvable', 'goal can be simplified to FALSE')
+EMPTY_PLAN_MARK = 'The empty plan solves it'
+
+
+class OutputParser:
+    """Parse Metric-FF output line by line.
+
+    stats holds what has been seen so far: goal_distance (the last one
+    reported by enforced hill-climbing), states_evaluated, search_seconds,
+    max_depth, total_seconds, facts, actions, plan_cost and plan_length.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.stats = {}
+        self.lines = []
+        self.in_plan = False
+        self.plan_done = False
+        self.unsolvable = False
+
+    def solved(self):
+        return self.plan_done
+
+    def feed(self, line):
+        """Consume one line and return the plan steps it completes"""
+        self.lines.append(line)
+        line = line.rstrip('\n')
+        if self.in_plan:
+            match = _STEP.match(line)
+            if match and int(match.group(1)) == len(self.steps):
+                step = match.group(2).split(' ')
+                self.steps.append(step)
+                self.stats['plan_length'] = len(self.steps)
+                return [step]
+            self.in_plan = False
+            self.plan_done = True
+        elif not self.plan_done and line.startswith('step'):
+            self.in_plan = True
+            return self.feed(self.lines.pop())
+        if EMPTY_PLAN_MARK in line:
+            self.plan_done = True
+            self.stats['plan_length'] = 0
+        elif any(mark in line for mark in UNSOLVABLE_MARKS):
+            self.unsolvable = True
+        self.parseStats(line)
+        return []
+
+    def parseStats(self, line):
+        match = _GOAL_DISTANCE.search(line)
+        if match:
+            self.stats['goal_distance'] = int(match.group(1))
+        match = _SEARCHING.search(line)
+        if match:
+            self.stats['search_seconds'] = float(match.group(1))
+            self.stats['states_evaluated'] = int(match.group(2))
+            if match.group(3):
+                self.stats['max_depth'] = int(match.group(3))
+        match = _TOTAL_TIME.search(line)
+        if match:
+            self.stats['total_seconds'] = float(match.group(1))
+        match = _REACHABILITY.search(line)
+        if match:
+            self.stats['facts'] = int(match.group(1))
+            self.stats['actions'] = int(match.group(2))
+        match = _PLAN_COST.search(line)
+        if match:
+            self.stats['plan_cost'] = float(match.group(1))
+
+    def output(self):
+        return ''.join(self.lines)
+
+    def result(self):
+        """The plan steps, or None when no complete plan (ended by a line
+        that is not a step) was seen"""
+        return self.steps if self.plan_done else None
+
+
+def parseOutput(output):
+    parser = OutputParser()
+    for line in output.splitlines(True):
+        parser.feed(line)
+    return parser
+
+
+_END = object()
+
+
+class SearchRun:
+    """A solver run on a SolverPool whose output is parsed as it arrives.
+
+    steps() yields the plan steps as soon as the solver prints them. When
+    stop is given, it is called with the statistics after every line, and
+    the solver is killed as soon as it returns true (e.g. too many states
+    evaluated, or a long enough plan prefix).
+    """
+
+    def __init__(self, pool, pddl_domain, pddl_problem, args=(), stop=None, timeout=None):
+        self.parser = OutputParser()
+        self.stop = stop
+        self.stopped = False
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.job = pool.submit(pddl_domain, pddl_problem, args, timeout=timeout, on_output=self.consume)
+        self.job.future.add_done_callback(lambda _future: self.queue.put(_END))
+
+    def consume(self, stdout):
+        for line in stdout:
+            with self.lock:
+                steps = self.parser.feed(line)
+                stats = dict(self.parser.stats)
+            for step in steps:
+                self.queue.put(step)
+            if self.stop is not None and self.stop(stats):
+                self.stopped = True
+                break
+        return self.parser.output()
+
+    def stats(self):
+        """A snapshot of the statistics so far"""
+        with self.lock:
+            return dict(self.parser.stats)
+
+    def steps(self):
+        while True:
+            step = self.queue.get()
+            if step is _END:
+                self.queue.put(_END) # for later calls
+                return
+            yield step
+
+    def cancel(self):
+        self.job.cancel()
+
+    def result(self, timeout=None):
+        """Wait for the run and return (plan steps or None, statistics, SolverResult)"""
+        solver_result = self.job.result(timeout)
+        with self.lock:
+            return self.parser.result(), dict(self.parser.stats), solver_result
@@ -1,7 +1,19 @@
+import io
+import re
 import sys
 import json
+import argparse
 import yaml
-from io import StringIO
+
+from .pddlbin import isBinaryFile, loadBinary
+
+
+# Characters buffered before a write to the output
+CHUNK_SIZE = 1 << 18
+
+_SPACES = re.compile(r'\s+')
+_OPEN_SPACE = re.compile(r'\( ')
+_CLOSE_SPACE = re.compile(r' \)')
 
 
 def serializePredicateAxiom(predicate, args):
@@ -11,137 +23,199 @@ def serializePredicateAxiom(predicate, args):
         return "({})".format(predicate)
 
 
+def compactChunks(chunks):
+    """Yield the chunks of a text with whitespace runs collapsed into one
+    space and no space after '(' nor before ')', then a line break. The
+    whitespace at the ends of a chunk is resolved with the next chunk, so
+    the text is the same whatever the chunk boundaries."""
+    last = None # last character written
+    pending = False # whitespace seen since then
+    for chunk in chunks:
+        core = chunk.strip()
+        pending = pending or chunk[:1].isspace()
+        if not core:
+            continue
+        core = _SPACES.sub(' ', core)
+        core = _CLOSE_SPACE.sub(')', _OPEN_SPACE.sub('(', core))
+        if pending and last != '(' and core[0] != ')':
+            core = ' ' + core
+        yield core
+        last = core[-1]
+        pending = chunk[-1].isspace()
+    if pending and last != '(':
+        yield ' '
+    yield '\n'
+
+
 class PDDLOut:
-    
-    def __init__(self, out):
+    """Renders a jsonized PDDL as a sequence of text pieces, written to
+    out in chunks of about chunk_size characters"""
+
+    def __init__(self, out=None, compact=False, chunk_size=CHUNK_SIZE):
         self.out = out
+        self.compact = compact
+        self.chunk_size = chunk_size
 
     def printPDDL(self, pddl):
+        writeChunks(self.out, self.chunks(pddl))
+
+    def chunks(self, pddl):
+        if not self.compact:
+            return self.rawChunks(pddl)
+        return compactChunks(self.rawChunks(pddl))
+
+    def rawChunks(self, pddl):
+        buffer = []
+        size = 0
+        for piece in self.iterPDDL(pddl):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= self.chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    def iterPDDL(self, pddl):
         if 'domain' in pddl:
-            self.printDomain(pddl)
+            yield from self.iterDomain(pddl)
         elif 'problem' in pddl:
-            self.printProblem(pddl)
+            yield from self.iterProblem(pddl)
         else:
             raise RuntimeError('Illegal PDDL')
         
     def dumps(self, obj):
-        if obj is None:
-            pass
-        elif type(obj) is list:
-            for item in obj:
-                self.dumps(item)
-                self.out.write('\n')
-        elif type(obj) is dict:
-            self.out.write('(\n')
-            for key in obj:
-                if key[0] == '@':
-                    continue
-                self.out.write('({} '.format(key))
-                self.dumps(obj[key])
-                self.out.write(')\n')
-            self.out.write(')')
-        else:
-            self.out.write(str(obj))
+        """Yield the pieces of a JSON value, depth first with an explicit
+        stack of (is_text, value) entries instead of recursion"""
+        stack = [(False, obj)]
+        while stack:
+            is_text, obj = stack.pop()
+            if is_text:
+                yield obj
+            elif obj is None:
+                pass
+            elif type(obj) is list:
+                for item in reversed(obj):
+                    stack.append((True, '\n'))
+                    stack.append((False, item))
+            elif type(obj) is dict:
+                parts = [(True, '(\n')]
+                for key in obj:
+                    if key[0] == '@':
+                        continue
+                    parts.extend(((True, '({} '.format(key)), (False, obj[key]), (True, ')\n')))
+                parts.append((True, ')'))
+                stack.extend(reversed(parts))
+            else:
+                yield str(obj)
 
-    def printDomain(self, pddl):
+    def iterDomain(self, pddl):
         domain = pddl['domain']
-        self.out.write('(define (domain {})\n'.format(domain))
+        yield '(define (domain {})\n'.format(domain)
         if 'pddl:requirements' in pddl:
-            self.printRequireDef(pddl['pddl:requirements'])
+            yield from self.iterRequireDef(pddl['pddl:requirements'])
         if 'pddl:types' in pddl:
-            self.printTypesDef(pddl['pddl:types'])
+            yield from self.iterTypesDef(pddl['pddl:types'])
+        if 'pddl:constants' in pddl:
+            yield from self.iterConstantsDef(pddl['pddl:constants'])
         if 'pddl:predicates' in pddl:
-            self.printPredicatesDef(pddl['pddl:predicates'])
+            yield from self.iterPredicatesDef(pddl['pddl:predicates'])
         if 'pddl:functions' in pddl:
-            self.printFunctionsDef(pddl['pddl:functions'])
+            yield from self.iterFunctionsDef(pddl['pddl:functions'])
         if 'structure' in pddl:
-            self.printStructureDef(pddl['structure'])
-        self.out.write(')\n')
+            yield from self.iterStructureDef(pddl['structure'])
+        yield ')\n'
     
-    def printRequireDef(self, requireKeys):
-        self.out.write('    (:requirements {})\n'.format(' '.join(requireKeys)))
+    def iterRequireDef(self, requireKeys):
+        yield '    (:requirements {})\n'.format(' '.join(requireKeys))
+
+    def iterTypesDef(self, typedNames):
+        yield '    (:types'
+        yield from self.iterTypedNames(typedNames)
+        yield ')\n'
 
-    def printTypesDef(self, typedNames):
-        self.out.write('    (:types')
-        self.printTypedNames(typedNames)
-        self.out.write(')\n')
+    def iterConstantsDef(self, constants):
+        yield '    (:constants'
+        yield from self.iterTypedNames(constants)
+        yield ')\n'
 
-    def printTypedNames(self, typedNames):
+    def iterTypedNames(self, typedNames):
         noparents = []
         for name in typedNames:
             if typedNames[name] is not None:
-                self.out.write(' {} - {}'.format(name, typedNames[name]))
+                yield ' {} - {}'.format(name, typedNames[name])
             else:
                 noparents.append(name)
         if noparents:                
-            self.out.write(' {}'.format(' '.join(noparents)))
+            yield ' {}'.format(' '.join(noparents))
 
     # '(' ':predicates' atomicFormulaSkeleton+ ')'
-    def printPredicatesDef(self, predicates):
-        self.out.write('    (:predicates\n')
+    def iterPredicatesDef(self, predicates):
+        yield '    (:predicates\n'
         assert type(predicates) is list
         for predicate in predicates:
             assert type(predicate) is dict and len(predicate) == 1
-            name, params = predicate.items()[0]
-            self.out.write('        ({} '.format(name))
-            self.printParameters(params)
-            self.out.write(')\n')
-        self.out.write('    )\n')
+            name, params = next(iter(predicate.items()))
+            yield '        ({} '.format(name)
+            yield from self.iterParameters(params)
+            yield ')\n'
+        yield '    )\n'
         
-    def printParameters(self, params):
+    def iterParameters(self, params):
         assert type(params) is list
         is_first = True
         for param in params:
             if is_first:
                is_first = False
             else:
-                self.out.write(' ')
+                yield ' '
             assert type(param) is dict and len(param) == 1
-            paramname, paramtype = param.items()[0]
+            paramname, paramtype = next(iter(param.items()))
             if paramtype:
-                self.out.write('{} - {}'.format(paramname, paramtype))
+                yield '{} - {}'.format(paramname, paramtype)
             else:
-                self.out.write(paramname)
+                yield paramname
 
     # '(' ':functions' (atomicFunctionSkeleton+ ('-' functionType)? )* ')'
-    def printFunctionsDef(self, functions):
-        self.out.write('    (:functions\n')
+    def iterFunctionsDef(self, functions):
+        yield '    (:functions\n'
         assert type(functions) is list
         for func in functions:
             assert type(func) is dict and len(func) == 1
-            funcname, params = func.items()[0]
-            self.out.write('        ({}'.format(funcname))
-            self.printParameters(params)
-            self.out.write(')\n')
-        self.out.write('    )\n')
+            funcname, params = next(iter(func.items()))
+            yield '        ({}'.format(funcname)
+            yield from self.iterParameters(params)
+            yield ')\n'
+        yield '    )\n'
 
     # structureDef
     #    : actionDef
     #    | durativeActionDef
     #    | derivedDef
     #    ;
-    def printStructureDef(self, structure):
+    def iterStructureDef(self, structure):
         for actionlike in structure:
             if 'pddl:action' in actionlike:
                 name = actionlike['pddl:action']
                 parameters = actionlike['pddl:parameters']
                 precondition = actionlike['pddl:precondition']
                 effect = actionlike['pddl:effect']
-                self.out.write('    (:action {}\n'.format(name))
-                self.out.write('        :parameters (')
-                self.printParameters(parameters)
-                self.out.write(')\n')
-                self.out.write('        :precondition {}\n'.format(precondition))
-                self.out.write('        :effect {}\n'.format(effect))
-                self.out.write('    )')
+                yield '    (:action {}\n'.format(name)
+                yield '        :parameters ('
+                yield from self.iterParameters(parameters)
+                yield ')\n'
+                yield '        :precondition {}\n'.format(precondition)
+                yield '        :effect {}\n'.format(effect)
+                yield '    )'
             elif 'pddl:durativeActionDef' in actionlike:
                 pass
             elif 'pddl:derivedDef' in actionlike:
                 pass
             else:
-                self.dumps(actionlike)
+                yield from self.dumps(actionlike)
                 continue
-            self.out.write('\n')
+            yield '\n'
 
     # problem : '(' 'define' problemDecl
     # problemDomain
@@ -153,61 +227,93 @@ class PDDLOut:
     # metricSpec?
     # ')'
     # ;
-    def printProblem(self, pddl):
+    def iterProblem(self, pddl):
         problem = pddl['problem']
-        self.out.write('(define (problem {})\n'.format(problem))
-        self.printProblemDomain(pddl['pddl:problem_domain'])
+        yield '(define (problem {})\n'.format(problem)
+        yield from self.iterProblemDomain(pddl['pddl:problem_domain'])
         if 'pddl:requirements' in pddl:
-            self.printRequireDef(pddl['pddl:requirements'])
+            yield from self.iterRequireDef(pddl['pddl:requirements'])
         if 'pddl:objects' in pddl:
-            self.printObjectDecl(pddl['pddl:objects'])
-        self.printInit(pddl['pddl:init'])
-        self.printGoal(pddl['pddl:goal'])
-        self.out.write(')\n')
+            yield from self.iterObjectDecl(pddl['pddl:objects'])
+        yield from self.iterInit(pddl['pddl:init'])
+        yield from self.iterGoal(pddl['pddl:goal'])
+        yield ')\n'
         
-    def printProblemDomain(self, problemDomain):
-        self.out.write('    (:domain {})\n'.format(problemDomain))
+    def iterProblemDomain(self, problemDomain):
+        yield '    (:domain {})\n'.format(problemDomain)
 
-    def printObjectDecl(self, objects):
-        self.out.write('    (:objects\n')
-        self.printTypedNames(objects)
-        self.out.write('    )\n')
+    def iterObjectDecl(self, objects):
+        yield '    (:objects\n'
+        yield from self.iterTypedNames(objects)
+        yield '    )\n'
 
-    def printInit(self, objects):
-        self.out.write('    (:init\n')
-        self.dumps(objects)
-        self.out.write('    )\n')
+    def iterInit(self, objects):
+        yield '    (:init\n'
+        for item in objects: # a list, a streamed InitStream or a FactTable
+            if type(item) is list or type(item) is dict:
+                yield from self.dumps(item)
+                yield '\n'
+            else:
+                yield str(item) + '\n'
+        yield '    )\n'
 
-    def printGoal(self, objects):
-        self.out.write('    (:goal\n')
-        self.dumps(objects)
-        self.out.write('    )\n')
+    def iterGoal(self, objects):
+        yield '    (:goal\n'
+        yield from self.dumps(objects)
+        yield '    )\n'
 
 
 #
 # The PDDL generation API
-def serializePDDL(pddl):
-    writer = StringIO()
-    PDDLOut(writer).printPDDL(pddl)
-    return writer.getvalue()
+def writeChunks(out, chunks):
+    """Write text chunks to a text stream, a binary stream or a socket"""
+    if hasattr(out, 'sendall'):
+        for chunk in chunks:
+            out.sendall(chunk.encode('utf-8'))
+    elif isinstance(out, (io.RawIOBase, io.BufferedIOBase)):
+        for chunk in chunks:
+            out.write(chunk.encode('utf-8'))
+    else:
+        for chunk in chunks:
+            out.write(chunk)
 
-#
-# The PDDL generation API
-def printPDDL(pddl, out=sys.stdout):
-    """Write the PDDL description into the specified stream.
-    Default to standard output.
+
+def iterPDDL(pddl, chunk_size=CHUNK_SIZE, compact=False):
+    """Yield the PDDL text of a jsonized PDDL in chunks"""
+    return PDDLOut(None, compact, chunk_size).chunks(pddl)
+
+
+def serializePDDL(pddl, compact=False):
+    return ''.join(iterPDDL(pddl, compact=compact))
+
+
+def printPDDL(pddl, out=sys.stdout, compact=False, chunk_size=CHUNK_SIZE):
+    """Write the PDDL description into the specified stream (or socket).
+    Default to standard output. Compact output has no indentation nor
+    line breaks.
     """
-    PDDLOut(out).printPDDL(pddl)
+    PDDLOut(out, compact, chunk_size).printPDDL(pddl)
 
 
 def main():
-    pddl = None
-    if sys.argv[1][-len('.yaml'):].lower() == '.yaml':
-        pddl = yaml.load(open(sys.argv[1], 'r'))
+    ap = argparse.ArgumentParser(description='Convert Json (or YAML, binary, PDDLS) to PDDL.')
+    ap.add_argument('input_file',
+                    help='input jsonized PDDL (.json, .jsonld), YAML (.yaml), binary (.pddlb) or PDDL(S)')
+    ap.add_argument('--compact', action='store_true', default=False,
+                    help='write the PDDL without indentation nor line breaks')
+    args = ap.parse_args()
+    input_file = args.input_file
+    if input_file[-len('.yaml'):].lower() == '.yaml':
+        pddl = yaml.load(open(input_file, 'r'))
+    elif input_file[-len('.json'):].lower() == '.json' or input_file[-len('.jsonld'):].lower() == '.jsonld':
+        pddl = json.load(open(input_file, 'r'))
+    elif isBinaryFile(input_file):
+        pddl = loadBinary(input_file)
     else:
-        # json or jsonld
-        pddl = json.load(open(sys.argv[1], 'r'))
-    printPDDL(pddl)
+        # PDDL(S), normalized without materializing a problem's :init
+        from .fastpddl import iterProblem
+        pddl = iterProblem(input_file)
+    printPDDL(pddl, compact=args.compact)
 
 
 if __name__ == '__main__':
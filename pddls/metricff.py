@@ -1,46 +1,64 @@
 import sys
 import os
+import shlex
 import argparse
-import subprocess
-import tempfile
-import StringIO
-
-
-def redirect(commands):
-    return subprocess.Popen(commands, stdout=subprocess.PIPE).communicate()[0]
-
-
-def execSolver(pddl_domain, pddl_problem):
-    tmpdir = tempfile.mkdtemp()
-    domain_file = os.path.join(tmpdir, 'domain.pddl')
-    problem_file = os.path.join(tmpdir, 'problem.pddl')
-    with open(domain_file, 'w') as fd:
-        fd.write(pddl_domain)
-    with open(problem_file, 'w') as fd:
-        fd.write(pddl_problem)
-    
-    output = redirect([
-        '../src/3rd_party/Metric-FF-v2.1/ff',
-        '-s', '0',
-        '-o', domain_file,
-        '-f', problem_file
-    ])
-    lines = output.split('\n')
-    
-    step_line_start = None
-    step_line_end = None
-    for i, line in enumerate(lines):
-        if line[:len('step')] == 'step':
-            step_line_start = i
-        if step_line_start is not None and not line:
-            step_line_end = i
-            break
-
-    if step_line_start and step_line_end:
-        return [ line.split(': ')[1].split(' ') for line in lines[step_line_start:step_line_end]]
-    else:
-        print(output)
-        raise RuntimeError('Failed in PDDL solver:\n{}'.format(output))
+import threading
+
+from .solverpool import SolverPool
+from .plancache import PlanCache, UNSOLVABLE
+from .ffoutput import OutputParser, parseOutput
+
+
+# The Metric-FF command (a binary, possibly followed by arguments),
+# overridable with the PDDLS_METRICFF environment variable
+DEFAULT_SOLVER = os.environ.get('PDDLS_METRICFF', '../src/3rd_party/Metric-FF-v2.1/ff')
+DEFAULT_ARGS = ['-s', '0']
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+
+def solverCommand(solver=None):
+    return shlex.split(solver or DEFAULT_SOLVER) + ['-o', '{domain}', '-f', '{problem}']
+
+
+def solverPool(solver=None, max_workers=None, timeout=None, memory_mb=None):
+    """Return the shared pool of a solver binary, created on first use"""
+    key = (solver or DEFAULT_SOLVER, max_workers, timeout, memory_mb)
+    with _poolsLock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SolverPool(solverCommand(solver), max_workers, timeout, memory_mb)
+        return pool
+
+
+class UnsolvableProblem(RuntimeError):
+    pass
+
+
+def parseSteps(output):
+    """Return the plan steps of the output of Metric-FF, or None"""
+    return parseOutput(output).result()
+
+
+def execSolver(pddl_domain, pddl_problem, pool=None, args=DEFAULT_ARGS, timeout=None):
+    pool = pool or solverPool()
+    parser = OutputParser()
+    def consume(stdout):
+        for line in stdout:
+            parser.feed(line)
+        return parser.output()
+    result = pool.solve(pddl_domain, pddl_problem, args, timeout=timeout, on_output=consume)
+    if result.timed_out:
+        raise RuntimeError('PDDL solver timed out after {:.1f} seconds'.format(result.elapsed))
+    if result.cancelled:
+        raise RuntimeError('PDDL solver cancelled')
+    steps = parser.result()
+    if steps is None and parser.unsolvable:
+        raise UnsolvableProblem('PDDL solver found the problem unsolvable')
+    if steps is None:
+        raise RuntimeError('Failed in PDDL solver:\n{}'.format(result.output + result.errors))
+    return steps
 
 
 def prepareActions(steps, bindings):
@@ -57,24 +75,104 @@ def prepareActions(steps, bindings):
     }
 
 
-def solve(pddl_domain, pddl_problem, bindings={}):
-    steps = execSolver(pddl_domain, pddl_problem)
+def solve(pddl_domain, pddl_problem, bindings={}, pool=None, timeout=None,
+          plan_cache=None, retry_unsolvable=False):
+    """Return the plan of a problem as actions. With a PlanCache, the plan
+    steps of a problem solved before (up to layout, comments, case and
+    the order of :init) are reused; cached unsolvable outcomes raise
+    UnsolvableProblem again unless retry_unsolvable is set."""
+    if plan_cache is None:
+        steps = execSolver(pddl_domain, pddl_problem, pool=pool, timeout=timeout)
+        return prepareActions(steps, bindings)
+
+    pool = pool or solverPool()
+    key = plan_cache.key(pddl_domain, pddl_problem, ' '.join(pool.command + DEFAULT_ARGS))
+    steps = plan_cache.get(key)
+    if steps == UNSOLVABLE and retry_unsolvable:
+        steps = None
+    if steps == UNSOLVABLE:
+        raise UnsolvableProblem('PDDL solver found the problem unsolvable (cached)')
+    if steps is None:
+        try:
+            steps = execSolver(pddl_domain, pddl_problem, pool=pool, timeout=timeout)
+        except UnsolvableProblem:
+            plan_cache.put(key, UNSOLVABLE)
+            raise
+        plan_cache.put(key, steps)
     return prepareActions(steps, bindings)
-    
+
+
+def mainPortfolio(args):
+    from .portfolio import loadPortfolio, solvePortfolio, problemFamily, PortfolioStats
+    portfolio = loadPortfolio(args.portfolio)
+    pddl_domain, pddl_problem = args.domain_file.read(), args.problem_file.read()
+    with SolverPool(solverCommand(args.solver), len(portfolio.configurations),
+                    args.timeout, args.memory_mb) as pool:
+        result = solvePortfolio(portfolio, pddl_domain, pddl_problem, pool=pool)
+    stats = PortfolioStats(args.portfolio_stats)
+    stats.record(args.family or problemFamily(pddl_problem), result)
+    stats.save()
+    if result.winner is None:
+        raise RuntimeError('No configuration of the portfolio found a plan')
+    print('Winner: {} in {:.3f}s'.format(result.winner, result.runs[result.winner].elapsed), file=sys.stderr)
+    print(prepareActions(result.steps, {}))
+
+
+def mainStream(args):
+    from .ffoutput import SearchRun
+    stop = None
+    if args.max_states:
+        stop = lambda stats: stats.get('states_evaluated', 0) > args.max_states
+    with SolverPool(solverCommand(args.solver), 1, args.timeout, args.memory_mb) as pool:
+        run = SearchRun(pool, args.domain_file.read(), args.problem_file.read(), DEFAULT_ARGS, stop=stop)
+        for step in run.steps():
+            print(' '.join(step))
+        steps, stats, _result = run.result()
+    print('Search statistics: {}'.format(stats), file=sys.stderr)
+    if steps is None:
+        raise RuntimeError('No plan{}'.format(' (stopped early)' if run.stopped else ''))
+
 
 def main(args):
-    actions = solve(args.domain_file.read(), args.problem_file.read(), {})
+    if args.portfolio:
+        return mainPortfolio(args)
+    if args.stream:
+        return mainStream(args)
+    plan_cache = PlanCache(cache_dir=args.plan_cache_dir) if args.plan_cache_dir else None
+    with SolverPool(solverCommand(args.solver), 1, args.timeout, args.memory_mb) as pool:
+        actions = solve(args.domain_file.read(), args.problem_file.read(), {}, pool=pool,
+                        plan_cache=plan_cache, retry_unsolvable=args.retry_unsolvable)
     print(actions)
 
 
 if __name__ == '__main__':
-    ap = argparse.ArgumentParser(description='Translate PDDLS to PDDL (or YAML).')
+    ap = argparse.ArgumentParser(description='Solve a PDDL problem with Metric-FF.')
     ap.add_argument('-o', '--domain_file',
                     type=argparse.FileType('r'),
                     help='PDDL file for domain')
     ap.add_argument('-f', '--problem_file',
                     type=argparse.FileType('r'),
                     help='PDDL file for problem')
+    ap.add_argument('--solver', type=str, default=None,
+                    help='Metric-FF binary (default: $PDDLS_METRICFF or {})'.format(DEFAULT_SOLVER))
+    ap.add_argument('--timeout', type=float, default=None,
+                    help='wall-clock limit of the solver in seconds')
+    ap.add_argument('--memory_mb', type=int, default=None,
+                    help='address space limit of the solver in megabytes')
+    ap.add_argument('--plan_cache_dir', type=str, default=None,
+                    help='directory of the persistent plan cache (disabled by default)')
+    ap.add_argument('--retry_unsolvable', action='store_true', default=False,
+                    help='solve again problems cached as unsolvable')
+    ap.add_argument('--portfolio', type=str, default=None,
+                    help='YAML file of solver configurations to race on the problem')
+    ap.add_argument('--portfolio_stats', type=str, default=None,
+                    help='JSON file accumulating the winning configurations per problem family')
+    ap.add_argument('--family', type=str, default=None,
+                    help='problem family for the statistics (default: the domain name)')
+    ap.add_argument('--stream', action='store_true', default=False,
+                    help='print the plan steps as the solver outputs them, then its search statistics')
+    ap.add_argument('--max_states', type=int, default=None,
+                    help='with --stream, stop the solver once it has evaluated more states')
     args = ap.parse_args()
-    
+
     main(args)
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+try:
+    _PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+except (AttributeError, ValueError, OSError):
+    _PAGE_KB = 4
+
+
+#
+# Instrumentation of the compilation pipeline.
+#
+# A Metrics object collects the wall time of the stages of a compilation
+# (parse, ontology, translate, axioms, serialize...), the time of the query
+# of each predicate, counters (rows returned and filtered out...) and the
+# change of the resident memory of the process over every stage. The peak
+# RSS (ru_maxrss) is a lifetime high-water mark, so it is only reported
+# once, for the whole process.
+#
+# Functions take metrics=None and then pay nothing: stage(None, name) is a
+# null context and count(None, ...) returns at once.
+
+
+def peakRSS():
+    """Peak resident set size of this process in kB, None when unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak # bytes on macOS
+
+
+def currentRSS():
+    """Resident set size of this process now in kB, None when unknown"""
+    try:
+        with open('/proc/self/statm', 'rb') as fd:
+            resident = int(fd.read().split()[1])
+    except (OSError, ValueError, IndexError): # not on Linux
+        return None
+    return resident * _PAGE_KB
+
+
+class Metrics:
+    """Stage timings, query timings, counters and peak memory samples.
+
+    Thread-safe, so predicates resolved by a pool of threads may record into
+    the same object; a forked process records into its own and the parent
+    merges the toDict() of it. The memory change of a stage is the one of
+    the whole process, which includes what other threads did meanwhile.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.queries = OrderedDict()
+        self.counters = OrderedDict()
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, name):
+        rss = currentRSS()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+            self.sample(name, rss)
+
+    def addTime(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def addQuery(self, predicate, seconds):
+        with self.lock:
+            self.queries[str(predicate)] = self.queries.get(str(predicate), 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def sample(self, name, before):
+        """Record the change of the RSS since before (kB) over a stage"""
+        rss = currentRSS()
+        if rss is not None and before is not None:
+            self.addMemory(name, rss - before)
+
+    def addMemory(self, name, kb):
+        with self.lock:
+            self.memory[name] = self.memory.get(name, 0) + kb
+
+    def merge(self, other):
+        """Add the timings and counters of another Metrics or of its toDict()"""
+        if isinstance(other, Metrics):
+            other = other.toDict()
+        for name, seconds in other.get('stages', {}).items():
+            self.addTime(name, seconds)
+        for predicate, seconds in other.get('queries', {}).items():
+            self.addQuery(predicate, seconds)
+        for name, n in other.get('counters', {}).items():
+            self.count(name, n)
+        for name, kb in other.get('rss_delta_kb', {}).items():
+            self.addMemory(name, kb)
+
+    def toDict(self, process=False):
+        """The metrics as a dict; with process, also the peak RSS of this
+        process, for metrics covering its whole run"""
+        with self.lock:
+            result = {
+                'stages': dict((name, round(seconds, 6)) for name, seconds in self.stages.items()),
+                'queries': dict((uri, round(seconds, 6)) for uri, seconds in self.queries.items()),
+                'counters': dict(self.counters),
+                'rss_delta_kb': dict(self.memory),
+            }
+        if process:
+            result['peak_rss_kb'] = peakRSS()
+        return result
+
+    def report(self, out=sys.stderr):
+        """Print the metrics as a table, with the peak RSS of the process"""
+        metrics = self.toDict(process=True)
+        print("Stage timings (s), RSS change (kB):", file=out)
+        for name, seconds in metrics['stages'].items():
+            delta = metrics['rss_delta_kb'].get(name)
+            delta = '{:+d}'.format(delta) if delta is not None else ''
+            print("    {:24s} {:10.4f} {:>10}".format(name, seconds, delta), file=out)
+        if metrics['peak_rss_kb'] is not None:
+            print("Peak RSS of the process (kB): {}".format(metrics['peak_rss_kb']), file=out)
+        if metrics['queries']:
+            print("Predicate queries (s):", file=out)
+            for uri, seconds in sorted(metrics['queries'].items(), key=lambda item: -item[1]):
+                print("    {:10.4f} {}".format(seconds, uri), file=out)
+        if metrics['counters']:
+            print("Counters:", file=out)
+            for name, n in metrics['counters'].items():
+                print("    {:24s} {:10d}".format(name, n), file=out)
+
+
+def stage(metrics, name):
+    """metrics.timer(name), or a null context without metrics"""
+    return metrics.timer(name) if metrics is not None else nullcontext()
+
+
+def count(metrics, name, n=1):
+    if metrics is not None:
+        metrics.count(name, n)
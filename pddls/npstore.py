@@ -0,0 +1,405 @@
+import numpy as np
+from rdflib import URIRef, Literal, BNode, Variable
+from rdflib.namespace import XSD
+
+from .rulecatalog import preparedQuery
+
+
+#
+# A dictionary-encoded triple store on NumPy arrays.
+#
+# Every term is encoded as an integer id, and the triples are kept in three
+# sorted orderings (SPO, POS, OSP) so that any triple pattern is a range of
+# one of them. The basic graph patterns of establishedWith formulas are
+# evaluated by vectorized sort-merge joins over tables of variable bindings
+# (a dict of id columns). Queries outside of the supported subset
+#
+#   SELECT [DISTINCT|REDUCED] ... WHERE { BGP [FILTER (...)] }
+#
+# with VALUES blocks (see queryrewrite.bindValues) and FILTERs made of
+# =, !=, <, <=, >, >=, && and || over numbers or resources, are evaluated
+# by rdflib instead.
+
+_NUMERIC_TYPES = set([XSD.integer, XSD.decimal, XSD.float, XSD.double, XSD.int, XSD.long,
+                      XSD.short, XSD.byte, XSD.nonNegativeInteger, XSD.nonPositiveInteger,
+                      XSD.positiveInteger, XSD.negativeInteger, XSD.unsignedInt,
+                      XSD.unsignedLong, XSD.unsignedShort, XSD.unsignedByte])
+
+# LIMIT/OFFSET without ORDER BY keep rdflib's own order, they fall back
+_MODIFIERS = ('Distinct', 'Reduced')
+
+# positions of (s, p, o) in each ordering
+_ORDERINGS = { 'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1) }
+
+
+class UnsupportedQuery(Exception):
+    pass
+
+
+def isVariable(term):
+    return isinstance(term, (Variable, BNode))
+
+
+class NumpyTripleStore:
+    """Sorted integer-encoded triples answering the BGP subset of SPARQL.
+
+    fallback is the rdflib graph (or a function returning it) used for the
+    queries out of the supported subset.
+    """
+
+    def __init__(self, terms, triples, fallback=None):
+        self.terms = list(terms)
+        self.ids = { term: i for i, term in enumerate(self.terms) }
+        self.term_array = np.empty(len(self.terms), dtype=object)
+        self.term_array[:] = self.terms
+        self.numbers = np.full(len(self.terms), np.nan)
+        self.literal = np.zeros(len(self.terms), dtype=bool)
+        for i, term in enumerate(self.terms):
+            if type(term) is Literal:
+                self.literal[i] = True
+                if term.datatype in _NUMERIC_TYPES:
+                    try:
+                        self.numbers[i] = float(term.toPython())
+                    except (TypeError, ValueError):
+                        pass
+        self.size = max(len(self.terms), 1)
+        triples = np.asarray(triples, dtype=np.int64).reshape(-1, 3)
+        self.indexes = {}
+        for name, (a, b, c) in _ORDERINGS.items():
+            ordered = triples[:, [a, b, c]]
+            order = np.lexsort((ordered[:, 2], ordered[:, 1], ordered[:, 0]))
+            ordered = ordered[order]
+            self.indexes[name] = (ordered, ordered[:, 0] * self.size + ordered[:, 1])
+        self.fallback = fallback
+        self.evaluated = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def fromGraph(cls, graph):
+        from .ontostore import encodeGraph
+        terms, triples = encodeGraph(graph)
+        return cls(terms, np.frombuffer(triples, dtype=np.uint32) if len(triples) else [], graph)
+
+    @classmethod
+    def fromOntologyStore(cls, store):
+        """Load the arrays of an ontology store (see ontostore) without
+        building an rdflib graph, which is only loaded for fallbacks"""
+        from .ontostore import decodeTerm
+        header = store.readHeader()
+        terms = [decodeTerm(t) for t in store.readTerms()]
+        triples = np.fromfile(store.path, dtype='<u4', count=header['triples'] * 3,
+                              offset=header['triples_offset'])
+        return cls(terms, triples, store.load)
+
+    def __len__(self):
+        return len(self.indexes['spo'][0])
+
+    def stats(self):
+        return { 'evaluated': self.evaluated, 'fallbacks': self.fallbacks }
+
+    def fallbackGraph(self):
+        if callable(self.fallback):
+            self.fallback = self.fallback()
+        return self.fallback
+
+    #
+    # Triple patterns
+
+    def match(self, s, p, o):
+        """Return the (n, 3) array of the triples matching ids (None for any)"""
+        bound = (s is not None, p is not None, o is not None)
+        if bound == (True, True, True) or bound == (True, True, False):
+            name, first, second = 'spo', s, p
+        elif bound == (False, True, True):
+            name, first, second = 'pos', p, o
+        elif bound == (True, False, True):
+            name, first, second = 'osp', o, s
+        elif bound == (True, False, False):
+            name, first, second = 'spo', s, None
+        elif bound == (False, True, False):
+            name, first, second = 'pos', p, None
+        elif bound == (False, False, True):
+            name, first, second = 'osp', o, None
+        else:
+            name, first, second = 'spo', None, None
+        ordered, keys = self.indexes[name]
+        if first is not None:
+            column = keys if second is not None else ordered[:, 0]
+            key = first * self.size + second if second is not None else first
+            lo, hi = np.searchsorted(column, key, 'left'), np.searchsorted(column, key, 'right')
+            ordered = ordered[lo:hi]
+        if all(bound):
+            ordered = ordered[ordered[:, 2] == o]
+        # back to (s, p, o) columns
+        a, b, c = _ORDERINGS[name]
+        result = np.empty_like(ordered)
+        result[:, a], result[:, b], result[:, c] = ordered[:, 0], ordered[:, 1], ordered[:, 2]
+        return result
+
+    def patternTable(self, pattern):
+        """Return the bindings table of a triple pattern"""
+        ids = []
+        for term in pattern:
+            if isVariable(term):
+                ids.append(None)
+            elif term in self.ids:
+                ids.append(self.ids[term])
+            else:
+                return {v: np.empty(0, dtype=np.int64) for v in pattern if isVariable(v)}, 0
+        rows = self.match(*ids)
+        table = {}
+        for position, term in enumerate(pattern):
+            if not isVariable(term):
+                continue
+            if term in table:
+                # a variable repeated within the pattern
+                keep = table[term] == rows[:, position]
+                rows = rows[keep]
+                table = { v: column[keep] for v, column in table.items() }
+            else:
+                table[term] = rows[:, position]
+        return table, len(rows)
+
+    #
+    # Algebra evaluation (tables are (columns, length) pairs)
+
+    def query(self, query):
+        """Return the result rows (tuples of terms) of a SPARQL query"""
+        if isinstance(query, str):
+            query = preparedQuery(query)
+        try:
+            rows = self.evalQuery(query.algebra)
+        except UnsupportedQuery:
+            self.fallbacks += 1
+            return [tuple(row) for row in self.fallbackGraph().query(query)]
+        self.evaluated += 1
+        return rows
+
+    def evalQuery(self, algebra):
+        if algebra.name != 'SelectQuery' or algebra.get('datasetClause'):
+            raise UnsupportedQuery(algebra.name)
+        node = algebra.p
+        modifiers = []
+        while node.name in _MODIFIERS:
+            modifiers.append(node)
+            node = node.p
+        if node.name != 'Project':
+            raise UnsupportedQuery(node.name)
+        variables = list(node.PV)
+        columns, length = self.evalPattern(node.p)
+        if any(v not in columns for v in variables):
+            raise UnsupportedQuery('unbound projected variable')
+        if variables:
+            rows = np.stack([columns[v] for v in variables], axis=1) if length else \
+                np.empty((0, len(variables)), dtype=np.int64)
+        else:
+            rows = np.empty((length, 0), dtype=np.int64)
+        if modifiers and len(rows):
+            # DISTINCT (REDUCED may as well), keeping the first occurrences
+            if variables:
+                _unique, first = np.unique(rows, axis=0, return_index=True)
+                rows = rows[np.sort(first)]
+            else:
+                rows = rows[:1]
+        decoded = self.term_array[rows] if len(rows) else rows
+        return [tuple(row) for row in decoded]
+
+    def evalPattern(self, node, table=None):
+        if node.name == 'BGP':
+            return self.evalBGP(node.triples, table)
+        if node.name == 'Filter':
+            if node.p.name == 'BGP':
+                # conjuncts are applied as soon as their variables are bound
+                return self.evalBGP(node.p.triples, table, conjuncts(node.expr))
+            return self.filterTable(self.evalPattern(node.p, table), node.expr)
+        if node.name == 'Join':
+            left = self.evalPattern(node.p1, table)
+            return self.evalPattern(node.p2, left)
+        if node.name == 'ToMultiSet' and node.p.name == 'values':
+            return self.joinTables(table, self.valuesTable(node.p.res))
+        raise UnsupportedQuery(node.name)
+
+    def filterTable(self, table, expr):
+        columns, length = table
+        if not length:
+            return table
+        keep = self.evalExpr(expr, columns, length)
+        return { v: column[keep] for v, column in columns.items() }, int(keep.sum())
+
+    def valuesTable(self, solutions):
+        variables = set(v for solution in solutions for v in solution)
+        if any(len(solution) != len(variables) for solution in solutions):
+            raise UnsupportedQuery('VALUES with UNDEF')
+        rows = [solution for solution in solutions
+                if all(term in self.ids for term in solution.values())]
+        columns = { v: np.array([self.ids[s[v]] for s in rows], dtype=np.int64)
+                    for v in variables }
+        return columns, len(rows)
+
+    def evalBGP(self, patterns, table=None, filters=()):
+        patterns = [self.patternTable(pattern) for pattern in patterns]
+        filters = [(expr, expressionVariables(expr)) for expr in filters]
+        # conjuncts over the variables of a single pattern restrict it first
+        for expr, variables in list(filters):
+            for i, pattern in enumerate(patterns):
+                if variables <= set(pattern[0]):
+                    filters.remove((expr, variables))
+                    patterns[i] = self.filterTable(pattern, expr)
+                    break
+        # drop the rows that cannot join (semi-join reduction)
+        if table is not None:
+            reduced = reduceTables(patterns + [table])
+            patterns, table = reduced[:-1], reduced[-1]
+        else:
+            patterns, table = reduceTables(patterns), ({}, 1)
+        # greedily join the pattern sharing a variable with the bindings
+        # that gives the fewest rows
+        while patterns:
+            bound = set(table[0])
+            connected = [i for i, t in enumerate(patterns) if bound & set(t[0])] \
+                or range(len(patterns))
+            best = patterns.pop(min(connected, key=lambda i: self.joinPlan(table, patterns[i])[-1]))
+            table = self.joinTables(table, best)
+            for expr, variables in list(filters):
+                if variables <= set(table[0]):
+                    filters.remove((expr, variables))
+                    table = self.filterTable(table, expr)
+            if not table[1]:
+                variables = set(table[0]).union(*(set(t[0]) for t in patterns))
+                return { v: np.empty(0, dtype=np.int64) for v in variables }, 0
+        for expr, _variables in filters:
+            table = self.filterTable(table, expr)
+        return table
+
+    def joinPlan(self, left, right):
+        """Return (order, lo, counts, total) of a sort-merge join: each left
+        row matches the right rows order[lo:lo+counts]"""
+        (lcolumns, llength), (rcolumns, rlength) = left, right
+        shared = [v for v in lcolumns if v in rcolumns]
+        if shared:
+            lkeys, rkeys = joinKeys([lcolumns[v] for v in shared], [rcolumns[v] for v in shared])
+        else:
+            lkeys, rkeys = np.zeros(llength, dtype=np.int64), np.zeros(rlength, dtype=np.int64)
+        order = np.argsort(rkeys, kind='stable')
+        sorted_keys = rkeys[order]
+        lo = np.searchsorted(sorted_keys, lkeys, 'left')
+        counts = np.searchsorted(sorted_keys, lkeys, 'right') - lo
+        return order, lo, counts, int(counts.sum())
+
+    def joinTables(self, left, right):
+        if left is None:
+            return right
+        (lcolumns, llength), (rcolumns, _rlength) = left, right
+        order, lo, counts, total = self.joinPlan(left, right)
+        lindex = np.repeat(np.arange(llength), counts)
+        starts = np.cumsum(counts) - counts
+        rindex = order[np.arange(total) - np.repeat(starts, counts) + np.repeat(lo, counts)]
+        columns = { v: column[lindex] for v, column in lcolumns.items() }
+        for v, column in rcolumns.items():
+            if v not in columns:
+                columns[v] = column[rindex]
+        return columns, total
+
+    #
+    # FILTER expressions, evaluated to boolean masks
+
+    def evalExpr(self, expr, columns, length):
+        name = getattr(expr, 'name', None)
+        if name == 'ConditionalAndExpression':
+            mask = self.evalExpr(expr.expr, columns, length)
+            for other in expr.other or []:
+                mask = mask & self.evalExpr(other, columns, length)
+            return mask
+        if name == 'ConditionalOrExpression':
+            mask = self.evalExpr(expr.expr, columns, length)
+            for other in expr.other or []:
+                mask = mask | self.evalExpr(other, columns, length)
+            return mask
+        if name == 'RelationalExpression' and expr.op in ('=', '!=', '<', '<=', '>', '>='):
+            lids, lnumbers, lliteral = self.operand(expr.expr, columns, length)
+            rids, rnumbers, rliteral = self.operand(expr.other, columns, length)
+            if not (np.isnan(lnumbers).any() or np.isnan(rnumbers).any()):
+                a, b = lnumbers, rnumbers
+            elif expr.op in ('=', '!=') and not (lliteral.any() or rliteral.any()):
+                a, b = lids, rids
+            else:
+                raise UnsupportedQuery('comparison of non-numeric literals')
+            return { '=': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal,
+                     '>': np.greater, '>=': np.greater_equal }[expr.op](a, b)
+        raise UnsupportedQuery('expression {}'.format(name or type(expr).__name__))
+
+    def operand(self, term, columns, length):
+        """Return the ids, numeric values and literal flags of an operand"""
+        if isinstance(term, Variable):
+            if term not in columns:
+                raise UnsupportedQuery('unbound variable in FILTER')
+            ids = columns[term]
+            return ids, self.numbers[ids], self.literal[ids]
+        if isinstance(term, Literal):
+            if term.datatype not in _NUMERIC_TYPES:
+                raise UnsupportedQuery('non-numeric literal operand')
+            number, literal = float(term.toPython()), True
+        elif isinstance(term, (URIRef, BNode)):
+            number, literal = np.nan, False
+        else:
+            raise UnsupportedQuery('operand {}'.format(type(term).__name__))
+        # a resource absent from the store is different from every stored one
+        ids = np.full(length, self.ids.get(term, -1), dtype=np.int64)
+        return ids, np.full(length, number), np.full(length, literal)
+
+
+def conjuncts(expr):
+    if getattr(expr, 'name', None) == 'ConditionalAndExpression':
+        result = conjuncts(expr.expr)
+        for other in expr.other or []:
+            result.extend(conjuncts(other))
+        return result
+    return [expr]
+
+
+def expressionVariables(expr):
+    if isinstance(expr, Variable):
+        return set([expr])
+    result = set()
+    if isinstance(expr, dict):
+        for key, value in expr.items():
+            if not key.startswith('_'):
+                result |= expressionVariables(value)
+    elif isinstance(expr, (list, tuple)):
+        for value in expr:
+            result |= expressionVariables(value)
+    return result
+
+
+def reduceTables(tables):
+    """Restrict the tables to the rows whose values of every shared
+    variable occur in all the tables binding it, until none shrinks"""
+    tables = list(tables)
+    variables = set(v for columns, _length in tables for v in columns)
+    changed = True
+    while changed:
+        changed = False
+        for v in variables:
+            holders = [i for i, (columns, _length) in enumerate(tables) if v in columns]
+            if len(holders) < 2:
+                continue
+            allowed = np.unique(tables[holders[0]][0][v])
+            for i in holders[1:]:
+                allowed = np.intersect1d(allowed, tables[i][0][v], assume_unique=False)
+            for i in holders:
+                columns, length = tables[i]
+                keep = np.isin(columns[v], allowed)
+                if not keep.all():
+                    tables[i] = { u: column[keep] for u, column in columns.items() }, int(keep.sum())
+                    changed = True
+    return tables
+
+
+def joinKeys(lcolumns, rcolumns):
+    """Map the shared columns of both sides to comparable int64 keys"""
+    if len(lcolumns) == 1:
+        return lcolumns[0], rcolumns[0]
+    stacked = np.concatenate([np.stack(lcolumns, axis=1), np.stack(rcolumns, axis=1)])
+    _unique, inverse = np.unique(stacked, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return inverse[:len(lcolumns[0])], inverse[len(lcolumns[0]):]
@@ -0,0 +1,466 @@
+import os
+import sys
+import json
+import struct
+import bisect
+import logging
+import hashlib
+import argparse
+import threading
+from array import array
+import rdflib
+from rdflib import URIRef, BNode, Literal
+from rdflib.store import Store
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# A precompiled ontology store.
+#
+# The merged graph of several RDF files is written as a dictionary-encoded
+# triple file: every distinct term is stored once in a term table, and the
+# triples are a flat little-endian uint32 array of term ids (s, p, o, ...)
+# sorted by (s, p, o), followed by the row permutations sorting them by
+# (p, o, s) and by (o, s, p).
+#
+#   MAGIC | header length (uint64) | header (JSON) | term table (JSON) | triples | pos | osp
+#
+# The header records the source files with their mtime, size and sha256 so
+# that a stale store is detected without reading the rest of the file.
+#
+# The store is queried as is through EncodedStore, an rdflib store matching
+# triple patterns by binary search in the three orderings; terms are only
+# decoded when a pattern touches them.
+
+MAGIC = b'PDDLSONT'
+# positions of (s, p, o) in each ordering
+_ORDERINGS = { 'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1) }
+STORE_VERSION = 2
+_ALIGN = 8
+
+
+class StaleStoreError(RuntimeError):
+    pass
+
+
+def fileDigest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sourceInfo(path):
+    st = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'mtime': st.st_mtime,
+        'size': st.st_size,
+        'sha256': fileDigest(path),
+    }
+
+
+def encodeTerm(term):
+    if type(term) is Literal:
+        datatype = str(term.datatype) if term.datatype else None
+        return ['l', str(term), datatype, term.language]
+    elif type(term) is BNode:
+        return ['b', str(term)]
+    else:
+        return ['u', str(term)]
+
+
+def decodeTerm(encoded):
+    kind = encoded[0]
+    if kind == 'l':
+        _kind, lexical, datatype, language = encoded
+        if language:
+            return Literal(lexical, lang=language)
+        return Literal(lexical, datatype=URIRef(datatype) if datatype else None)
+    elif kind == 'b':
+        return BNode(encoded[1])
+    else:
+        return URIRef(encoded[1])
+
+
+def encodeGraph(graph):
+    """Return (terms, triples) with terms a list of distinct terms
+    and triples a flat array of their ids"""
+    ids = {}
+    terms = []
+    triples = array('I')
+    for triple in graph:
+        for term in triple:
+            term_id = ids.get(term)
+            if term_id is None:
+                term_id = ids[term] = len(terms)
+                terms.append(term)
+            triples.append(term_id)
+    return terms, triples
+
+
+class OntologyStore:
+    """A dictionary-encoded triple file compiled from RDF source files"""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def readRawHeader(self):
+        """Return the JSON header and its length, whatever the store version"""
+        with open(self.path, 'rb') as fd:
+            if fd.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError('Not an ontology store: {}'.format(self.path))
+            (length,) = struct.unpack('<Q', fd.read(8))
+            return json.loads(fd.read(length).decode('utf-8')), length
+
+    def readHeader(self):
+        header, length = self.readRawHeader()
+        if header.get('version') != STORE_VERSION:
+            raise StaleStoreError('Unsupported ontology store version {}'.format(header.get('version')))
+        # the term table follows the header, the triples are 8-byte aligned after it
+        header['term_table_offset'] = len(MAGIC) + 8 + length
+        end = header['term_table_offset'] + header['term_table_length']
+        header['triples_offset'] = end + (-end % _ALIGN)
+        end = header['triples_offset'] + header['triples'] * 12
+        header['pos_offset'] = end + (-end % _ALIGN)
+        end = header['pos_offset'] + header['triples'] * 4
+        header['osp_offset'] = end + (-end % _ALIGN)
+        self.header = header
+        return header
+
+    @property
+    def fingerprint(self):
+        """A digest of the source contents, stable across recompilations"""
+        if self.header is None:
+            self.readHeader()
+        return self.header['fingerprint']
+
+    def sources(self):
+        if self.header is None:
+            self.readHeader()
+        return [source['path'] for source in self.header['sources']]
+
+    def sourceMismatch(self, ontology_files):
+        """Return how the store's recorded sources differ from ontology_files,
+        or None if it was compiled from those files"""
+        expected = [os.path.abspath(f) for f in ontology_files]
+        recorded = [source['path'] for source in self.readRawHeader()[0].get('sources', [])]
+        if expected != recorded:
+            return 'compiled from {}, not {}'.format(', '.join(recorded), ', '.join(expected))
+        return None
+
+    def staleReason(self, ontology_files=None):
+        """Return why the store is out of date, or None if it is current.
+        Unchanged mtime and size are trusted; otherwise contents are hashed.
+        """
+        if not self.exists():
+            return 'missing store {}'.format(self.path)
+        if ontology_files is not None:
+            mismatch = self.sourceMismatch(ontology_files)
+            if mismatch:
+                return mismatch
+        try:
+            header = self.readHeader()
+        except StaleStoreError as e:
+            return str(e)
+        for source in header['sources']:
+            path = source['path']
+            if not os.path.exists(path):
+                return 'missing source {}'.format(path)
+            st = os.stat(path)
+            if st.st_mtime == source['mtime'] and st.st_size == source['size']:
+                continue
+            if st.st_size != source['size'] or fileDigest(path) != source['sha256']:
+                return 'modified source {}'.format(path)
+        return None
+
+    def compile(self, ontology_files, graph=None):
+        """Merge the ontology files (or an already parsed graph of them) into the store"""
+        if graph is None:
+            graph = rdflib.Graph()
+            for onto_file in ontology_files:
+                rdf_format = rdflib.util.guess_format(onto_file)
+                graph.parse(onto_file, format=rdf_format)
+        sources = [sourceInfo(f) for f in ontology_files]
+        fingerprint = hashlib.sha256(
+            '\n'.join(s['sha256'] for s in sources).encode('utf-8')).hexdigest()
+
+        terms, triples = encodeGraph(graph)
+        term_table = json.dumps([encodeTerm(t) for t in terms]).encode('utf-8')
+        rows = sorted(zip(triples[0::3], triples[1::3], triples[2::3]))
+        triples = array('I', [term_id for row in rows for term_id in row])
+        pos = array('I', sorted(range(len(rows)), key=lambda i: (rows[i][1], rows[i][2], rows[i][0])))
+        osp = array('I', sorted(range(len(rows)), key=lambda i: (rows[i][2], rows[i][0], rows[i][1])))
+        if sys.byteorder != 'little':
+            for column in (triples, pos, osp):
+                column.byteswap()
+        header = {
+            'version': STORE_VERSION,
+            'sources': sources,
+            'fingerprint': fingerprint,
+            'terms': len(terms),
+            'triples': len(triples) // 3,
+            'term_table_length': len(term_table),
+            'namespaces': dict((prefix, str(namespace)) for prefix, namespace in graph.namespaces()),
+        }
+        encoded = json.dumps(header).encode('utf-8')
+        term_table_offset = len(MAGIC) + 8 + len(encoded)
+        padding = -(term_table_offset + len(term_table)) % _ALIGN
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as fd:
+            fd.write(MAGIC)
+            fd.write(struct.pack('<Q', len(encoded)))
+            fd.write(encoded)
+            fd.write(term_table)
+            fd.write(b'\0' * padding)
+            for column in (triples, pos, osp):
+                data = column.tobytes()
+                fd.write(data)
+                fd.write(b'\0' * (-len(data) % _ALIGN))
+        os.replace(tmp_path, self.path)
+        self.readHeader()
+        return graph
+
+    def readTerms(self):
+        if self.header is None:
+            self.readHeader()
+        with open(self.path, 'rb') as fd:
+            fd.seek(self.header['term_table_offset'])
+            return json.loads(fd.read(self.header['term_table_length']).decode('utf-8'))
+
+    def readArray(self, name, count):
+        if self.header is None:
+            self.readHeader()
+        column = array('I')
+        with open(self.path, 'rb') as fd:
+            fd.seek(self.header[name + '_offset'])
+            column.frombytes(fd.read(count * column.itemsize))
+        if sys.byteorder != 'little':
+            column.byteswap()
+        return column
+
+    def readTriples(self):
+        """The flat (s, p, o, ...) id array, sorted by (s, p, o)"""
+        if self.header is None:
+            self.readHeader()
+        return self.readArray('triples', self.header['triples'] * 3)
+
+    def load(self):
+        """Return a read-only rdflib.Graph over the stored triples"""
+        return rdflib.Graph(store=EncodedStore(self))
+
+
+class EncodedStore(Store):
+    """A read-only rdflib store over the arrays of an OntologyStore.
+
+    A triple pattern is a range of the (s, p, o), (p, o, s) or (o, s, p)
+    ordering, found by binary search on the ids of its bound terms.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, ontology_store):
+        super().__init__()
+        header = ontology_store.readHeader()
+        self.size = header['triples']
+        self.ontology_store = ontology_store
+        self.triples_ids = ontology_store.readArray('triples', self.size * 3)
+        self.orders = {
+            'spo': range(self.size),
+            'pos': ontology_store.readArray('pos', self.size),
+            'osp': ontology_store.readArray('osp', self.size),
+        }
+        # id columns of each ordering, in its order, built on first use
+        self.columns = {}
+        self.prefixes = dict(header.get('namespaces', {}))
+        # the term table is read on the first pattern
+        self.encoded = None
+        self.ids = None
+        self.terms = None
+        self.lock = threading.Lock()
+
+    def loadTerms(self):
+        with self.lock:
+            if self.encoded is None:
+                encoded = self.ontology_store.readTerms()
+                self.ids = dict((tuple(term), i) for i, term in enumerate(encoded))
+                self.terms = [None] * len(encoded)
+                self.encoded = encoded
+
+    def termId(self, term):
+        return self.ids.get(tuple(encodeTerm(term)))
+
+    def term(self, term_id):
+        term = self.terms[term_id]
+        if term is None:
+            term = self.terms[term_id] = decodeTerm(self.encoded[term_id])
+        return term
+
+    def row(self, i):
+        t = self.triples_ids
+        return t[3 * i], t[3 * i + 1], t[3 * i + 2]
+
+    def orderColumns(self, name):
+        columns = self.columns.get(name)
+        if columns is None:
+            t = self.triples_ids
+            if name == 'spo':
+                columns = tuple(t[position::3] for position in range(3))
+            else:
+                order = self.orders[name]
+                columns = tuple(array('I', [t[3 * i + position] for i in order])
+                                for position in _ORDERINGS[name])
+            columns = self.columns.setdefault(name, columns)
+        return columns
+
+    def rowRange(self, name, key):
+        """The rows of an ordering whose first len(key) columns equal key"""
+        order = self.orders[name]
+        if not key:
+            return order
+        lo, hi = 0, self.size
+        for column, term_id in zip(self.orderColumns(name), key):
+            # within rows equal on the previous columns, the next one is sorted
+            lo = bisect.bisect_left(column, term_id, lo, hi)
+            hi = bisect.bisect_right(column, term_id, lo, hi)
+        return order[lo:hi]
+
+    def triples(self, triple_pattern, context=None):
+        if self.encoded is None:
+            self.loadTerms()
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+            else:
+                term_id = self.termId(term)
+                if term_id is None:
+                    return # a term absent from the store matches nothing
+                ids.append(term_id)
+        s, p, o = ids
+        if s is not None and p is None and o is not None:
+            rows = self.rowRange('osp', (o, s))
+        elif s is not None:
+            rows = self.rowRange('spo', tuple(i for i in (s, p, o) if i is not None))
+        elif p is not None:
+            rows = self.rowRange('pos', tuple(i for i in (p, o) if i is not None))
+        elif o is not None:
+            rows = self.rowRange('osp', (o,))
+        else:
+            rows = self.orders['spo']
+        term = self.term
+        for i in rows:
+            ts, tp, to = self.row(i)
+            yield (term(ts), term(tp), term(to)), iter(())
+
+    def __len__(self, context=None):
+        return self.size
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def namespaces(self):
+        return iter(self.prefixes.items())
+
+    def namespace(self, prefix):
+        namespace = self.prefixes.get(prefix)
+        return URIRef(namespace) if namespace is not None else None
+
+    def prefix(self, namespace):
+        for prefix, known in self.prefixes.items():
+            if known == str(namespace):
+                return prefix
+        return None
+
+    def bind(self, prefix, namespace, override=True):
+        pass # the prefixes of the sources are recorded at compilation
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError('An ontology store is read-only')
+
+    def addN(self, quads):
+        raise TypeError('An ontology store is read-only')
+
+    def remove(self, triple, context=None):
+        raise TypeError('An ontology store is read-only')
+
+
+def openStore(store_path, ontology_files=None, rebuild=True, force=False):
+    """Return the graph of an ontology store.
+
+    A store compiled from other files than ontology_files raises
+    StaleStoreError: it may be shared with jobs using those files. A missing
+    store, or one whose recorded sources were modified since, is recompiled
+    when rebuild is true; otherwise StaleStoreError is raised. force
+    recompiles the store from ontology_files whatever it holds.
+    """
+    store = OntologyStore(store_path)
+    if force:
+        reason = 'rebuild requested'
+    else:
+        if store.exists() and ontology_files is not None:
+            mismatch = store.sourceMismatch(ontology_files)
+            if mismatch:
+                raise StaleStoreError('Ontology store {} was {}; rebuild it explicitly (--rebuild_store)'
+                                      ' to replace it'.format(store_path, mismatch))
+        reason = store.staleReason()
+        if reason is None:
+            return store.load()
+        if not rebuild:
+            raise StaleStoreError('Stale ontology store {}: {}'.format(store_path, reason))
+    if ontology_files is not None:
+        sources = ontology_files
+    else:
+        try:
+            sources = store.sources() if store.exists() else None
+        except StaleStoreError:
+            sources = None
+    if not sources:
+        raise StaleStoreError('Cannot rebuild ontology store {}: {}'.format(store_path, reason))
+    logger.warning("Recompiling ontology store %s (%s)", store_path, reason)
+    return store.compile(sources)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='pddlsc ontology',
+                                 description='Manage precompiled ontology stores.')
+    sub = ap.add_subparsers(dest='command')
+    compile_ap = sub.add_parser('compile', help='merge RDF files into a store')
+    compile_ap.add_argument('-r', '--ontology_file', nargs='+', type=str, required=True,
+                            help='RDF file(s) for ontology')
+    compile_ap.add_argument('-s', '--ontology_store', type=str, required=True,
+                            help='output store file')
+    check_ap = sub.add_parser('check', help='report whether a store is up to date')
+    check_ap.add_argument('-s', '--ontology_store', type=str, required=True,
+                          help='store file')
+    args = ap.parse_args(argv)
+
+    store = OntologyStore(args.ontology_store)
+    if args.command == 'compile':
+        store.compile(args.ontology_file)
+        print("Compiled {} triples ({} terms) into {}".format(
+            store.header['triples'], store.header['terms'], args.ontology_store))
+    elif args.command == 'check':
+        reason = store.staleReason()
+        if reason:
+            print("Stale: {}".format(reason))
+            sys.exit(1)
+        print("Up to date: {} triples from {}".format(store.header['triples'], ', '.join(store.sources())))
+    else:
+        ap.print_help()
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import sys
+import time
+import argparse
+import rdflib
+from rdflib import URIRef, Literal
+from rdflib.store import Store
+
+
+#
+# A read-only union view over several rdflib graphs.
+#
+# Unlike graph1 + graph2 no triple is copied: patterns are matched against
+# each member graph in turn, and a triple already present in an earlier
+# member is skipped so that the view keeps the set semantics of a merge.
+#
+# rdflib.graph.ReadOnlyGraphAggregate is not used: it yields a triple once
+# per member holding it, so a triple shared by the objects and the common
+# ontology (an rdf:type, a label...) multiplies the rows of every join and
+# changes COUNTs and len(), and it answers namespaces() from a namespace
+# manager of its own instead of the prefixes bound in the members.
+
+class UnionStore(Store):
+    """A read-only store matching triple patterns against member graphs"""
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, graphs):
+        super().__init__()
+        self.graphs = [g for g in graphs if g is not None]
+
+    def triples(self, triple_pattern, context=None):
+        for i, graph in enumerate(self.graphs):
+            earlier = self.graphs[:i]
+            for triple in graph.triples(triple_pattern):
+                if any(triple in g for g in earlier):
+                    continue
+                yield triple, iter(())
+
+    def __len__(self, context=None):
+        return sum(1 for _ in self.triples((None, None, None)))
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def namespaces(self):
+        seen = set()
+        for graph in self.graphs:
+            for prefix, namespace in graph.namespaces():
+                if prefix not in seen:
+                    seen.add(prefix)
+                    yield prefix, namespace
+
+    def namespace(self, prefix):
+        for graph in self.graphs:
+            namespace = graph.store.namespace(prefix)
+            if namespace is not None:
+                return namespace
+        return None
+
+    def prefix(self, namespace):
+        for graph in self.graphs:
+            prefix = graph.store.prefix(namespace)
+            if prefix is not None:
+                return prefix
+        return None
+
+    def bind(self, prefix, namespace, override=True):
+        pass # prefixes come from the members
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError('An ontology union view is read-only')
+
+    def addN(self, quads):
+        raise TypeError('An ontology union view is read-only')
+
+    def remove(self, triple, context=None):
+        raise TypeError('An ontology union view is read-only')
+
+
+def unionView(*graphs):
+    """Return a read-only rdflib.Graph over the given graphs (None are ignored).
+    A single graph is returned as is.
+    """
+    graphs = [g for g in graphs if g is not None]
+    if len(graphs) == 1:
+        return graphs[0]
+    return rdflib.Graph(store=UnionStore(graphs))
+
+
+def syntheticGraph(prefix, size):
+    graph = rdflib.Graph()
+    p = URIRef('uri:bench/p')
+    for i in range(size):
+        graph.add((URIRef('uri:bench/{}{}'.format(prefix, i)), p,
+                   URIRef('uri:bench/{}{}'.format(prefix, i + 1))))
+        graph.add((URIRef('uri:bench/{}{}'.format(prefix, i)), URIRef('uri:bench/n'), Literal(i)))
+    return graph
+
+
+def benchmark(common_sizes=(1000, 10000, 100000), objects_size=100, out=sys.stdout):
+    """Report the per-problem cost of composing the objects graph of a
+    problem with common ontologies of growing size, by copying (graph + graph)
+    and through a union view, including one lookup query"""
+    objects = syntheticGraph('o', objects_size)
+    formula = 'SELECT ?x WHERE { <uri:bench/o0> <uri:bench/p> ?x }'
+    out.write('{:>10s} {:>12s} {:>12s}\n'.format('common', 'copy (s)', 'view (s)'))
+    for size in common_sizes:
+        common = syntheticGraph('c', size)
+        timings = []
+        for compose in (lambda: objects + common, lambda: unionView(objects, common)):
+            start = time.perf_counter()
+            list(compose().query(formula))
+            timings.append(time.perf_counter() - start)
+        out.write('{:10d} {:12.4f} {:12.4f}\n'.format(len(common), timings[0], timings[1]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark ontology composition per problem.')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                    help='numbers of resources in the synthetic common ontology')
+    ap.add_argument('--objects', type=int, default=100,
+                    help='number of resources in the synthetic objects ontology')
+    args = ap.parse_args()
+    benchmark(args.sizes, args.objects)
+
+
+if __name__ == '__main__':
+    main()
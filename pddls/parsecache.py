@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+
+# Bump whenever the jsonized PDDL produced by the parser changes shape,
+# so that stale entries are never served.
+PARSER_VERSION = '2'
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def grammarVersion():
+    """Return the installed pddlpy (grammar) version without importing it"""
+    try:
+        from importlib.metadata import version
+        return version('pddlpy')
+    except Exception:
+        return 'unknown'
+
+
+def defaultCacheDir():
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.environ.get('PDDLS_CACHE_DIR', os.path.join(cache_home, 'pddls', 'parse'))
+
+
+class ParseCache:
+    """A content-addressed on-disk cache of parseAsJson results.
+
+    Entries are keyed by the hash of the file content together with the
+    parser and grammar versions, and evicted least-recently-used first
+    once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or defaultCacheDir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._version = '{}:{}'.format(PARSER_VERSION, grammarVersion())
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, content, variant=''):
+        h = hashlib.sha256()
+        h.update(self._version.encode('utf-8'))
+        h.update(b'\0')
+        h.update(variant.encode('utf-8'))
+        h.update(b'\0')
+        h.update(content)
+        return h.hexdigest()
+
+    def keyForFile(self, input_file, variant=''):
+        with open(input_file, 'rb') as fd:
+            return self.key(fd.read(), variant)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'r') as fd:
+                doc = json.load(fd, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path) # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return doc
+
+    def put(self, key, doc):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as out:
+                json.dump(doc, out)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _mtime, _size, path in self.entries():
+            os.remove(path)
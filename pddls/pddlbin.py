@@ -0,0 +1,340 @@
+import os
+import sys
+import mmap
+import json
+import struct
+from array import array
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from .fastpddl import tokenize
+
+
+#
+# A binary interchange format for jsonized PDDL.
+#
+#   MAGIC | header length (uint64) | header (JSON) | sections
+#
+# The header lists the sections with their lengths; they follow it in that
+# order, each 8-byte aligned, and are read through mmap, so that loading one
+# of them does not decode the others:
+#
+#   meta     the document without its :init, as JSON
+#   strings  the string table: uint32 count, count + 1 uint32 offsets into
+#            the UTF-8 bytes that follow
+#   init     the :init facts as columns of little-endian uint32:
+#            groups (predicate id, arity, count, first argument) per
+#            (predicate, arity), the group of each fact in document order,
+#            then the argument ids of every group. Elements that are not
+#            plain atoms (fluents, negations, ...) form the group of
+#            OTHER_GROUP, with the id of their whole text as argument.
+
+MAGIC = b'PDDLSBIN'
+FORMAT_VERSION = 1
+EXTENSION = '.pddlb'
+OTHER_GROUP = 0xFFFFFFFF
+_ALIGN = 8
+
+
+def isBinaryFile(path):
+    if path.lower().endswith(EXTENSION):
+        return True
+    try:
+        with open(path, 'rb') as fd:
+            return fd.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _uint32s(values):
+    column = array('I', values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _uint32View(view):
+    """The little-endian uint32 column in a view, as a sequence of ints"""
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    column = array('I')
+    column.frombytes(view)
+    column.byteswap()
+    return column
+
+
+def encodeInit(init):
+    """Return the (strings, init section, number of facts) of :init elements"""
+    ids = {}
+    strings = []
+
+    def intern(text):
+        string_id = ids.get(text)
+        if string_id is None:
+            string_id = ids[text] = len(strings)
+            strings.append(text)
+        return string_id
+
+    groups = OrderedDict() # (predicate id, arity) -> [group index, facts, argument ids]
+    fact_groups = array('I')
+    for element in init:
+        element = str(element)
+        tokens = tokenize(element)
+        inner = tokens[1:-1]
+        if tokens[:1] == ['('] and tokens[-1:] == [')'] and inner \
+           and '(' not in inner and ')' not in inner:
+            key = (intern(inner[0]), len(inner) - 1)
+            args = [intern(arg) for arg in inner[1:]]
+        else:
+            key = (OTHER_GROUP, 1)
+            args = [intern(element)]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [len(groups), 0, array('I')]
+        fact_groups.append(group[0])
+        group[1] += 1
+        group[2].extend(args)
+
+    table = []
+    first = 0
+    for (predicate_id, arity), (_index, count, args) in groups.items():
+        table.extend((predicate_id, arity, count, first))
+        first += len(args)
+    body = [struct.pack('<II', len(groups), len(fact_groups)), _uint32s(table), _uint32s(fact_groups)]
+    for _index, _count, args in groups.values():
+        body.append(_uint32s(args))
+    return strings, b''.join(body), len(fact_groups)
+
+
+def encodeStrings(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return struct.pack('<I', len(strings)) + _uint32s(offsets) + b''.join(encoded)
+
+
+def writeBinary(doc, out_file):
+    """Write a jsonized PDDL (e.g. parseAsJson output) into a binary file"""
+    meta = OrderedDict((k, v) for k, v in doc.items() if k != 'pddl:init')
+    if 'pddl:goal' in meta:
+        meta['pddl:goal'] = str(meta['pddl:goal'])
+    has_init = 'pddl:init' in doc
+    strings, init, facts = encodeInit(doc['pddl:init'] if has_init else [])
+    sections = OrderedDict([
+        ('meta', json.dumps(meta).encode('utf-8')),
+        ('strings', encodeStrings(strings)),
+        ('init', init),
+    ])
+    header = { 'version': FORMAT_VERSION, 'has_init': has_init, 'facts': facts,
+               'sections': [[name, len(data)] for name, data in sections.items()] }
+    encoded = json.dumps(header).encode('utf-8')
+
+    tmp_path = out_file + '.tmp'
+    with open(tmp_path, 'wb') as fd:
+        fd.write(MAGIC)
+        fd.write(struct.pack('<Q', len(encoded)))
+        fd.write(encoded)
+        position = len(MAGIC) + 8 + len(encoded)
+        for data in sections.values():
+            padding = -position % _ALIGN
+            fd.write(b'\0' * padding)
+            fd.write(data)
+            position += padding + len(data)
+    os.replace(tmp_path, out_file)
+
+
+class StringTable:
+    """The strings of a binary file, decoded on access"""
+
+    def __init__(self, view):
+        (self.count,) = struct.unpack_from('<I', view, 0)
+        self.offsets = _uint32View(view[4:4 + 4 * (self.count + 1)])
+        self.data = view[4 + 4 * (self.count + 1):]
+        self.cache = {}
+
+    def release(self):
+        """Release the views of the mapped file"""
+        for view in (self.offsets, self.data):
+            if isinstance(view, memoryview):
+                view.release()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, string_id):
+        text = self.cache.get(string_id)
+        if text is None:
+            text = self.cache[string_id] = \
+                bytes(self.data[self.offsets[string_id]:self.offsets[string_id + 1]]).decode('utf-8')
+        return text
+
+
+class BinaryInit:
+    """The :init facts of a binary file, decoded lazily in document order.
+    Like fastpddl.InitStream, it may be iterated repeatedly and adding a
+    list returns a new one yielding the list after the file's facts.
+    """
+
+    def __init__(self, binary, tail=()):
+        self.binary = binary
+        self.tail = list(tail)
+
+    def __len__(self):
+        return self.binary.header['facts'] + len(self.tail)
+
+    def columns(self):
+        """Return the groups, the group of each fact and the arguments"""
+        view = self.binary.section('init')
+        n_groups, n_facts = struct.unpack_from('<II', view, 0)
+        position = 8
+        groups = _uint32View(view[position:position + 16 * n_groups])
+        position += 16 * n_groups
+        fact_groups = _uint32View(view[position:position + 4 * n_facts])
+        position += 4 * n_facts
+        args = _uint32View(view[position:])
+        return [tuple(groups[i:i + 4]) for i in range(0, len(groups), 4)], fact_groups, args
+
+    def __iter__(self):
+        # the file is mapped for the time of the iteration
+        with self.binary.opened():
+            yield from self.iterFacts()
+        for axiom in self.tail:
+            yield axiom
+
+    def iterFacts(self):
+        strings = self.binary.strings()
+        groups, fact_groups, args = self.columns()
+        cursors = [first for (_predicate_id, _arity, _count, first) in groups]
+        for group in fact_groups:
+            predicate_id, arity, _count, _first = groups[group]
+            position = cursors[group]
+            if predicate_id == OTHER_GROUP:
+                yield strings[args[position]]
+            else:
+                yield ' '.join(['(', strings[predicate_id]]
+                               + [strings[a] for a in args[position:position + arity]] + [')'])
+            cursors[group] = position + arity
+
+    def __add__(self, other):
+        return BinaryInit(self.binary, self.tail + list(other))
+
+    def factTable(self, symbols=None):
+        """Return the facts as a FactTable without going through strings"""
+        from .facttable import FactTable
+        table = FactTable(symbols)
+        with self.binary.opened():
+            self.addFacts(table)
+        for axiom in self.tail:
+            table.addText(axiom)
+        return table
+
+    def addFacts(self, table):
+        strings = self.binary.strings()
+        groups, _fact_groups, args = self.columns()
+        for predicate_id, arity, count, first in groups:
+            if predicate_id == OTHER_GROUP:
+                for position in range(first, first + count):
+                    table.addText(strings[args[position]])
+                continue
+            predicate = strings[predicate_id]
+            for i in range(count):
+                position = first + i * arity
+                table.add(predicate, [strings[a] for a in args[position:position + arity]])
+
+
+class BinaryPddl:
+    """A memory-mapped binary PDDL file.
+
+    close() (or a with block) unmaps the file; the lazy :init of a loaded
+    document maps it again for the time of each read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mapped = None
+        self._strings = None
+        if os.path.getsize(path) < len(MAGIC) + 8:
+            raise RuntimeError('Not a binary PDDL file: {}'.format(path))
+        self.open()
+        if self.mapped[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise RuntimeError('Not a binary PDDL file: {}'.format(path))
+        (length,) = struct.unpack_from('<Q', self.mapped, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self.mapped[start:start + length].decode('utf-8'))
+        if self.header.get('version') != FORMAT_VERSION:
+            raise RuntimeError('Unsupported binary PDDL version {}'.format(self.header.get('version')))
+        # the sections follow the header, each 8-byte aligned
+        self.sections = {}
+        position = start + length
+        for name, section_length in self.header['sections']:
+            position += -position % _ALIGN
+            self.sections[name] = (position, section_length)
+            position += section_length
+
+    def open(self):
+        if self.mapped is None:
+            with open(self.path, 'rb') as fd:
+                self.mapped = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.mapped is None:
+            return
+        if self._strings is not None:
+            self._strings.release()
+            self._strings = None
+        self.mapped.close()
+        self.mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def opened(self):
+        """Map the file for the time of a read if it is closed"""
+        if self.mapped is not None:
+            yield self
+            return
+        self.open()
+        try:
+            yield self
+        finally:
+            self.close()
+
+    def section(self, name):
+        offset, length = self.sections[name]
+        return memoryview(self.mapped)[offset:offset + length]
+
+    def meta(self):
+        # plain dicts inside, as json2pddl checks their exact type
+        return OrderedDict(json.loads(bytes(self.section('meta')).decode('utf-8')))
+
+    def strings(self):
+        if self._strings is None:
+            self._strings = StringTable(self.section('strings'))
+        return self._strings
+
+    def load(self, structured=False):
+        """Return the jsonized PDDL; its :init is a lazy BinaryInit, or a
+        FactTable (and its goal a Formula) when structured"""
+        doc = self.meta()
+        if self.header.get('has_init'):
+            init = BinaryInit(self)
+            if structured:
+                from .facttable import FactTable, SymbolTable, Formula
+                symbols = SymbolTable()
+                doc['pddl:init'] = init.factTable(symbols)
+                if isinstance(doc.get('pddl:goal'), str):
+                    doc['pddl:goal'] = Formula.fromText(doc['pddl:goal'], symbols)
+                return doc
+            doc['pddl:init'] = init
+        return doc
+
+
+def loadBinary(path, structured=False):
+    with BinaryPddl(path) as binary:
+        return binary.load(structured)
@@ -1,13 +1,35 @@
+import os
+import re
 import sys
 import argparse
 import json
+import time
+import hashlib
+import functools
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import yaml
 import rdflib
-from rdflib import Namespace, URIRef, Literal
+from rdflib import URIRef, Literal
 from io import StringIO
 
-from .pddl2json import parseAsJson
-from .json2pddl import serializePredicateAxiom, serializePDDL
+from .pddl2json import parseAsJson, BACKENDS
+from .parsecache import ParseCache, DEFAULT_MAX_BYTES
+from .json2pddl import serializePredicateAxiom, serializePDDL, printPDDL
+from .fastpddl import iterProblem, tokenize
+from .sparqlcache import QueryCache, DEFAULT_MAXSIZE
+from .ontoview import unionView
+from .queryrewrite import bindValues, projectedVariables
+from .facttable import FactTable, structureProblem
+from .pddlbin import isBinaryFile, loadBinary
+from .rulecatalog import ESTABLISHED_WITH, RuleCatalog, preparedQuery
+from .metrics import Metrics, stage, count
+
+
+logger = logging.getLogger(__name__)
+
 
 def extractObjectURIs(problem):
     problemContext = problem.get('@context', {})
@@ -33,65 +55,296 @@ def extractPredicateURIs(domains):
 def anyIn(uriRefs, objset):
     for uriRef in uriRefs:
         if not (str(uriRef) in objset):
-            print("Excluded axiom with an object {}".format(uriRef))
+            logger.debug("Excluded axiom with an object %s", uriRef)
             return False
     return True
 
 
-ESTABLISHED_WITH = URIRef(u'uri:pddls#establishedWith')
-
-
 def uriRefs2Symbols(uriRefs, objectURIs):
     return [objectURIs[str(uriRef)] for uriRef in uriRefs]
 
 
-def resolvePredicateAxioms(predicateURI, objectURIs, ontology):
+def extractTypeParents(domains):
+    parents = {}
+    for pddlDomain in domains:
+        for name, parent in pddlDomain.get('pddl:types', {}).items():
+            parents[name] = parent
+    return parents
+
+
+def isSubtype(typing, expected, typeParents):
+    seen = set()
+    while typing is not None and typing not in seen:
+        if typing == expected:
+            return True
+        seen.add(typing)
+        typing = typeParents.get(typing)
+    return False
+
+
+def parameterObjectURIs(params, problem, objectURIs, typeParents):
+    """Return, for each parameter of a predicate, the set of object URIs
+    of the problem whose declared type fits the parameter's type"""
+    objectTypes = problem.get('pddl:objects', {})
+    result = []
+    for param in params:
+        expected = next(iter(param.values())) if type(param) is dict else None
+        if expected is None or expected == 'object' or expected.startswith('('):
+            # untyped, the root type, or (either ...)
+            result.append(set(objectURIs))
+        else:
+            result.append(set(uri for uri, symbol in objectURIs.items()
+                              if isSubtype(objectTypes.get(symbol), expected, typeParents)))
+    return result
+
+
+def sparqlFormula(predicateURI, ontology):
+    """Return the text of the SPARQL establishedWith formula of a predicate, or None"""
     predicateURI = URIRef(predicateURI) if not type(predicateURI) is URIRef else predicateURI
-    formula = None
     formulas = ontology.objects(predicateURI, ESTABLISHED_WITH)
     for f in formulas:
         if type(f) is Literal and f.language == 'sparql':
-            print("SPARQL formula Found")
-            formula = str(f)
-            break
+            logger.debug("SPARQL formula found for %s", predicateURI)
+            return str(f)
         else:
             if type(f) is URIRef:
-                print("Unsupported graph formula found {}".format(f))
-                pass
+                logger.warning("Unsupported graph formula found %s", f)
             else:
-                print("Unsupported formula found with language {}".format(f.language))
-    if formula:
-        qres = ontology.query(formula)
-        #return qres
-        return [ objs for objs in qres if anyIn(objs, objectURIs) ]
+                logger.warning("Unsupported formula found with language %s", f.language)
+    return None
+
+
+def resolvePredicateAxioms(predicateURI, objectURIs, ontology, query_cache=None, fingerprint=None,
+                           allowedURIs=None, catalog=None, engine=None, metrics=None):
+    """Return the rows of the predicate's establishedWith formula whose
+    terms are all problem objects (allowedURIs narrows each column down to
+    a set of object URIs, e.g. by parameter type).
+
+    The query is restricted to the problem's objects before evaluation by
+    binding its most selective column to a VALUES block.
+    With a RuleCatalog of the ontology, its compiled formula is used.
+    An engine (e.g. a NumpyTripleStore of the ontology) evaluates the query
+    instead of rdflib.
+    With Metrics, the rows returned by the query and those filtered out
+    are counted.
+    """
+    if catalog is not None:
+        rule = catalog.rule(predicateURI)
+        if rule is None:
+            return []
+        formula, query, variables = rule.formula, rule.query, rule.variables
     else:
-        return []
+        formula = sparqlFormula(predicateURI, ontology)
+        if not formula:
+            return []
+        query = preparedQuery(formula)
+        variables = projectedVariables(query)
+    if allowedURIs is None or len(allowedURIs) != len(variables):
+        allowedURIs = [set(objectURIs)] * len(variables)
+    if not all(allowedURIs):
+        return [] # some column has no candidate object at all
+
+    key = formula
+    if variables:
+        column = min(range(len(variables)), key=lambda i: len(allowedURIs[i]))
+        values = sorted(allowedURIs[column])
+        bound = bindValues(query, variables[column], [URIRef(uri) for uri in values])
+        if bound is not None:
+            query = bound
+            key = '{}\n#VALUES {} {}'.format(formula, variables[column], ' '.join(values))
 
+    target = engine if engine is not None else ontology
+    if query_cache is not None:
+        qres = query_cache.query(target, key, fingerprint, query)
+    else:
+        qres = list(target.query(query))
+    result = [ row for row in qres
+               if all(str(term) in allowed for term, allowed in zip(row, allowedURIs)) ]
+    excluded = len(qres) - len(result)
+    count(metrics, 'rows_returned', len(qres))
+    count(metrics, 'rows_filtered', excluded)
+    if excluded:
+        logger.info("Excluded %d axiom(s) of %s with objects out of the problem or parameter types",
+                    excluded, predicateURI)
+    return result
 
-def translate(problem, objects_ontology, domains, common_ontology=rdflib.Graph()):
-    onto_graph = objects_ontology + common_ontology
+
+# State of the forked predicate resolution processes, set by their initializer
+_resolveState = {}
+
+
+def initResolveWorker(state):
+    _resolveState.update(state)
+
+
+def resolveJob(state, job):
+    """Resolve one predicate, returning (rows, seconds, counters), the
+    counters being None unless metrics are collected"""
+    predURI, allowedURIs = job
+    # counted apart, as a forked worker cannot update the caller's metrics
+    metrics = Metrics() if state.get('metrics') is not None else None
+    start = time.perf_counter()
+    logger.debug("Resolving predicate %s", predURI)
+    rows = resolvePredicateAxioms(predURI, state['objectURIs'], state['ontology'],
+                                  state['query_cache'], state['fingerprint'], allowedURIs,
+                                  state['catalog'], state['engine'], metrics)
+    rows = [tuple(row) for row in rows] # rdflib result rows do not pickle
+    return rows, time.perf_counter() - start, metrics.counters if metrics is not None else None
+
+
+def resolveForkedJob(job):
+    return resolveJob(_resolveState, job)
+
+
+def resolveAll(jobs, objectURIs, ontology, query_cache=None, fingerprint=None,
+               workers=None, pool='thread', catalog=None, engine=None, metrics=None):
+    """Resolve (predicate URI, allowed URIs) jobs, sequentially or with a
+    pool of workers, and return their (rows, seconds, counters) in the
+    order of jobs"""
+    # the state of this call only, translate may run concurrently
+    state = dict(objectURIs=objectURIs, ontology=ontology,
+                 query_cache=query_cache, fingerprint=fingerprint, catalog=catalog,
+                 engine=engine, metrics=metrics)
+    if not workers or workers <= 1 or len(jobs) <= 1:
+        return [resolveJob(state, job) for job in jobs]
+    if pool == 'process':
+        # forked workers inherit the ontology, handed to their initializer
+        # without pickling; each has its own copy of the query cache, so only
+        # its disk directory is shared with this process
+        methods = multiprocessing.get_all_start_methods()
+        if 'fork' in methods:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('fork'),
+                                     initializer=initResolveWorker, initargs=(state,)) as executor:
+                return list(executor.map(resolveForkedJob, jobs))
+        logger.warning("Process pool needs fork, resolving predicates with threads")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(functools.partial(resolveJob, state), jobs))
+
+
+def translate(problem, objects_ontology, domains, common_ontology=None,
+              query_cache=None, ontology_fingerprint=None, workers=None, pool='thread',
+              catalog=None, engine=None, metrics=None):
+    """Add the axioms established by the ontology to the problem.
+    The objects and common ontologies are queried through a read-only union
+    view, so a large common ontology is shared as is between problems.
+    With a QueryCache, SPARQL results are reused for an ontology with the
+    same fingerprint, which must then be given and cover both ontology
+    graphs (see ontologyFingerprint).
+    With workers > 1, predicates are resolved concurrently by a pool of
+    threads or (forked) processes; axioms keep the sequential order.
+    A RuleCatalog of the composed ontology may be shared between calls;
+    otherwise one is built for this call. An engine built over the same
+    composed ontology (see loadQueryEngine) replaces rdflib for queries.
+    With Metrics, the query of each predicate and the axiom generation are
+    timed, and the rows returned and filtered out are counted.
+    """
+    if query_cache is not None and ontology_fingerprint is None:
+        raise ValueError('A SPARQL cache needs the fingerprint of the ontology sources')
+    onto_graph = unionView(objects_ontology, common_ontology)
 
     predicateURIs = extractPredicateURIs(domains)
-    print("Extracted predicates:")
-    print(yaml.dump(dict(predicateURIs), default_flow_style=False, indent=4))
     objectURIs = extractObjectURIs(problem)
-    print("Extracted objects:")
-    print(yaml.dump(dict(objectURIs), default_flow_style=False, indent=4))
-
-    axioms = []
-    for predURI, (symbol, _params) in predicateURIs.items():
-        print("Resolving predicate {}".format(predURI))
-        qres = resolvePredicateAxioms(predURI, objectURIs, onto_graph)
-        for uriRefs in qres:
-            #print("{} insertable {}".format(pillar, hole))
-            axiom_args = uriRefs2Symbols(uriRefs, objectURIs)
-            axiom = serializePredicateAxiom(symbol, axiom_args)
-            axioms.append(axiom)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted predicates:\n%s",
+                     yaml.dump(dict(predicateURIs), default_flow_style=False, indent=4))
+        logger.debug("Extracted objects:\n%s",
+                     yaml.dump(dict(objectURIs), default_flow_style=False, indent=4))
+
+    if catalog is None:
+        # a shared catalog is reported once by its owner (see reportCatalog)
+        catalog = RuleCatalog(onto_graph)
+        reportCatalog(catalog, predicateURIs)
+
+    typeParents = extractTypeParents(domains)
+    jobs = [ (predURI, parameterObjectURIs(params, problem, objectURIs, typeParents))
+             for predURI, (_symbol, params) in predicateURIs.items() ]
+    resolved = resolveAll(jobs, objectURIs, onto_graph, query_cache, ontology_fingerprint,
+                          workers, pool, catalog, engine, metrics)
+
+    with stage(metrics, 'axioms'):
+        axioms = []
+        timings = OrderedDict()
+        for (predURI, (symbol, _params)), (qres, seconds, counters) in zip(predicateURIs.items(), resolved):
+            timings[predURI] = round(seconds, 6)
+            if metrics is not None:
+                metrics.addQuery(predURI, seconds)
+                metrics.merge({'counters': counters})
+            for uriRefs in qres:
+                #print("{} insertable {}".format(pillar, hole))
+                axiom_args = uriRefs2Symbols(uriRefs, objectURIs)
+                axioms.append((symbol, axiom_args))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Predicate timings (s):\n%s",
+                         yaml.dump(dict(timings), default_flow_style=False, indent=4))
+
+        result = composeResult(problem, domains, axioms, metrics)
+    return result
+
+
+def reportCatalog(catalog, predicateURIs=None):
+    """Log the unsupported formulas of a RuleCatalog as warnings"""
+    if logger.isEnabledFor(logging.WARNING):
+        report = StringIO()
+        catalog.report(predicateURIs, report)
+        for line in report.getvalue().splitlines():
+            logger.warning(line)
+
 
+_FACT_PREDICATE = re.compile(r'\s*\(\s*([^\s();]+)')
+
+
+def factKey(tokens):
+    """The canonical form of a fact: its tokens, case-insensitively"""
+    return tuple(token.lower() for token in tokens)
+
+
+def mergeAxioms(init, axioms):
+    """Return the init extended with the (predicate, args) axioms that are
+    not already facts of it nor duplicates of an earlier axiom, and the
+    numbers of (derived, deduplicated) axioms"""
+    # only the facts of the derived predicates can be duplicates, the others
+    # are skipped without tokenizing them (a streamed :init stays small)
+    symbols = set(symbol.lower() for symbol, _args in axioms)
+    index = set()
+    if not symbols:
+        pass
+    elif isinstance(init, FactTable):
+        for predicate, args in init.iterAtoms():
+            if predicate.lower() in symbols:
+                index.add(factKey(('(', predicate) + args + (')',)))
+    else:
+        for fact in init:
+            match = _FACT_PREDICATE.match(fact)
+            if match is None or match.group(1).lower() in symbols:
+                index.add(factKey(tokenize(fact)))
+    added = []
+    for symbol, axiom_args in axioms:
+        key = factKey(['(', symbol] + list(axiom_args) + [')'])
+        if key not in index:
+            index.add(key)
+            added.append((symbol, axiom_args))
+
+    if isinstance(init, FactTable):
+        init = init.copy()
+        for symbol, axiom_args in added:
+            init.add(symbol, axiom_args)
+    else:
+        # a new list (or InitStream), leaving the source problem untouched
+        init = init + [serializePredicateAxiom(symbol, axiom_args) for symbol, axiom_args in added]
+    return init, len(axioms), len(axioms) - len(added)
+
+
+def composeResult(problem, domains, axioms, metrics=None):
+    """Return (problem, domains) without JSON-LD contexts, the problem
+    extended with the axioms, (predicate, args) pairs"""
     result_problem = problem.copy()
     if '@context' in result_problem:
         result_problem.pop('@context')
-    result_problem['pddl:init'] += axioms
+    result_problem['pddl:init'], derived, deduplicated = mergeAxioms(result_problem['pddl:init'], axioms)
+    count(metrics, 'axioms_derived', derived)
+    count(metrics, 'axioms_deduplicated', deduplicated)
+    logger.info("Derived %d axiom(s), dropped %d duplicate(s)", derived, deduplicated)
 
     result_domains = []
     for domain in domains:
@@ -103,39 +356,257 @@ def translate(problem, objects_ontology, domains, common_ontology=rdflib.Graph()
     return (result_problem, result_domains)
 
 
-def main(args):
-    if args.input_pddls_file[-5:] == '.json' or args.input_pddls_file[-7:] == '.jsonld':
-        with open(args.input_pddls_file, 'r') as fd:
+def loadProblem(problem_file, cache=None, backend='antlr', stream=False, structured=False):
+    """Return the jsonized problem, with its :init and :goal interned into
+    a FactTable and a Formula when structured"""
+    if problem_file[-5:] == '.json' or problem_file[-7:] == '.jsonld':
+        with open(problem_file, 'r') as fd:
             problem = json.load(fd)
+    elif isBinaryFile(problem_file):
+        # memory-mapped, the :init is decoded straight into the FactTable
+        return loadBinary(problem_file, structured)
+    elif stream:
+        problem = iterProblem(problem_file)
     else:
-        problem = parseAsJson(args.input_pddls_file)
+        problem = parseAsJson(problem_file, cache=cache, backend=backend)
+    return structureProblem(problem) if structured else problem
 
-    domains = [parseAsJson(domain_file) for domain_file in args.domain_file]
 
+def loadOntology(ontology_files, store_path=None, rebuild_store=False):
+    if store_path:
+        from .ontostore import openStore
+        return openStore(store_path, ontology_files or None, force=rebuild_store)
     onto_graph = rdflib.Graph()
-    for onto_file in args.ontology_file:
+    for onto_file in ontology_files:
         rdf_format = rdflib.util.guess_format(onto_file)
         onto_graph.parse(onto_file, format=rdf_format)
+    return onto_graph
+
+
+def loadQueryEngine(name, ontology, store_path=None):
+    """Return the query engine named by --query_engine over an ontology,
+    None for rdflib itself"""
+    if name == 'rdflib':
+        return None
+    try:
+        from .npstore import NumpyTripleStore
+    except ImportError:
+        logger.warning("The numpy query engine needs NumPy, querying with rdflib")
+        return None
+    if store_path:
+        from .ontostore import OntologyStore
+        return NumpyTripleStore.fromOntologyStore(OntologyStore(store_path))
+    return NumpyTripleStore.fromGraph(ontology)
+
+
+def ontologyFingerprint(ontology_files, store_path=None):
+    """A digest of the ontology source contents, as recorded by ontology stores"""
+    if store_path:
+        from .ontostore import OntologyStore
+        return OntologyStore(store_path).fingerprint
+    from .ontostore import fileDigest
+    digests = [fileDigest(f) for f in ontology_files]
+    return hashlib.sha256('\n'.join(digests).encode('utf-8')).hexdigest()
+
+
+def queryCacheFor(args):
+    """The SPARQL cache asked for by --sparql_cache_size or --sparql_cache_dir, None by default"""
+    size = getattr(args, 'sparql_cache_size', None)
+    cache_dir = getattr(args, 'sparql_cache_dir', None)
+    if not size and not cache_dir:
+        return None
+    return QueryCache(DEFAULT_MAXSIZE if size is None else size, cache_dir)
+
+
+def main(args):
+    cache = None
+    if getattr(args, 'cache_dir', None):
+        cache = ParseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    backend = getattr(args, 'backend', 'antlr')
+    stream = getattr(args, 'stream', False)
+
+    input_files = args.input_pddls_file
+    if isinstance(input_files, str):
+        input_files = [input_files]
+    output_dir = getattr(args, 'output_dir', None)
+    if output_dir or len(input_files) > 1 or os.path.isdir(input_files[0]):
+        from .batch import main as batchMain
+        return batchMain(args, input_files, cache)
+
+    if getattr(args, 'watch', False):
+        from .watch import WatchSession, watch
+        output_path = None
+        if args.output_file is not sys.stdout:
+            output_path = args.output_file.name
+            args.output_file.close()
+        session = WatchSession(input_files[0], args.domain_file, args.ontology_file,
+                               output_path, cache, backend, getattr(args, 'compact', False))
+        return watch(session, args.watch_interval)
+
+    metrics = metricsFor(args)
+    with stage(metrics, 'parse_problem'):
+        problem = loadProblem(input_files[0], cache, backend, stream,
+                              getattr(args, 'structured', False))
+
+    with stage(metrics, 'parse_domains'):
+        domains = [parseAsJson(domain_file, cache=cache, backend=backend)
+                   for domain_file in args.domain_file]
+
+    store_path = getattr(args, 'ontology_store', None)
+    with stage(metrics, 'ontology'):
+        onto_graph = loadOntology(args.ontology_file, store_path, getattr(args, 'rebuild_store', False))
+        engine = loadQueryEngine(getattr(args, 'query_engine', 'rdflib'), onto_graph, store_path)
+        query_cache = queryCacheFor(args)
+        fingerprint = None
+        if query_cache is not None:
+            fingerprint = ontologyFingerprint(args.ontology_file, store_path)
 
     #print(yaml.dump(dict(problem), default_flow_style=False, indent=4))
 
-    resultProblem, _resultDomains = translate(problem, onto_graph, domains)
-    args.output_file.write(serializePDDL(resultProblem))
+    with stage(metrics, 'translate'):
+        resultProblem, _resultDomains = translate(problem, onto_graph, domains,
+                                                  query_cache=query_cache,
+                                                  ontology_fingerprint=fingerprint,
+                                                  workers=getattr(args, 'predicate_workers', None),
+                                                  pool=getattr(args, 'predicate_pool', 'thread'),
+                                                  engine=engine, metrics=metrics)
+    if getattr(args, 'prune', False):
+        from .prune import pruneProblem
+        with stage(metrics, 'prune'):
+            resultDomain, resultProblem = pruneProblem(resultProblem, domains)
+        if args.pruned_domain_file:
+            printPDDL(resultDomain, args.pruned_domain_file, getattr(args, 'compact', False))
+    with stage(metrics, 'serialize'):
+        printPDDL(resultProblem, args.output_file, getattr(args, 'compact', False))
+    if engine is not None:
+        logger.info("Query engine: %s", engine.stats())
+    if query_cache is not None:
+        logger.info("SPARQL cache: %s", query_cache.stats())
+        if metrics is not None:
+            for name, n in query_cache.stats().items():
+                if isinstance(n, int):
+                    metrics.count('sparql_cache_' + name, n)
+    writeMetrics(metrics, args)
 
 
-if __name__ == '__main__':
+def metricsFor(args):
+    """A Metrics object when --profile or --metrics_json asks for one"""
+    if getattr(args, 'profile', False) or getattr(args, 'metrics_json', None):
+        return Metrics()
+    return None
+
+
+def writeMetrics(metrics, args):
+    if metrics is None:
+        return
+    if getattr(args, 'profile', False):
+        metrics.report(sys.stderr)
+    if getattr(args, 'metrics_json', None):
+        with open(args.metrics_json, 'w') as fd:
+            json.dump(metrics.toDict(process=True), fd, indent=1)
+
+
+def argParser():
     ap = argparse.ArgumentParser(description='Translate PDDLS to PDDL (or YAML).')
-    ap.add_argument('input_pddls_file', type=str,
-                    help='source problem PDDLS')
+    ap.add_argument('input_pddls_file', type=str, nargs='+',
+                    help='source problem PDDLS (several files or directories for a batch)')
     ap.add_argument('-d', '--domain_file',
                     nargs='+', type=str,
                     help='PDDLS file(s) for domain')
     ap.add_argument('-r', '--ontology_file',
                     nargs='+', type=str, default=[],
                     help='RDF file(s) for ontology')
+    ap.add_argument('-s', '--ontology_store', type=str, default=None,
+                    help='precompiled ontology store (see "pddlsc ontology compile"),'
+                         ' rebuilt when its sources were modified; a store compiled from'
+                         ' other ontology files is an error')
+    ap.add_argument('--rebuild_store', action='store_true', default=False,
+                    help='recompile the ontology store from the ontology files')
     ap.add_argument('-o', '--output_file',
                     type=argparse.FileType('w'), default=sys.stdout,
                     help='Output problem PDDL file')
-    args = ap.parse_args()
+    ap.add_argument('--compact', action='store_true', default=False,
+                    help='write the PDDL without indentation nor line breaks')
+    ap.add_argument('--prune', action='store_true', default=False,
+                    help='remove the objects, init facts and actions that cannot affect the goal')
+    ap.add_argument('--pruned_domain_file', type=argparse.FileType('w'), default=None,
+                    help='with --prune, output domain PDDL file without the irrelevant actions')
+    ap.add_argument('--output_dir', type=str, default=None,
+                    help='Output directory of a batch compilation, where problem p.pddls is'
+                         ' written as p.pddls.pddl (default: current directory)')
+    ap.add_argument('-j', '--workers', type=int, default=None,
+                    help='worker processes of a batch compilation (default: CPU count)')
+    ap.add_argument('--query_engine', choices=('rdflib', 'numpy'), default='rdflib',
+                    help='evaluate the formulas with rdflib, or with a NumPy triple store'
+                         ' falling back to rdflib for unsupported queries')
+    ap.add_argument('--predicate_workers', type=int, default=None,
+                    help='resolve ontology-backed predicates concurrently with this many workers')
+    ap.add_argument('--predicate_pool', choices=('thread', 'process'), default='thread',
+                    help='pool used by --predicate_workers')
+    ap.add_argument('--watch', action='store_true', default=False,
+                    help='keep running and recompile incrementally when the ontology files change')
+    ap.add_argument('--watch_interval', type=float, default=0.5,
+                    help='seconds between two checks of the watched files')
+    ap.add_argument('--backend', choices=BACKENDS, default='antlr',
+                    help='PDDL parser implementation')
+    ap.add_argument('--stream', action='store_true', default=False,
+                    help='stream the :init section of the problem from a memory-mapped file')
+    ap.add_argument('--structured', action='store_true', default=False,
+                    help='keep :init and :goal as interned fact tables instead of strings')
+    ap.add_argument('--sparql_cache_size', type=int, default=None,
+                    help='SPARQL results kept in memory (default: no cache, or {} with'
+                         ' --sparql_cache_dir)'.format(DEFAULT_MAXSIZE))
+    ap.add_argument('--sparql_cache_dir', type=str, default=None,
+                    help='directory persisting SPARQL results across runs')
+    ap.add_argument('--cache_dir', type=str, default=None,
+                    help='directory of the persistent parse cache (disabled by default)')
+    ap.add_argument('--cache_max_mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                    help='size limit of the parse cache in megabytes')
+    ap.add_argument('--profile', action='store_true', default=False,
+                    help='print the time of each stage and query, row counters and peak memory'
+                         ' to stderr')
+    ap.add_argument('--metrics_json', type=str, default=None,
+                    help='write the stage timings, counters and peak memory to this JSON file')
+    ap.add_argument('-v', '--verbose', action='count', default=0,
+                    help='log diagnostics to stderr (-v for progress, -vv for details)')
+    return ap
+
 
-    main(args)
+# options that watch mode does not honour, with their default
+WATCH_UNSUPPORTED = (('ontology_store', None), ('rebuild_store', False), ('query_engine', 'rdflib'),
+                     ('prune', False), ('pruned_domain_file', None), ('structured', False), ('stream', False),
+                     ('predicate_workers', None), ('sparql_cache_size', None), ('sparql_cache_dir', None),
+                     ('output_dir', None), ('profile', False), ('metrics_json', None))
+
+
+def watchConflicts(args):
+    """The options given with --watch that it would ignore"""
+    conflicts = ['--' + name for name, default in WATCH_UNSUPPORTED if getattr(args, name, default) != default]
+    if len(args.input_pddls_file) > 1 or os.path.isdir(args.input_pddls_file[0]):
+        conflicts.append('several problems')
+    return conflicts
+
+
+def cli(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['ontology']:
+        from .ontostore import main as ontologyMain
+        return ontologyMain(argv[1:])
+    if argv[:1] == ['serve']:
+        from .daemon import main as serveMain
+        return serveMain(argv[1:])
+    ap = argParser()
+    args = ap.parse_args(argv)
+    if args.watch and watchConflicts(args):
+        ap.error('--watch cannot be combined with {}'.format(', '.join(watchConflicts(args))))
+    configureLogging(args.verbose)
+    return main(args)
+
+
+def configureLogging(verbose=0):
+    level = logging.WARNING if not verbose else logging.INFO if verbose == 1 else logging.DEBUG
+    logging.basicConfig(level=level, format='%(levelname)s %(name)s: %(message)s', stream=sys.stderr)
+
+
+if __name__ == '__main__':
+    cli()
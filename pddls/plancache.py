@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .fastpddl import tokenize
+
+
+DEFAULT_MAXSIZE = 1024
+
+# The cached outcome of a problem the solver proved unsolvable
+UNSOLVABLE = 'unsolvable'
+
+
+def _sortedElements(tokens, start):
+    """Return the elements of the expression whose '(' is at start, sorted,
+    and the position after its ')'"""
+    elements = []
+    position = start + 2 # after '(' and the keyword
+    while tokens[position] != ')':
+        if tokens[position] == '(':
+            depth = 0
+            end = position
+            while True:
+                if tokens[end] == '(':
+                    depth += 1
+                elif tokens[end] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            elements.append(' '.join(tokens[position:end + 1]))
+            position = end + 1
+        else:
+            elements.append(tokens[position])
+            position += 1
+    return sorted(elements), position + 1
+
+
+def canonicalText(text):
+    """Return PDDL text without comments, with single spaces, in lower case
+    (PDDL is case-insensitive) and with the facts of :init in sorted order"""
+    tokens = [token.lower() for token in tokenize(text)]
+    result = []
+    position = 0
+    while position < len(tokens):
+        if tokens[position] == '(' and position + 1 < len(tokens) and tokens[position + 1] == ':init':
+            try:
+                elements, position = _sortedElements(tokens, position)
+            except IndexError: # unbalanced, left to the solver to report
+                result.extend(tokens[position:])
+                break
+            result.append('( :init ' + ' '.join(elements) + ' )')
+            continue
+        result.append(tokens[position])
+        position += 1
+    return ' '.join(result)
+
+
+class PlanCache:
+    """A cache of solver results keyed by the canonical domain and problem.
+
+    The value of an entry is the list of plan steps (as parsed from the
+    solver output), or UNSOLVABLE. Entries are kept in memory with LRU
+    eviction, and also written as JSON into cache_dir when one is given.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, cache_dir=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.raw_keys = OrderedDict() # digest of the exact texts -> key, to skip canonicalization
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+        }
+
+    def key(self, pddl_domain, pddl_problem, variant=''):
+        """The variant identifies the solver configuration (command and
+        arguments), as different configurations may find different plans"""
+        raw = hashlib.sha256('\0'.join((variant, pddl_domain, pddl_problem)).encode('utf-8')).digest()
+        with self.lock:
+            key = self.raw_keys.get(raw)
+            if key is not None:
+                self.raw_keys.move_to_end(raw)
+                return key
+        h = hashlib.sha256()
+        h.update(variant.encode('utf-8'))
+        h.update(b'\0')
+        h.update(canonicalText(pddl_domain).encode('utf-8'))
+        h.update(b'\0')
+        h.update(canonicalText(pddl_problem).encode('utf-8'))
+        key = h.hexdigest()
+        with self.lock:
+            self.raw_keys[raw] = key
+            while len(self.raw_keys) > max(self.maxsize, 1):
+                self.raw_keys.popitem(last=False)
+        return key
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.cache_dir:
+                try:
+                    with open(self.path(key), 'r') as fd:
+                        value = json.load(fd)['result']
+                except (OSError, ValueError, KeyError):
+                    value = None
+                if value is not None:
+                    self.remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def remember(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def put(self, key, value):
+        self.remember(key, value)
+        if self.cache_dir:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as out:
+                json.dump({'result': value}, out)
+            os.replace(tmp_path, self.path(key))
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
@@ -0,0 +1,387 @@
+import sys
+import json
+import argparse
+import numpy as np
+
+from .fastpddl import tokenize
+from .pddlsc import extractTypeParents, isSubtype
+
+
+#
+# Plan validation by simulation on NumPy state vectors.
+#
+# The ground atoms seen so far are numbered, and the state of a plan is a
+# boolean vector over them (one row per plan for a batch), numeric fluents
+# a float vector. Actions are grounded lazily, only for the steps that occur
+# in the plans, into index arrays of positive and negative preconditions,
+# add and delete effects, so that checking and applying a step is a few
+# vectorized gathers and scatters over every plan doing it at that point.
+#
+# Supported: conjunctions of (negated) atoms, equality of terms and numeric
+# comparisons in preconditions and goals; add, delete and increase,
+# decrease, assign, scale-up and scale-down effects.
+
+class UnsupportedFormula(Exception):
+    pass
+
+
+def parseExpr(text):
+    """Return the expression of a toText string as nested lists of lower-case symbols"""
+    stack = [[]]
+    for token in tokenize(str(text)):
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            node = stack.pop()
+            stack[-1].append(node)
+        else:
+            stack[-1].append(token.lower())
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError('Unbalanced expression: {}'.format(text))
+    return stack[0][0]
+
+
+def conjuncts(expr):
+    if type(expr) is list and expr and expr[0] == 'and':
+        result = []
+        for sub in expr[1:]:
+            result.extend(conjuncts(sub))
+        return result
+    return [expr] if expr != [] else []
+
+
+def substitute(expr, binding):
+    if type(expr) is list:
+        return [substitute(sub, binding) for sub in expr]
+    return binding.get(expr, expr)
+
+
+def isNumber(symbol):
+    try:
+        float(symbol)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+COMPARISONS = {
+    '=': np.equal, '<': np.less, '>': np.greater, '<=': np.less_equal, '>=': np.greater_equal,
+}
+ASSIGNMENTS = ('increase', 'decrease', 'assign', 'scale-up', 'scale-down')
+TIMED = (('at', 'start'), ('at', 'end'), ('over', 'all')) # not predicates named at
+ARITHMETIC = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+
+
+class GroundAction:
+    """The compiled step of a plan"""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.pre_pos = []
+        self.pre_neg = []
+        self.pre_num = []   # (comparison, left, right) of numeric expressions
+        self.adds = []
+        self.dels = []
+        self.num_effects = [] # (operation, fluent index, expression)
+        self.error = None   # why the step cannot be applied at all
+
+    def freeze(self):
+        for name in ('pre_pos', 'pre_neg', 'adds', 'dels'):
+            setattr(self, name, np.array(sorted(set(getattr(self, name))), dtype=np.int64))
+
+
+class PlanResult:
+
+    def __init__(self, valid, length, failed_step=None, reason=None):
+        self.valid = valid
+        self.length = length
+        self.failed_step = failed_step
+        self.reason = reason
+
+    def __repr__(self):
+        if self.valid:
+            return 'PlanResult(valid, {} steps)'.format(self.length)
+        return 'PlanResult(invalid at step {}: {})'.format(self.failed_step, self.reason)
+
+
+def planSteps(plan):
+    """The steps of a plan given as prepareActions output or as a list of
+    [action, args...] lists, as tuples of symbols (in their original case)"""
+    if type(plan) is dict:
+        plan = plan['actions']
+    steps = []
+    for step in plan:
+        if type(step) is dict:
+            (name, params), = step.items()
+            steps.append((name,) + tuple(params))
+        else:
+            steps.append(tuple(step))
+    return steps
+
+
+class PlanValidator:
+    """Validate plans of one problem. The domain and problem are jsonized
+    PDDL (parseAsJson output)."""
+
+    def __init__(self, domain, problem):
+        self.atoms = {}       # ground atom (tuple) -> index
+        self.fluents = {}     # ground fluent (tuple) -> index
+        self.grounded = {}    # step (tuple) -> GroundAction
+        self.type_parents = dict((k.lower(), v.lower() if v else v)
+                                 for k, v in extractTypeParents([domain]).items())
+        # the constants of the domain are objects of every problem
+        self.objects = dict((k.lower(), v.lower() if v else v)
+                            for objects in (domain.get('pddl:constants', {}), problem.get('pddl:objects', {}))
+                            for k, v in objects.items())
+        self.schemata = {}
+        for actionlike in domain.get('structure', []):
+            if 'pddl:action' not in actionlike:
+                continue
+            params = [next(iter(param.items())) for param in actionlike['pddl:parameters']]
+            self.schemata[actionlike['pddl:action'].lower()] = (
+                [(name.lower(), typing.lower() if typing else None) for name, typing in params],
+                parseExpr(actionlike['pddl:precondition']) if actionlike.get('pddl:precondition') else [],
+                parseExpr(actionlike['pddl:effect']) if actionlike.get('pddl:effect') else [])
+
+        self.init_atoms = []
+        self.init_fluents = {}
+        for element in problem.get('pddl:init', []):
+            expr = parseExpr(element)
+            if expr and expr[0] == '=' and type(expr[1]) is list:
+                self.init_fluents[self.fluentIndex(expr[1])] = float(expr[2])
+            elif expr and expr[0] != 'not':
+                self.init_atoms.append(self.atomIndex(expr))
+        self.goal = GroundAction('goal', ())
+        try:
+            self.compileCondition(parseExpr(problem['pddl:goal']), self.goal)
+        except UnsupportedFormula as e:
+            self.goal.error = 'unsupported goal formula: {}'.format(e)
+        self.goal.freeze()
+
+    def atomIndex(self, atom):
+        key = tuple(atom)
+        index = self.atoms.get(key)
+        if index is None:
+            index = self.atoms[key] = len(self.atoms)
+        return index
+
+    def fluentIndex(self, term):
+        key = tuple(term)
+        index = self.fluents.get(key)
+        if index is None:
+            index = self.fluents[key] = len(self.fluents)
+        return index
+
+    def numericExpr(self, expr):
+        """Compile into a number, ('f', fluent index) or (op, left, right)"""
+        if type(expr) is not list:
+            if isNumber(expr):
+                return float(expr)
+            raise UnsupportedFormula('Numeric term {}'.format(expr))
+        if expr and expr[0] in ARITHMETIC and len(expr) == 3:
+            return (expr[0], self.numericExpr(expr[1]), self.numericExpr(expr[2]))
+        if expr and expr[0] == '-' and len(expr) == 2:
+            return ('-', 0.0, self.numericExpr(expr[1]))
+        return ('f', self.fluentIndex(expr))
+
+    def compileCondition(self, expr, action):
+        for literal in conjuncts(expr):
+            if type(literal) is not list or not literal:
+                raise UnsupportedFormula('Condition {}'.format(literal))
+            if literal[0] == 'not' and type(literal[1]) is list and literal[1] \
+               and literal[1][0] not in COMPARISONS and literal[1][0] not in ('and', 'or'):
+                action.pre_neg.append(self.atomIndex(literal[1]))
+            elif literal[0] == '=' and all(type(arg) is not list and not isNumber(arg) for arg in literal[1:]):
+                if literal[1] != literal[2]: # equality of objects, known once grounded
+                    action.error = 'equality {} = {} does not hold'.format(literal[1], literal[2])
+            elif literal[0] == 'not' and type(literal[1]) is list and literal[1] and literal[1][0] == '=' \
+                    and all(type(arg) is not list and not isNumber(arg) for arg in literal[1][1:]):
+                if literal[1][1] == literal[1][2]:
+                    action.error = 'inequality {} != {} does not hold'.format(literal[1][1], literal[1][2])
+            elif literal[0] in COMPARISONS:
+                action.pre_num.append((literal[0], self.numericExpr(literal[1]), self.numericExpr(literal[2])))
+            elif literal[0] in ('or', 'not', 'imply', 'exists', 'forall', 'when', 'preference') \
+                    or tuple(literal[:2]) in TIMED:
+                raise UnsupportedFormula('Condition {}'.format(literal[0]))
+            else:
+                action.pre_pos.append(self.atomIndex(literal))
+
+    def compileEffect(self, expr, action):
+        for literal in conjuncts(expr):
+            if type(literal) is not list or not literal:
+                raise UnsupportedFormula('Effect {}'.format(literal))
+            if literal[0] == 'not':
+                action.dels.append(self.atomIndex(literal[1]))
+            elif literal[0] in ASSIGNMENTS:
+                action.num_effects.append((literal[0], self.fluentIndex(literal[1]), self.numericExpr(literal[2])))
+            elif literal[0] in ('forall', 'when') or tuple(literal[:2]) in TIMED:
+                raise UnsupportedFormula('Effect {}'.format(literal[0]))
+            else:
+                action.adds.append(self.atomIndex(literal))
+
+    def ground(self, step):
+        """Return the GroundAction of a step, compiled on first use"""
+        action = self.grounded.get(step)
+        if action is not None:
+            return action
+        action = GroundAction(step[0], step[1:])
+        schema = self.schemata.get(step[0])
+        if schema is None:
+            action.error = 'unknown action {}'.format(step[0])
+        else:
+            params, precondition, effect = schema
+            if len(params) != len(step) - 1:
+                action.error = 'wrong number of arguments for {}'.format(step[0])
+            else:
+                for (name, typing), arg in zip(params, step[1:]):
+                    if arg not in self.objects:
+                        action.error = 'unknown object {}'.format(arg)
+                        break
+                    if typing and typing != 'object' and not typing.startswith('(') \
+                       and not isSubtype(self.objects[arg], typing, self.type_parents):
+                        action.error = 'object {} is not a {}'.format(arg, typing)
+                        break
+                binding = dict((name, arg) for (name, _typing), arg in zip(params, step[1:]))
+                try:
+                    self.compileCondition(substitute(precondition, binding), action)
+                    self.compileEffect(substitute(effect, binding), action)
+                except UnsupportedFormula as e:
+                    # only the plans doing this step are invalid
+                    action.error = 'unsupported formula: {}'.format(e)
+        action.freeze()
+        self.grounded[step] = action
+        return action
+
+    def evalNumeric(self, expr, values):
+        if type(expr) is float:
+            return np.full(values.shape[0], expr)
+        if expr[0] == 'f':
+            return values[:, expr[1]]
+        return ARITHMETIC[expr[0]](self.evalNumeric(expr[1], values), self.evalNumeric(expr[2], values))
+
+    def holds(self, action, states, values):
+        """Vector of the rows whose state satisfies the conditions of an action"""
+        ok = np.ones(states.shape[0], dtype=bool)
+        if len(action.pre_pos):
+            ok &= states[:, action.pre_pos].all(axis=1)
+        if len(action.pre_neg):
+            ok &= ~states[:, action.pre_neg].any(axis=1)
+        for comparison, left, right in action.pre_num:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ok &= COMPARISONS[comparison](self.evalNumeric(left, values), self.evalNumeric(right, values))
+        return ok
+
+    def validate(self, plan):
+        return self.validateBatch([plan])[0]
+
+    def validateBatch(self, plans):
+        """Simulate every plan from the initial state and check the goal;
+        return one PlanResult per plan"""
+        plans = [planSteps(plan) for plan in plans]
+        n = len(plans)
+        lengths = [len(steps) for steps in plans]
+        # the plans as a matrix of ground action ids, -1 past their end
+        actions = []
+        action_ids = {}
+        step_ids = np.full((n, max(lengths, default=0)), -1, dtype=np.int64)
+        for row, steps in enumerate(plans):
+            for t, step in enumerate(steps):
+                action_id = action_ids.get(step)
+                if action_id is None:
+                    action_id = action_ids[step] = len(actions)
+                    ground_step = tuple(str(symbol).lower() for symbol in step)
+                    actions.append((ground_step, self.ground(ground_step)))
+                step_ids[row, t] = action_id
+
+        states = np.zeros((n, len(self.atoms)), dtype=bool)
+        states[:, self.init_atoms] = True
+        values = np.full((n, max(len(self.fluents), 1)), np.nan)
+        for index, value in self.init_fluents.items():
+            values[:, index] = value
+
+        results = [None] * n
+        alive = np.ones(n, dtype=bool)
+        for t in range(step_ids.shape[1]):
+            column = np.where(alive, step_ids[:, t], -1)
+            order = np.argsort(column, kind='stable')
+            ids, starts = np.unique(column[order], return_index=True)
+            bounds = list(starts[1:]) + [n]
+            for action_id, start, end in zip(ids, starts, bounds):
+                if action_id < 0:
+                    continue
+                step, action = actions[action_id]
+                rows = order[start:end]
+                if action.error is not None:
+                    for row in rows:
+                        results[row] = PlanResult(False, lengths[row], t, action.error)
+                    alive[rows] = False
+                    continue
+                ok = self.holds(action, states[rows], values[rows])
+                for row in rows[~ok]:
+                    results[row] = PlanResult(False, lengths[row], t,
+                                              'precondition of ({}) does not hold'.format(' '.join(step)))
+                alive[rows[~ok]] = False
+                rows = rows[ok]
+                if not len(rows):
+                    continue
+                # numeric effects read the values before the step
+                before = values[rows]
+                for operation, fluent, expr in action.num_effects:
+                    operand = self.evalNumeric(expr, before)
+                    current = before[:, fluent]
+                    if operation == 'increase':
+                        values[rows, fluent] = current + operand
+                    elif operation == 'decrease':
+                        values[rows, fluent] = current - operand
+                    elif operation == 'assign':
+                        values[rows, fluent] = operand
+                    elif operation == 'scale-up':
+                        values[rows, fluent] = current * operand
+                    else:
+                        values[rows, fluent] = current / operand
+                if len(action.dels):
+                    states[np.ix_(rows, action.dels)] = False
+                if len(action.adds):
+                    states[np.ix_(rows, action.adds)] = True
+
+        if self.goal.error is not None:
+            reached = np.zeros(n, dtype=bool)
+        else:
+            reached = self.holds(self.goal, states, values)
+        for row in range(n):
+            if results[row] is None:
+                results[row] = PlanResult(bool(reached[row]), lengths[row], None if reached[row] else lengths[row],
+                                          None if reached[row] else self.goal.error or 'goal not reached')
+        return results
+
+
+def main():
+    from .pddl2json import parseAsJson
+    ap = argparse.ArgumentParser(description='Validate plans of a PDDL problem.')
+    ap.add_argument('-d', '--domain_file', required=True,
+                    help='PDDL(S) file for domain')
+    ap.add_argument('-p', '--problem_file', required=True,
+                    help='PDDL(S) file for problem')
+    ap.add_argument('plan_files', nargs='+',
+                    help='plans, as JSON (metricff output) or one action per line')
+    args = ap.parse_args()
+
+    validator = PlanValidator(parseAsJson(args.domain_file), parseAsJson(args.problem_file))
+    plans = []
+    for plan_file in args.plan_files:
+        with open(plan_file, 'r') as fd:
+            text = fd.read()
+        if text.lstrip().startswith('{'):
+            plans.append(json.loads(text))
+        else:
+            plans.append([line.strip('() \t').split() for line in text.splitlines() if line.strip()])
+    invalid = 0
+    for plan_file, result in zip(args.plan_files, validator.validateBatch(plans)):
+        print('{}: {}'.format(plan_file, result))
+        invalid += not result.valid
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
+import yaml
+
+from .metricff import parseSteps, solverCommand
+from .solverpool import SolverPool
+
+
+#
+# Portfolio solving: several Metric-FF configurations race on one problem.
+#
+# A portfolio is declared in a YAML (or JSON) file:
+#
+#   mode: first        # first: the first plan found; best: the shortest
+#   budget: 60         # seconds, after which the remaining runs are killed
+#   configurations:
+#     - name: ehc
+#       args: [-s, '0']
+#     - name: wastar-5
+#       args: [-s, '3', -w, '5']
+#
+# The winners are counted per problem family (by default the domain name of
+# the problem) into a JSON statistics file.
+
+MODES = ('first', 'best')
+
+
+class Configuration:
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = [str(arg) for arg in args]
+
+    def __repr__(self):
+        return 'Configuration({!r}, {!r})'.format(self.name, self.args)
+
+
+class Portfolio:
+
+    def __init__(self, configurations, mode='first', budget=None):
+        if mode not in MODES:
+            raise ValueError('Unknown portfolio mode {}'.format(mode))
+        if not configurations:
+            raise ValueError('Empty portfolio')
+        names = [configuration.name for configuration in configurations]
+        if len(set(names)) != len(names):
+            raise ValueError('Duplicate configuration names in portfolio: {}'.format(names))
+        self.configurations = configurations
+        self.mode = mode
+        self.budget = budget
+
+
+def loadPortfolio(path):
+    with open(path, 'r') as fd:
+        config = yaml.safe_load(fd)
+    configurations = [Configuration(entry['name'], entry.get('args', []))
+                      for entry in config.get('configurations', [])]
+    return Portfolio(configurations, config.get('mode', 'first'), config.get('budget'))
+
+
+def problemFamily(pddl_problem):
+    """The domain name of a problem"""
+    match = re.search(r'\(\s*:domain\s+([^\s()]+)', pddl_problem, re.IGNORECASE)
+    return match.group(1).lower() if match else 'unknown'
+
+
+class PortfolioResult:
+
+    def __init__(self, winner, steps, elapsed, runs):
+        self.winner = winner    # name of the winning configuration, or None
+        self.steps = steps      # its plan steps
+        self.elapsed = elapsed
+        self.runs = runs        # name -> SolverResult of every finished run
+
+
+def solvePortfolio(portfolio, pddl_domain, pddl_problem, pool=None, solver=None):
+    """Run every configuration of a portfolio on a problem. In 'first' mode
+    the first valid plan wins and the other runs are cancelled; in 'best'
+    mode the shortest plan found within the budget wins. Runs still going
+    when the budget expires are killed."""
+    own_pool = pool is None
+    if own_pool:
+        pool = SolverPool(solverCommand(solver), max_workers=len(portfolio.configurations))
+    start = time.time()
+    # futures -> (configuration, job); the job is needed to cancel running solvers
+    jobs = {}
+    for configuration in portfolio.configurations:
+        job = pool.submit(pddl_domain, pddl_problem, configuration.args)
+        jobs[job.future] = (configuration, job)
+
+    winner = None
+    best_steps = None
+    runs = {}
+    pending = set(jobs)
+    try:
+        while pending:
+            remaining = None
+            if portfolio.budget is not None:
+                remaining = portfolio.budget - (time.time() - start)
+                if remaining <= 0:
+                    break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                configuration, job = jobs[future]
+                result = job.result()
+                runs[configuration.name] = result
+                steps = parseSteps(result.output) if not (result.cancelled or result.timed_out) else None
+                if steps is None:
+                    continue
+                if best_steps is None or len(steps) < len(best_steps):
+                    winner, best_steps = configuration.name, steps
+            if winner is not None and portfolio.mode == 'first':
+                break
+    finally:
+        for future in pending:
+            jobs[future][1].cancel()
+        if own_pool:
+            pool.shutdown()
+    return PortfolioResult(winner, best_steps, time.time() - start, runs)
+
+
+class PortfolioStats:
+    """Wins (and their solving time) of each configuration per problem family"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.families = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r') as fd:
+                self.families = json.load(fd)
+
+    def record(self, family, result):
+        with self.lock:
+            entry = self.families.setdefault(family, {'problems': 0, 'unsolved': 0, 'wins': {}})
+            entry['problems'] += 1
+            if result.winner is None:
+                entry['unsolved'] += 1
+                return
+            wins = entry['wins'].setdefault(result.winner, {'count': 0, 'seconds': 0.0})
+            wins['count'] += 1
+            wins['seconds'] += result.runs[result.winner].elapsed
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as out:
+                json.dump(self.families, out, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def report(self, out=sys.stdout):
+        for family, entry in sorted(self.families.items()):
+            print('{}: {} problem(s), {} unsolved'.format(family, entry['problems'], entry['unsolved']), file=out)
+            for name, wins in sorted(entry['wins'].items(), key=lambda item: -item[1]['count']):
+                print('    {}: {} win(s), {:.3f}s average'.format(
+                    name, wins['count'], wins['seconds'] / wins['count']), file=out)
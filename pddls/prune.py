@@ -0,0 +1,339 @@
+import sys
+import argparse
+from collections import OrderedDict
+
+from .pddlsc import extractTypeParents, isSubtype
+from .planval import parseExpr, conjuncts, substitute, isNumber, COMPARISONS, ASSIGNMENTS, TIMED
+
+
+#
+# Relevance pruning of a problem before solving.
+#
+# A relaxed reachability analysis (ignoring delete effects, negative and
+# numeric preconditions) grounds the actions that may ever be applicable
+# from the init, then a backward pass from the goal keeps the ground
+# actions that achieve something relevant, making their preconditions
+# relevant in turn. Init facts that are not relevant, objects no longer
+# mentioned and action schemata without a relevant grounding are removed.
+#
+# Domains with derived predicates or with conditions and effects beyond
+# conjunctions of literals (or, forall, when, ...) are left unpruned.
+
+class UnsupportedDomain(Exception):
+    pass
+
+
+class Schema:
+
+    def __init__(self, name, params, precondition, effect):
+        self.name = name
+        self.params = params    # [(variable, type)]
+        self.pos = []           # positive atom preconditions
+        self.neg = []           # negative atom preconditions
+        self.numeric = []       # numeric preconditions
+        self.equalities = []    # (equal?, term, term)
+        for literal in conjuncts(precondition):
+            if type(literal) is not list or not literal:
+                raise UnsupportedDomain('condition {}'.format(literal))
+            if literal[0] == 'not' and type(literal[1]) is list and literal[1] and literal[1][0] == '=' \
+               and all(type(arg) is not list for arg in literal[1][1:]) and not any(isNumber(a) for a in literal[1][1:]):
+                self.equalities.append((False, literal[1][1], literal[1][2]))
+            elif literal[0] == '=' and all(type(arg) is not list and not isNumber(arg) for arg in literal[1:]):
+                self.equalities.append((True, literal[1], literal[2]))
+            elif literal[0] in COMPARISONS:
+                self.numeric.append(literal)
+            elif literal[0] == 'not' and type(literal[1]) is list and literal[1] \
+                    and literal[1][0] not in ('and', 'or', 'not', 'exists', 'forall', 'imply'):
+                self.neg.append(literal[1])
+            elif literal[0] in ('or', 'not', 'imply', 'exists', 'forall', 'when', 'preference') \
+                    or tuple(literal[:2]) in TIMED:
+                raise UnsupportedDomain('condition {}'.format(literal[0]))
+            else:
+                self.pos.append(literal)
+        self.adds = []
+        self.dels = []
+        self.numeric_effects = [] # (operation, fluent, expression)
+        for literal in conjuncts(effect):
+            if type(literal) is not list or not literal:
+                raise UnsupportedDomain('effect {}'.format(literal))
+            if literal[0] == 'not':
+                self.dels.append(literal[1])
+            elif literal[0] in ASSIGNMENTS:
+                self.numeric_effects.append(literal)
+            elif literal[0] in ('forall', 'when') or tuple(literal[:2]) in TIMED:
+                raise UnsupportedDomain('effect {}'.format(literal[0]))
+            else:
+                self.adds.append(literal)
+
+
+def fluentTerms(expr):
+    """The fluents (function terms) of a numeric expression"""
+    if type(expr) is not list or not expr:
+        return []
+    if expr[0] in COMPARISONS or expr[0] in ('+', '-', '*', '/') or expr[0] in ASSIGNMENTS:
+        result = []
+        for sub in expr[1:]:
+            result.extend(fluentTerms(sub))
+        return result
+    return [tuple(expr)]
+
+
+def goalAtoms(expr, atoms, fluents):
+    """Collect the atoms and fluents of a goal, whatever their polarity"""
+    if type(expr) is not list or not expr:
+        return
+    if expr[0] in ('and', 'or', 'not', 'imply'):
+        for sub in expr[1:]:
+            goalAtoms(sub, atoms, fluents)
+    elif expr[0] in ('exists', 'forall'):
+        raise UnsupportedDomain('quantified goal')
+    elif expr[0] in COMPARISONS and any(type(arg) is list for arg in expr[1:]):
+        fluents.update(fluentTerms(expr))
+    else:
+        atoms.add(tuple(expr))
+
+
+class GroundAction:
+
+    def __init__(self, schema, args, binding):
+        self.schema = schema
+        self.args = args
+        self.pos = [tuple(substitute(atom, binding)) for atom in schema.pos]
+        self.neg = [tuple(substitute(atom, binding)) for atom in schema.neg]
+        self.adds = [tuple(substitute(atom, binding)) for atom in schema.adds]
+        self.dels = [tuple(substitute(atom, binding)) for atom in schema.dels]
+        self.condition_fluents = set()
+        for literal in schema.numeric:
+            self.condition_fluents.update(fluentTerms(substitute(literal, binding)))
+        self.effect_fluents = set()
+        self.effect_reads = set()
+        for operation, fluent, expr in schema.numeric_effects:
+            self.effect_fluents.add(tuple(substitute(fluent, binding)))
+            self.effect_reads.update(fluentTerms(substitute(expr, binding)))
+
+
+class RelevanceAnalysis:
+    """Reachability and relevance of a problem (jsonized PDDL) of a domain"""
+
+    def __init__(self, domain, problem):
+        self.domain = domain
+        self.problem = problem
+        for actionlike in domain.get('structure', []):
+            if 'pddl:action' not in actionlike:
+                raise UnsupportedDomain('{} in structure'.format(next(iter(actionlike), None)))
+        self.schemata = []
+        for actionlike in domain.get('structure', []):
+            params = [next(iter(param.items())) for param in actionlike['pddl:parameters']]
+            self.schemata.append(Schema(
+                actionlike['pddl:action'],
+                [(name.lower(), typing.lower() if typing else None) for name, typing in params],
+                parseExpr(actionlike['pddl:precondition']) if actionlike.get('pddl:precondition') else [],
+                parseExpr(actionlike['pddl:effect']) if actionlike.get('pddl:effect') else []))
+
+        self.type_parents = dict((k.lower(), v.lower() if v else v)
+                                 for k, v in extractTypeParents([domain]).items())
+        # the constants of the domain are objects of every problem
+        self.objects = OrderedDict((name.lower(), typing.lower() if typing else None)
+                                   for objects in (domain.get('pddl:constants', {}), problem.get('pddl:objects', {}))
+                                   for name, typing in objects.items())
+
+        # every init element, with its atom for plain atoms
+        self.init = []
+        for element in problem.get('pddl:init', []):
+            text = str(element)
+            expr = parseExpr(text)
+            atom = tuple(expr) if expr and expr[0] not in ('=', 'not') and \
+                all(type(arg) is not list for arg in expr) else None
+            self.init.append((text, expr, atom))
+        self.goal = parseExpr(str(problem['pddl:goal']))
+
+    def objectsOfType(self, typing):
+        if typing is None or typing == 'object' or typing.startswith('('):
+            return list(self.objects)
+        return [name for name, declared in self.objects.items()
+                if isSubtype(declared, typing, self.type_parents)]
+
+    def bindings(self, schema, facts, index):
+        """Yield the bindings of a schema whose positive preconditions hold
+        in facts (a set of atoms) and whose parameters have the right types"""
+        params = [name for name, _typing in schema.params]
+        domains = dict((name, set(self.objectsOfType(typing))) for name, typing in schema.params)
+        atoms = list(schema.pos)
+
+        def lookup(atom, binding):
+            bound = tuple(i for i, term in enumerate(atom[1:]) if term in binding or not term.startswith('?'))
+            key = (atom[0], len(atom) - 1, bound)
+            table = index.get(key)
+            if table is None:
+                table = index[key] = {}
+                for fact in facts:
+                    if fact[0] == atom[0] and len(fact) == len(atom):
+                        table.setdefault(tuple(fact[1 + i] for i in bound), []).append(fact)
+            return table.get(tuple(binding.get(atom[1 + i], atom[1 + i]) for i in bound), ())
+
+        def extend(remaining, binding):
+            if not remaining:
+                free = [name for name in params if name not in binding]
+                yield from assign(free, binding)
+                return
+            # the atom with the most bound terms first
+            best = max(range(len(remaining)),
+                       key=lambda i: sum(1 for term in remaining[i][1:] if term in binding or not term.startswith('?')))
+            atom = remaining[best]
+            rest = remaining[:best] + remaining[best + 1:]
+            for fact in lookup(atom, binding):
+                new = dict(binding)
+                ok = True
+                for term, value in zip(atom[1:], fact[1:]):
+                    if term.startswith('?'):
+                        if new.setdefault(term, value) != value or (term in domains and value not in domains[term]):
+                            ok = False
+                            break
+                    elif term != value:
+                        ok = False
+                        break
+                if ok:
+                    yield from extend(rest, new)
+
+        def assign(free, binding):
+            if not free:
+                if all((binding.get(a, a) == binding.get(b, b)) == equal for equal, a, b in schema.equalities):
+                    yield binding
+                return
+            for value in sorted(domains[free[0]]):
+                new = dict(binding)
+                new[free[0]] = value
+                yield from assign(free[1:], new)
+
+        yield from extend(atoms, {})
+
+    def reachable(self):
+        """Return the relaxed reachable facts and ground actions"""
+        facts = set(atom for _text, _expr, atom in self.init if atom is not None)
+        actions = {}
+        while True:
+            index = {}
+            new_facts = set()
+            for schema in self.schemata:
+                for binding in self.bindings(schema, facts, index):
+                    args = tuple(binding[name] for name, _typing in schema.params)
+                    if (schema.name, args) in actions:
+                        continue
+                    action = actions[(schema.name, args)] = GroundAction(schema, args, binding)
+                    new_facts.update(atom for atom in action.adds if atom not in facts)
+            if not new_facts:
+                return facts, list(actions.values())
+            facts |= new_facts
+
+    def relevant(self, actions):
+        """Return the relevant atoms, fluents and ground actions"""
+        atoms = set()
+        fluents = set()
+        goalAtoms(self.goal, atoms, fluents)
+        relevant_actions = []
+        remaining = list(actions)
+        changed = True
+        while changed:
+            changed = False
+            rest = []
+            for action in remaining:
+                if any(atom in atoms for atom in action.adds) \
+                   or any(atom in atoms for atom in action.dels) \
+                   or any(fluent in fluents for fluent in action.effect_fluents):
+                    relevant_actions.append(action)
+                    atoms.update(action.pos)
+                    atoms.update(action.neg)
+                    fluents.update(action.condition_fluents)
+                    fluents.update(action.effect_reads)
+                    changed = True
+                else:
+                    rest.append(action)
+            remaining = rest
+        return atoms, fluents, relevant_actions
+
+
+def symbols(expr):
+    if type(expr) is list:
+        for sub in expr:
+            yield from symbols(sub)
+    else:
+        yield expr
+
+
+def prune(domain, problem, out=sys.stderr):
+    """Return the (domain, problem) pruned of unreachable or irrelevant
+    objects, init facts and actions, and print a report"""
+    try:
+        analysis = RelevanceAnalysis(domain, problem)
+        _facts, actions = analysis.reachable()
+        atoms, fluents, relevant_actions = analysis.relevant(actions)
+    except UnsupportedDomain as e:
+        print('Not pruned: unsupported {}'.format(e), file=out)
+        return domain, problem
+
+    init = []
+    for text, expr, atom in analysis.init:
+        if atom is not None:
+            if atom in atoms:
+                init.append(text)
+        elif expr and expr[0] == '=' and type(expr[1]) is list:
+            if tuple(expr[1]) in fluents:
+                init.append(text)
+        else:
+            init.append(text) # other elements are kept as they are
+
+    used = set(symbols(analysis.goal))
+    for text in init:
+        used.update(symbols(parseExpr(text)))
+    for action in relevant_actions:
+        used.update(action.args)
+    objects = OrderedDict((name, typing) for name, typing in problem.get('pddl:objects', {}).items()
+                          if name.lower() in used)
+
+    schemata = set(action.schema.name for action in relevant_actions)
+    structure = [actionlike for actionlike in domain.get('structure', [])
+                 if actionlike['pddl:action'] in schemata]
+
+    result_problem = OrderedDict(problem)
+    result_problem['pddl:objects'] = objects
+    result_problem['pddl:init'] = init
+    result_domain = OrderedDict(domain)
+    if 'structure' in domain:
+        result_domain['structure'] = structure
+
+    print('Pruned objects: {} -> {}'.format(len(problem.get('pddl:objects', {})), len(objects)), file=out)
+    print('Pruned init facts: {} -> {}'.format(len(analysis.init), len(init)), file=out)
+    print('Pruned actions: {} -> {} schemata, {} reachable -> {} relevant ground actions'.format(
+        len(domain.get('structure', [])), len(structure), len(actions), len(relevant_actions)), file=out)
+    return result_domain, result_problem
+
+
+def pruneProblem(problem, domains, out=sys.stderr):
+    """Prune a (translated) problem against the domain it names among domains"""
+    name = str(problem.get('pddl:problem_domain', '')).lower()
+    domain = next((domain for domain in domains if str(domain.get('domain', '')).lower() == name), domains[0])
+    return prune(domain, problem, out)
+
+
+def main():
+    from .pddl2json import parseAsJson
+    from .json2pddl import printPDDL
+    ap = argparse.ArgumentParser(description='Prune a PDDL problem of what cannot affect its goal.')
+    ap.add_argument('-d', '--domain_file', required=True,
+                    help='PDDL(S) file for domain')
+    ap.add_argument('-p', '--problem_file', required=True,
+                    help='PDDL(S) file for problem')
+    ap.add_argument('-o', '--output_file', type=argparse.FileType('w'), default=sys.stdout,
+                    help='Output problem PDDL file')
+    ap.add_argument('--domain_output', type=argparse.FileType('w'), default=None,
+                    help='Output domain PDDL file, without the irrelevant actions')
+    args = ap.parse_args()
+
+    domain, problem = prune(parseAsJson(args.domain_file), parseAsJson(args.problem_file))
+    printPDDL(problem, args.output_file)
+    if args.domain_output:
+        printPDDL(domain, args.domain_output)
+
+
+if __name__ == '__main__':
+    main()
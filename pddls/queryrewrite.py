@@ -0,0 +1,47 @@
+from rdflib.plugins.sparql.sparql import Query
+from rdflib.plugins.sparql.algebra import Join, ToMultiSet, Values
+
+
+#
+# Rewriting of prepared SPARQL queries (rdflib algebra)
+
+# Solution modifiers that may sit between a SELECT and its projection
+_MODIFIERS = ('Slice', 'Distinct', 'Reduced', 'OrderBy')
+
+# Graph patterns whose solutions can be restricted before projection.
+# Anything else (aggregates in particular) is left alone.
+_RESTRICTABLE = ('BGP', 'Join', 'LeftJoin', 'Filter', 'Extend', 'Union', 'Minus',
+                 'ToMultiSet', 'Graph')
+
+
+def projectedVariables(query):
+    return list(query.algebra.get('PV') or [])
+
+
+def bindValues(query, variable, values):
+    """Return a copy of a prepared SELECT query restricted by an inline
+    VALUES ?variable { values } block, or None when it cannot be restricted.
+
+    The block is lazily joined in front of the graph pattern, so that the
+    pattern is evaluated with the variable already bound to each value.
+    """
+    algebra = query.algebra
+    if algebra.name != 'SelectQuery':
+        return None
+    root = algebra.clone()
+    node = root
+    while node.p.name in _MODIFIERS:
+        node['p'] = node.p.clone()
+        node = node.p
+    if node.p.name != 'Project' or node.p.p.name not in _RESTRICTABLE:
+        return None
+    project = node['p'] = node.p.clone()
+
+    join = Join(ToMultiSet(Values([{ variable: value } for value in values])), project.p)
+    join['lazy'] = True
+    project['p'] = join
+
+    bound = Query(query.prologue, root)
+    if hasattr(query, '_original_args'):
+        bound._original_args = query._original_args
+    return bound
@@ -0,0 +1,67 @@
+import sys
+import functools
+from rdflib import URIRef, Literal
+from rdflib.plugins.sparql import prepareQuery
+
+from .queryrewrite import projectedVariables
+
+
+ESTABLISHED_WITH = URIRef(u'uri:pddls#establishedWith')
+
+# Prepared queries kept by formula text, shared by every catalog of the
+# process; bounded, as edited formulas keep coming in watch and daemon modes
+PREPARED_MAXSIZE = 1024
+
+
+@functools.lru_cache(maxsize=PREPARED_MAXSIZE)
+def preparedQuery(formula):
+    """Return the prepared (parsed and translated) query of a SPARQL formula"""
+    return prepareQuery(formula)
+
+
+class Rule:
+    """A compiled establishedWith formula of a predicate"""
+
+    def __init__(self, predicate, formula, query):
+        self.predicate = predicate
+        self.formula = formula
+        self.query = query
+        self.variables = projectedVariables(query)
+
+
+class RuleCatalog:
+    """The establishedWith formulas of an ontology, collected and compiled once.
+
+    Formulas that cannot be used (graph formulas, languages other than
+    sparql, SPARQL syntax errors) are recorded in unsupported as
+    (predicate, reason) pairs instead of being skipped silently.
+    """
+
+    def __init__(self, ontology):
+        self.rules = {}
+        self.unsupported = []
+        for predicate, f in ontology.subject_objects(ESTABLISHED_WITH):
+            if type(f) is Literal and f.language == 'sparql':
+                if predicate in self.rules:
+                    self.unsupported.append((predicate, 'more than one SPARQL formula, using the first'))
+                    continue
+                try:
+                    self.rules[predicate] = Rule(predicate, str(f), preparedQuery(str(f)))
+                except Exception as e:
+                    self.unsupported.append((predicate, 'SPARQL syntax error: {}'.format(e)))
+            elif type(f) is URIRef:
+                self.unsupported.append((predicate, 'graph formula {}'.format(f)))
+            else:
+                language = f.language if type(f) is Literal else None
+                self.unsupported.append((predicate, 'formula with language {}'.format(language)))
+
+    def rule(self, predicateURI):
+        return self.rules.get(URIRef(predicateURI))
+
+    def report(self, predicateURIs=None, out=sys.stdout):
+        """Print the unsupported formulas (of the given predicates only)"""
+        if predicateURIs is not None:
+            predicateURIs = set(URIRef(uri) for uri in predicateURIs)
+        for predicate, reason in self.unsupported:
+            if predicateURIs is None or predicate in predicateURIs:
+                print("Unsupported formula of {}: {}".format(predicate, reason), file=out)
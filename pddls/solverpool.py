@@ -0,0 +1,237 @@
+import os
+import time
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+
+#
+# A bounded pool of planner subprocesses.
+#
+# Every job hands its domain and problem over as files that never touch the
+# disk: memfd files passed to the solver as /proc/self/fd/N where available,
+# otherwise a private directory on /dev/shm (or the default temporary
+# directory), removed when the job ends. A job has a wall-clock timeout and
+# an address space limit, and running jobs can be cancelled; the solver is
+# started in a session of its own so that the whole process group is killed.
+
+SHM_DIR = '/dev/shm'
+
+
+class SolverResult:
+    """The outcome of one solver run"""
+
+    def __init__(self, command, returncode, output, errors, elapsed, timed_out=False, cancelled=False):
+        self.command = command
+        self.returncode = returncode
+        self.output = output
+        self.errors = errors
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    def __repr__(self):
+        return 'SolverResult(returncode={}, elapsed={:.3f}, timed_out={}, cancelled={})'.format(
+            self.returncode, self.elapsed, self.timed_out, self.cancelled)
+
+
+def _memfdPaths(texts):
+    fds = []
+    try:
+        for name, text in texts:
+            fd = os.memfd_create(name, 0) # inheritable by pass_fds, closed on exit
+            fds.append(fd)
+            _writeAll(fd, text.encode('utf-8'))
+        return fds, ['/proc/self/fd/{}'.format(fd) for fd in fds]
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+
+def _writeAll(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+@contextmanager
+def handoffFiles(texts, use_memfd=True):
+    """Yield (fds to pass, paths) of files holding the given (name, text)
+    pairs, and remove them afterwards"""
+    if use_memfd and hasattr(os, 'memfd_create') and os.path.isdir('/proc/self/fd'):
+        fds, paths = _memfdPaths(texts)
+        try:
+            yield fds, paths
+        finally:
+            for fd in fds:
+                os.close(fd)
+        return
+    tmpdir = tempfile.mkdtemp(prefix='pddls-', dir=SHM_DIR if os.path.isdir(SHM_DIR) else None)
+    try:
+        paths = []
+        for name, text in texts:
+            path = os.path.join(tmpdir, name)
+            with open(path, 'w') as fd:
+                fd.write(text)
+            paths.append(path)
+        yield (), paths
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _limitedCommand(command, memory_mb):
+    """The command run under an address space limit. The limit is set by a
+    shell that then execs the solver, as a preexec_fn is not safe in the
+    threads of the pool."""
+    if not memory_mb or resource is None:
+        return command
+    return ['/bin/sh', '-c', 'ulimit -v {} && exec "$@"'.format(memory_mb * 1024), 'sh'] + command
+
+
+def _killGroup(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+
+
+class SolverJob:
+    """A submitted solver run; cancel() stops it whether queued or running"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.future = None
+        self.process = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.future is not None and self.future.cancel():
+                return True
+            if self.process is not None and self.process.poll() is None:
+                _killGroup(self.process)
+        return True
+
+    def result(self, timeout=None):
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            return SolverResult(None, None, '', '', 0.0, cancelled=True)
+
+    def done(self):
+        return self.future.done()
+
+
+class SolverPool:
+    """Run at most max_workers solver subprocesses at a time.
+
+    The command of a job is built from the command template, a list where
+    '{domain}' and '{problem}' stand for the paths of the handed-over files,
+    followed by the job's extra arguments. The solver runs in env, or in the
+    environment of this process by default.
+    """
+
+    def __init__(self, command, max_workers=None, timeout=None, memory_mb=None, use_memfd=True, env=None):
+        self.command = list(command)
+        self.env = env
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.use_memfd = use_memfd
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.jobs = set()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, pddl_domain, pddl_problem, args=(), timeout=None, memory_mb=None, on_output=None):
+        """Queue a run and return its SolverJob. When on_output is given,
+        it is called with the solver's stdout (a text stream) and its return
+        value becomes the output of the result, e.g. to parse it as it comes."""
+        job = SolverJob(self)
+        with self.lock:
+            self.jobs.add(job)
+        timeout = self.timeout if timeout is None else timeout
+        memory_mb = self.memory_mb if memory_mb is None else memory_mb
+        job.future = self.executor.submit(self.run, job, pddl_domain, pddl_problem, list(args),
+                                          timeout, memory_mb, on_output)
+        job.future.add_done_callback(lambda _future: self._forget(job))
+        return job
+
+    def solve(self, pddl_domain, pddl_problem, args=(), timeout=None, memory_mb=None, on_output=None):
+        return self.submit(pddl_domain, pddl_problem, args, timeout, memory_mb, on_output).result()
+
+    def _forget(self, job):
+        with self.lock:
+            self.jobs.discard(job)
+
+    def run(self, job, pddl_domain, pddl_problem, args, timeout, memory_mb, on_output=None):
+        with handoffFiles([('domain.pddl', pddl_domain), ('problem.pddl', pddl_problem)],
+                          self.use_memfd) as (fds, (domain_file, problem_file)):
+            command = [part.format(domain=domain_file, problem=problem_file) for part in self.command] + args
+            start = time.time()
+            with job.lock:
+                if job.cancelled:
+                    return SolverResult(command, None, '', '', 0.0, cancelled=True)
+                job.process = subprocess.Popen(
+                    _limitedCommand(command, memory_mb), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True, pass_fds=fds, start_new_session=True, env=self.env)
+            process = job.process
+            timer = None
+            timed_out = threading.Event()
+            if timeout:
+                def expire():
+                    timed_out.set()
+                    _killGroup(process)
+                timer = threading.Timer(timeout, expire)
+                timer.daemon = True
+                timer.start()
+            try:
+                if on_output is not None:
+                    stderr_lines = []
+                    reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+                    reader.start()
+                    output = on_output(process.stdout)
+                    if process.poll() is None:
+                        _killGroup(process) # the consumer stopped early
+                    process.wait()
+                    reader.join()
+                    errors = ''.join(stderr_lines)
+                else:
+                    output, errors = process.communicate()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if process.poll() is None:
+                    _killGroup(process)
+                    process.wait()
+            return SolverResult(command, process.returncode, output, errors, time.time() - start,
+                                timed_out=timed_out.is_set(), cancelled=job.cancelled)
+
+    def cancelAll(self):
+        with self.lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            self.cancelAll()
+        self.executor.shutdown(wait=True)
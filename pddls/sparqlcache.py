@@ -0,0 +1,107 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAXSIZE = 256
+
+
+class QueryCache:
+    """A cache of SPARQL query results keyed by (formula, ontology fingerprint).
+
+    Results are kept in memory with LRU eviction, and also pickled into
+    cache_dir when one is given so that they survive across processes.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, cache_dir=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+        }
+
+    def key(self, formula, fingerprint):
+        h = hashlib.sha256()
+        h.update(fingerprint.encode('utf-8'))
+        h.update(b'\0')
+        h.update(formula.encode('utf-8'))
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.cache_dir:
+            try:
+                with open(self.path(key), 'rb') as fd:
+                    rows = pickle.load(fd)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                rows = None
+            if rows is not None:
+                self.remember(key, rows)
+                self.hits += 1
+                self.disk_hits += 1
+                return rows
+        self.misses += 1
+        return None
+
+    def remember(self, key, rows):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = rows
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def put(self, key, rows):
+        self.remember(key, rows)
+        if self.cache_dir:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as out:
+                pickle.dump(rows, out, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path(key))
+
+    def query(self, ontology, formula, fingerprint, query=None):
+        """Return the result rows (tuples of terms) of a SPARQL formula.
+        A prepared query, if given, is evaluated in place of the formula
+        text, which then only has to identify it.
+        """
+        key = self.key(formula, fingerprint)
+        rows = self.get(key)
+        if rows is None:
+            rows = [tuple(row) for row in ontology.query(query if query is not None else formula)]
+            self.put(key, rows)
+        return rows
@@ -0,0 +1,87 @@
+import sys
+import time
+import argparse
+
+from .fastpddl import tokenize
+
+
+#
+# A stand-in for Metric-FF that prints its output format without searching:
+# the plan is read from --plan (one action per line), or is one ACHIEVE step
+# per atom of the goal. It can also sleep or allocate memory first, to
+# exercise the timeouts and memory limits of the solver pool:
+#
+#   PDDLS_METRICFF="python3 -m pddls.stubff --sleep 2" python3 -m pddls.metricff -o ... -f ...
+
+def goalAtoms(problem_text):
+    tokens = tokenize(problem_text)
+    for i in range(len(tokens) - 1):
+        if tokens[i] == '(' and tokens[i + 1].lower() == ':goal':
+            break
+    else:
+        return []
+    atoms = []
+    depth = 0
+    atom = None
+    for token in tokens[i + 2:]:
+        if token == '(':
+            depth += 1
+            atom = []
+        elif token == ')':
+            if atom:
+                atoms.append(atom)
+            atom = None
+            depth -= 1
+            if depth < 0:
+                break
+        elif atom is not None:
+            atom.append(token)
+    return [atom for atom in atoms if atom[0].lower() not in ('and', 'not', '=')]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Stub Metric-FF solver.')
+    ap.add_argument('-o', dest='domain_file', required=True)
+    ap.add_argument('-f', dest='problem_file', required=True)
+    ap.add_argument('-s', dest='search', default='0')
+    ap.add_argument('-w', dest='weight', default=None)
+    ap.add_argument('--plan', type=str, default=None,
+                    help='file with the actions of the plan, one per line')
+    ap.add_argument('--sleep', type=float, default=0.0,
+                    help='seconds to wait before answering')
+    ap.add_argument('--alloc_mb', type=int, default=0,
+                    help='megabytes to allocate before answering')
+    ap.add_argument('--unsolvable', action='store_true', default=False,
+                    help='report the problem as unsolvable')
+    args = ap.parse_args(argv)
+
+    with open(args.domain_file) as fd:
+        fd.read()
+    with open(args.problem_file) as fd:
+        problem_text = fd.read()
+    ballast = bytearray(args.alloc_mb * 1024 * 1024)
+    if args.sleep:
+        time.sleep(args.sleep)
+
+    print('\nff: parsing domain file\nff: parsing problem file\n')
+    if args.unsolvable:
+        print('best first search space empty! problem proven unsolvable.\n')
+        return 1
+    if args.plan:
+        with open(args.plan) as fd:
+            steps = [line.split() for line in fd if line.strip()]
+    else:
+        steps = [['ACHIEVE'] + atom for atom in goalAtoms(problem_text)]
+    print('Cueing down from goal distance: {:4d} into depth [1]'.format(len(steps)))
+    print('ff: found legal plan as follows\n')
+    for i, step in enumerate(steps):
+        print('{}{:4d}: {}'.format('step' if i == 0 else '    ', i, ' '.join(step).upper()))
+    print('\n')
+    print('time spent:    0.00 seconds searching, evaluating {} states, to a max depth of 1'.format(len(steps) + 1))
+    print('               0.00 seconds total time')
+    del ballast
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+import os
+import sys
+import time
+import hashlib
+import rdflib
+from rdflib import URIRef, BNode
+from rdflib.compare import to_canonical_graph
+from rdflib.paths import Path, NegatedPath
+from rdflib.plugins.sparql.parserutils import CompValue
+
+from .pddl2json import parseAsJson
+from .json2pddl import serializePDDL
+from .ontoview import unionView
+from .rulecatalog import preparedQuery
+from .pddlsc import (extractObjectURIs, extractPredicateURIs, extractTypeParents,
+                     parameterObjectURIs, sparqlFormula, resolvePredicateAxioms,
+                     uriRefs2Symbols, composeResult, loadProblem)
+
+
+#
+# Watch mode: recompile a problem incrementally when ontology files change.
+#
+# Each ontology file keeps its own graph, queried through a union view. A
+# modified file is reparsed and only the triple diff is applied to its graph
+# (blank nodes are labelled canonically, see parseGraph).
+# A predicate is re-resolved when a changed triple is about the predicate
+# itself (e.g. its establishedWith formula) or uses a property that a triple
+# pattern of its formula can match; formulas with variable properties are
+# re-resolved on every change.
+
+def patternProperties(node, properties):
+    """Collect the properties of the triple patterns under an algebra node.
+    Return False if some pattern has a variable property."""
+    if isinstance(node, CompValue) or isinstance(node, dict):
+        for key, value in node.items():
+            if key == 'triples':
+                for _s, p, _o in value:
+                    if isinstance(p, URIRef):
+                        properties.add(p)
+                    elif isinstance(p, Path):
+                        if not pathProperties(p, properties):
+                            return False
+                    else:
+                        return False
+            elif not patternProperties(value, properties):
+                return False
+    elif isinstance(node, (list, tuple)):
+        for value in node:
+            if not patternProperties(value, properties):
+                return False
+    return True
+
+
+def pathProperties(path, properties):
+    if isinstance(path, NegatedPath):
+        return False # matches any other property
+    for attr in ('args', 'path', 'arg'):
+        value = getattr(path, attr, None)
+        if value is None:
+            continue
+        for part in (value if isinstance(value, (list, tuple)) else [value]):
+            if isinstance(part, URIRef):
+                properties.add(part)
+            elif isinstance(part, Path):
+                if not pathProperties(part, properties):
+                    return False
+            else:
+                return False
+    return True
+
+
+def formulaProperties(formula):
+    """Return the set of properties a formula's patterns can match,
+    or None when any triple may affect its results"""
+    if formula is None:
+        return set()
+    properties = set()
+    try:
+        algebra = preparedQuery(formula).algebra
+    except Exception:
+        return None
+    return properties if patternProperties(algebra, properties) else None
+
+
+def fileState(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def blankComponents(triples):
+    """Group the triples with blank nodes by connected blank nodes"""
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for triple in triples:
+        nodes = [term for term in triple if isinstance(term, BNode)]
+        for node in nodes[1:]:
+            parent[find(node)] = find(nodes[0])
+    components = {}
+    for triple in triples:
+        root = find(next(term for term in triple if isinstance(term, BNode)))
+        components.setdefault(root, []).append(triple)
+    return components.values()
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def refinedLabels(component):
+    """Label the blank nodes of a group by their surroundings, refined until
+    stable (as rdflib.compare does); None when some nodes stay alike"""
+    nodes = set(term for triple in component for term in triple if isinstance(term, BNode))
+    labels = dict((node, '') for node in nodes)
+    edges = dict((node, []) for node in nodes)
+    for s, p, o in component:
+        if isinstance(s, BNode):
+            edges[s].append(('>', p, o))
+        if isinstance(o, BNode):
+            edges[o].append(('<', p, s))
+    classes = 1
+    while True:
+        labels = dict((node, _digest(' '.join(sorted(
+            '{}{}{}'.format(way, p, labels[other] if isinstance(other, BNode) else other.n3())
+            for way, p, other in edges[node])))) for node in nodes)
+        refined = len(set(labels.values()))
+        if refined == len(nodes):
+            return labels
+        if refined == classes:
+            return None
+        classes = refined
+
+
+def canonicalTriples(triples):
+    """The triples with blank nodes, relabelled canonically.
+    Each connected group of blank nodes is labelled on its own, so that the
+    labels only depend on the group; symmetric groups are left to
+    rdflib.compare, and identical groups are numbered."""
+    seen = {}
+    for component in blankComponents(triples):
+        labels = refinedLabels(component)
+        if labels is None:
+            graph = rdflib.Graph()
+            for triple in component:
+                graph.add(triple)
+            component = list(to_canonical_graph(graph))
+            labels = dict((term, str(term)) for triple in component for term in triple
+                          if isinstance(term, BNode))
+        canonical = sorted(tuple(BNode(labels[term]) if isinstance(term, BNode) else term for term in triple)
+                           for triple in component)
+        digest = _digest('\n'.join(' '.join(term.n3() for term in triple) for triple in canonical))
+        copy = seen[digest] = seen.get(digest, -1) + 1
+        for triple in canonical:
+            yield tuple(BNode('{}{}_{}'.format(digest, copy, term)) if isinstance(term, BNode) else term
+                        for term in triple)
+
+
+def parseTriples(onto_file):
+    """Parse an ontology file into a set of triples with canonical blank
+    node labels, and its namespace bindings.
+    A parser gives blank nodes new labels on every parse, so that the diff
+    of two parses would see every triple with a blank node (OWL
+    restrictions, SHACL shapes, RDF lists) as removed and added again; with
+    canonical labels, only the edited groups of blank nodes differ."""
+    parsed = rdflib.Graph()
+    parsed.parse(onto_file, format=rdflib.util.guess_format(onto_file))
+    triples = set()
+    blank = []
+    for triple in parsed:
+        if any(isinstance(term, BNode) for term in triple):
+            blank.append(triple)
+        else:
+            triples.add(triple)
+    triples.update(canonicalTriples(blank))
+    return triples, list(parsed.namespaces())
+
+
+def parseGraph(onto_file):
+    triples, namespaces = parseTriples(onto_file)
+    graph = rdflib.Graph()
+    for prefix, namespace in namespaces:
+        graph.bind(prefix, namespace, override=True)
+    for triple in triples:
+        graph.add(triple)
+    return graph
+
+
+class WatchSession:
+    """The in-memory state of a problem compiled in watch mode"""
+
+    def __init__(self, problem_file, domain_files, ontology_files, output_path=None,
+                 cache=None, backend='antlr', compact=False):
+        self.problem_file = problem_file
+        self.domain_files = list(domain_files)
+        self.ontology_files = list(ontology_files)
+        self.output_path = output_path
+        self.cache = cache
+        self.backend = backend
+        self.compact = compact
+        self.output = None
+        self.states = {}
+        # triples applied to the graphs but not re-resolved yet (a poll failed)
+        self.pending = set()
+        self.load()
+
+    def watchedFiles(self):
+        return [self.problem_file] + self.domain_files + self.ontology_files
+
+    def load(self):
+        """(Re)load everything from scratch"""
+        # taken before reading, a file modified meanwhile is seen next time
+        states = dict((path, fileState(path)) for path in self.watchedFiles())
+        self.problem = loadProblem(self.problem_file, self.cache, self.backend)
+        self.domains = [parseAsJson(f, cache=self.cache, backend=self.backend)
+                        for f in self.domain_files]
+        self.graphs = [parseGraph(f) for f in self.ontology_files]
+        self.ontology = unionView(*self.graphs) if self.graphs else rdflib.Graph()
+
+        self.predicateURIs = extractPredicateURIs(self.domains)
+        self.objectURIs = extractObjectURIs(self.problem)
+        typeParents = extractTypeParents(self.domains)
+        self.allowedURIs = { predURI: parameterObjectURIs(params, self.problem,
+                                                          self.objectURIs, typeParents)
+                             for predURI, (_symbol, params) in self.predicateURIs.items() }
+        self.properties = {}
+        self.rows = {}
+        for predURI in self.predicateURIs:
+            self.resolve(predURI)
+        self.pending = set()
+        self.states = states
+
+    def resolve(self, predURI):
+        self.properties[predURI] = formulaProperties(sparqlFormula(predURI, self.ontology))
+        self.rows[predURI] = resolvePredicateAxioms(predURI, self.objectURIs, self.ontology,
+                                                    allowedURIs=self.allowedURIs[predURI])
+
+    def applyDiff(self, index):
+        """Reparse one ontology file and apply its triple diff to its graph.
+        Return the changed triples."""
+        graph = self.graphs[index]
+        new_triples, namespaces = parseTriples(self.ontology_files[index])
+        old_triples = set(graph)
+        removed = old_triples - new_triples
+        added = new_triples - old_triples
+        for triple in removed:
+            graph.remove(triple)
+        for triple in added:
+            graph.add(triple)
+        for prefix, namespace in namespaces:
+            graph.bind(prefix, namespace, override=True)
+        return removed | added
+
+    def affectedPredicates(self, changed):
+        affected = []
+        for predURI in self.predicateURIs:
+            subject = URIRef(predURI)
+            properties = self.properties.get(predURI)
+            for s, p, _o in changed:
+                if s == subject or properties is None or p in properties:
+                    affected.append(predURI)
+                    break
+        return affected
+
+    def render(self):
+        axioms = []
+        for predURI, (symbol, _params) in self.predicateURIs.items():
+            for uriRefs in self.rows[predURI]:
+                axioms.append((symbol, uriRefs2Symbols(uriRefs, self.objectURIs)))
+        result_problem, _result_domains = composeResult(self.problem, self.domains, axioms)
+        return serializePDDL(result_problem, self.compact)
+
+    def write(self):
+        """Write the output if it changed; return whether it did"""
+        output = self.render()
+        if output == self.output:
+            return False
+        self.output = output
+        if self.output_path:
+            tmp_path = self.output_path + '.tmp'
+            with open(tmp_path, 'w') as out:
+                out.write(output)
+            os.replace(tmp_path, self.output_path)
+        else:
+            sys.stdout.write(output)
+            sys.stdout.flush()
+        return True
+
+    def poll(self):
+        """Apply the changes of the watched files since the last poll.
+        Return a short description of what was done, or None.
+        The new state of a file is only recorded once its changes are
+        applied, so a file that fails to parse (e.g. half written) is
+        tried again on the next poll."""
+        states = {}
+        for path in self.watchedFiles():
+            try:
+                state = fileState(path)
+            except OSError:
+                continue # being replaced by an editor; look again next time
+            if state != self.states.get(path):
+                states[path] = state
+        changed_files = list(states)
+        if not changed_files:
+            return None
+
+        start = time.perf_counter()
+        if any(path not in self.ontology_files for path in changed_files):
+            self.load()
+            report = 'reloaded problem and domains'
+        else:
+            for path in changed_files:
+                self.pending |= self.applyDiff(self.ontology_files.index(path))
+            changed = self.pending
+            affected = self.affectedPredicates(changed)
+            for predURI in affected:
+                self.resolve(predURI)
+            self.pending = set()
+            self.states.update(states)
+            report = '{} triple(s) changed, re-resolved {}'.format(
+                len(changed), ', '.join(affected) if affected else 'no predicate')
+        written = self.write()
+        return '{} in {:.3f} s, output {}'.format(
+            report, time.perf_counter() - start, 'rewritten' if written else 'unchanged')
+
+
+def watch(session, interval=0.5):
+    session.write()
+    print("Watching {} file(s), Ctrl-C to stop".format(len(session.watchedFiles())), file=sys.stderr)
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                report = session.poll()
+            except Exception as e:
+                # keep watching: the file is probably being edited
+                print("Recompilation failed: {}".format(e), file=sys.stderr)
+                continue
+            if report:
+                print(report, file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
@@ -5,7 +5,7 @@ setuptools.setup(
     name='pddls',
     version='0.2.1',
     # scripts=['pddls'] ,
-    scripts=['scripts/pddlsc', 'scripts/pddl2json', 'scripts/json2pddl'] ,
+    scripts=['scripts/pddlsc', 'scripts/pddl2json', 'scripts/json2pddl', 'scripts/pddlscd'] ,
     author="Mich Tatsubori",
     author_email="mich@jp.ibm.com",
     description="PDDLS translator package",
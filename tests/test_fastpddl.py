@@ -0,0 +1,70 @@
+import os
+import glob
+import json
+
+import pytest
+import antlr4
+
+from pddls.fastpddl import parseAsJson, parseText
+from pddls.pddlvisitor import Pddl2JsonVisitor, parse, parseText as parseTextTree
+
+
+#
+# Conformance of the fast parser with the ANTLR grammar: both backends must
+# produce the same jsonized PDDL, key order included.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = sorted(glob.glob(os.path.join(ROOT, 'examples', '**', '*.pddl*'), recursive=True))
+
+TEXTS = {
+    'comments': '''; a problem
+(define (problem p) ; inline
+  (:domain d)
+  (:objects a b - thing c)
+  (:init (on a b) ; a fact
+         (= (weight a) 2.5))
+  (:goal (and (on b a) (not (on a b)))))
+''',
+    'bom': '﻿(define (problem p) (:domain d) (:objects a) (:init (clear a)) (:goal (clear a)))',
+    'metric': '''(define (problem p) (:domain d) (:objects a)
+  (:init (= (total-cost) 0))
+  (:goal (clear a))
+  (:metric minimize (total-cost)))''',
+    'domain': '''(define (domain d)
+  (:requirements :strips :typing :fluents)
+  (:types thing - object)
+  (:predicates (clear ?x - thing) (on ?x ?y - thing))
+  (:functions (total-cost) - number)
+  (:action move
+    :parameters (?x ?y - thing)
+    :precondition (and (clear ?x) (not (on ?x ?y)))
+    :effect (and (on ?x ?y) (increase (total-cost) 1))))
+''',
+    'constants': '''(define (domain d)
+  (:requirements :strips :typing)
+  (:types thing)
+  (:constants table floor - thing lid)
+  (:predicates (on ?x ?y - thing))
+  (:action drop :parameters (?x - thing) :precondition (on ?x table) :effect (on ?x floor)))
+''',
+}
+
+
+def antlrDoc(tree):
+    if tree.parser.getNumberOfSyntaxErrors():
+        pytest.skip('the reference parser rejects the input')
+    visitor = Pddl2JsonVisitor()
+    antlr4.ParseTreeWalker().walk(visitor, tree)
+    return visitor.result
+
+
+@pytest.mark.parametrize('path', EXAMPLES, ids=lambda path: os.path.relpath(path, ROOT))
+def test_examples_match_antlr(path):
+    expected = antlrDoc(parse(path))
+    assert json.dumps(parseAsJson(path)) == json.dumps(expected)
+
+
+@pytest.mark.parametrize('name', sorted(TEXTS))
+def test_texts_match_antlr(name):
+    expected = antlrDoc(parseTextTree(TEXTS[name]))
+    assert json.dumps(parseText(TEXTS[name])) == json.dumps(expected)
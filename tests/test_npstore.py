@@ -0,0 +1,78 @@
+import os
+import random
+from collections import Counter
+
+import pytest
+import rdflib
+from rdflib import URIRef, Literal
+
+from pddls.npstore import NumpyTripleStore
+from pddls.pddlsc import loadOntology
+from pddls.queryrewrite import bindValues, projectedVariables
+from pddls.rulecatalog import ESTABLISHED_WITH, preparedQuery
+
+
+#
+# Conformance of the NumPy query engine with rdflib: both must return the
+# same rows, with the same multiplicities, for every formula.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO2 = [os.path.join(ROOT, 'examples', 'demo2', name) for name in ('objects.ttl', 'hole_onto.ttl')]
+
+PREFIX = 'PREFIX ex: <uri:ex#>\n'
+FORMULAS = [
+    'SELECT ?s ?o WHERE { ?s ex:p0 ?o }',
+    'SELECT DISTINCT ?s WHERE { ?s ex:p0 ?o }',
+    'SELECT ?o WHERE { ex:r1 ?p ?o }',
+    'SELECT ?x WHERE { ?x ex:p1 ?x }',
+    'SELECT ?a ?c WHERE { ?a ex:p0 ?b . ?b ex:p1 ?c }',
+    'SELECT DISTINCT ?a ?c WHERE { ?a ex:p0 ?b . ?b ex:p1 ?c . ?c ex:p2 ?a }',
+    'SELECT ?a ?b WHERE { ?a ex:p0 ?x . ?b ex:p1 ?x . ?a ex:n ?na . ?b ex:n ?nb FILTER (?na < ?nb) }',
+    'SELECT ?a ?b WHERE { ?a ex:n ?na . ?b ex:n ?nb FILTER (?na >= ?nb && ?a != ?b) }',
+    'SELECT ?a WHERE { ?a ex:n ?n FILTER (?n = 3 || ?n > 7) }',
+    'SELECT ?a ?b WHERE { ?a ex:p2 ?b FILTER (?a = ex:r2 || ?b != ex:r3) }',
+    'SELECT ?a ?b WHERE { ?a ex:p0 ?b . ?a ex:p0 ?c }',
+    'SELECT ?a WHERE { ?a ex:p0 ex:missing }',
+]
+
+
+def randomGraph(seed, resources=12, triples=150):
+    rng = random.Random(seed)
+    graph = rdflib.Graph()
+    nodes = [URIRef('uri:ex#r{}'.format(i)) for i in range(resources)]
+    properties = [URIRef('uri:ex#p{}'.format(i)) for i in range(3)]
+    for _ in range(triples):
+        graph.add((rng.choice(nodes), rng.choice(properties), rng.choice(nodes)))
+    for node in nodes:
+        graph.add((node, URIRef('uri:ex#n'), Literal(rng.randint(0, 10))))
+    return graph
+
+
+def assertSameRows(engine, graph, query):
+    expected = Counter(tuple(row) for row in graph.query(query))
+    assert Counter(engine.query(query)) == expected
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('formula', FORMULAS)
+def test_random_graph_matches_rdflib(formula, seed):
+    graph = randomGraph(seed)
+    engine = NumpyTripleStore.fromGraph(graph)
+    query = preparedQuery(PREFIX + formula)
+    assertSameRows(engine, graph, query)
+    variables = projectedVariables(query)
+    bound = bindValues(query, variables[0], [URIRef('uri:ex#r{}'.format(i)) for i in range(0, 12, 3)])
+    if bound is not None:
+        assertSameRows(engine, graph, bound)
+    assert engine.stats()['fallbacks'] == 0
+
+
+def test_demo2_matches_rdflib():
+    graph = loadOntology(DEMO2)
+    engine = NumpyTripleStore.fromGraph(graph)
+    formulas = [str(f) for f in graph.objects(None, ESTABLISHED_WITH)
+                if isinstance(f, Literal) and f.language == 'sparql']
+    assert formulas
+    for formula in formulas:
+        assertSameRows(engine, graph, preparedQuery(formula))
+    assert engine.stats()['evaluated'] == len(formulas)
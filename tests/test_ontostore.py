@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from pddls.ontostore import OntologyStore, StaleStoreError, openStore
+
+
+#
+# Reuse, rebuild and refusal of precompiled ontology stores.
+
+TURTLE = '@prefix ex: <uri:ex#> .\nex:a ex:p ex:{} .\n'
+
+
+def writeTurtle(path, value):
+    path.write_text(TURTLE.format(value))
+    return str(path)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    return [writeTurtle(tmp_path / 'a.ttl', 'b'), writeTurtle(tmp_path / 'c.ttl', 'd')]
+
+
+def test_missing_store_is_compiled(tmp_path, sources):
+    store_path = str(tmp_path / 'onto.store')
+    assert len(openStore(store_path, sources)) == 2
+    assert OntologyStore(store_path).staleReason(sources) is None
+
+
+def test_other_sources_are_refused(tmp_path, sources):
+    store_path = str(tmp_path / 'onto.store')
+    openStore(store_path, sources)
+    before = os.stat(store_path).st_mtime_ns
+    with pytest.raises(StaleStoreError):
+        openStore(store_path, sources[:1])
+    assert os.stat(store_path).st_mtime_ns == before
+    assert len(openStore(store_path, sources[:1], force=True)) == 1
+
+
+def test_modified_source_is_recompiled(tmp_path, sources):
+    store_path = str(tmp_path / 'onto.store')
+    openStore(store_path, sources)
+    with open(sources[0], 'a') as fd:
+        fd.write('ex:a ex:q ex:e .\n')
+    with pytest.raises(StaleStoreError):
+        openStore(store_path, sources, rebuild=False)
+    assert len(openStore(store_path, sources)) == 3
+    assert len(openStore(store_path)) == 3
@@ -0,0 +1,32 @@
+import io
+
+from pddls.fastpddl import parseText
+from pddls.prune import prune
+
+
+#
+# Reachability and relevance pruning of problems.
+
+DOMAIN = '''(define (domain walk)
+  (:requirements :strips :typing)
+  (:types loc dir)
+  (:constants up down - dir)
+  (:predicates (at ?a - loc) (adj ?a ?b - loc ?d - dir))
+  (:action move
+    :parameters (?a ?b - loc ?d - dir)
+    :precondition (and (at ?a) (adj ?a ?b ?d))
+    :effect (and (at ?b) (not (at ?a)))))
+'''
+
+PROBLEM = '''(define (problem p) (:domain walk)
+  (:objects l1 l2 l3 - loc)
+  (:init (at l1) (adj l1 l2 up) (adj l3 l1 down))
+  (:goal (at l2)))
+'''
+
+
+def test_constants_bind_parameters():
+    domain, problem = prune(parseText(DOMAIN), parseText(PROBLEM), out=io.StringIO())
+    assert [action['pddl:action'] for action in domain['structure']] == ['move']
+    assert sorted(problem['pddl:init']) == ['( adj l1 l2 up )', '( at l1 )']
+    assert list(problem['pddl:objects']) == ['l1', 'l2']